@@ -0,0 +1,281 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+Shows how to fan out Bedrock runtime calls under an adaptive concurrency limit.
+
+The limiter follows AIMD (additive increase, multiplicative decrease): it
+allows one more request in flight per round trip while latency and errors are
+healthy, and halves the limit when Bedrock throttles. Throttled requests are
+retried with full-jitter exponential backoff.
+
+Create the Bedrock client with Boto3 retries disabled, for example
+`Config(retries={"max_attempts": 1, "mode": "standard"})`, so that throttles
+reach the limiter instead of being retried blindly inside Boto3.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+}
+
+
+def is_throttling_error(err):
+    """
+    Checks whether an exception means Bedrock is shedding load.
+    Args:
+        err (Exception): The exception raised by a Boto3 call.
+
+    Returns:
+        bool: True if the request should be retried after backing off.
+    """
+    return (
+        isinstance(err, ClientError)
+        and err.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+    )
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits in-flight Bedrock runtime calls and adapts the limit to the
+    highest rate the service sustains.
+    """
+
+    def __init__(
+        self,
+        initial_limit=4,
+        min_limit=1,
+        max_limit=64,
+        backoff_factor=0.5,
+        latency_tolerance=2.0,
+        error_rate_threshold=0.1,
+        max_retries=6,
+        base_delay=0.25,
+        max_delay=20.0,
+    ):
+        """
+        Args:
+            initial_limit (int): The starting number of requests in flight.
+            min_limit (int): The limit never drops below this.
+            max_limit (int): The limit never grows above this.
+            backoff_factor (float): The limit is multiplied by this on throttling.
+            latency_tolerance (float): Latency above this multiple of the best
+                observed latency stops the limit growing.
+            error_rate_threshold (float): A smoothed error rate above this
+                shrinks the limit like a throttle does.
+            max_retries (int): Throttled attempts retried before giving up.
+            base_delay (float): The first retry backoff cap, in seconds.
+            max_delay (float): The largest retry backoff cap, in seconds.
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_factor = backoff_factor
+        self.latency_tolerance = latency_tolerance
+        self.error_rate_threshold = error_rate_threshold
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._waiting = 0
+        self._condition = None
+        self._executor = ThreadPoolExecutor(max_workers=max_limit)
+
+        self._min_latency = None
+        self._latency_ewma = None
+        self._error_ewma = 0.0
+        self._last_decrease = 0.0
+
+        self.successes = 0
+        self.errors = 0
+        self.throttles = 0
+        self.retries = 0
+
+    @property
+    def limit(self):
+        """The current number of requests allowed in flight."""
+        return int(self._limit)
+
+    def metrics(self):
+        """
+        Returns a snapshot of the limiter state.
+
+        Returns:
+            dict: The limit, in-flight and queued requests, and counters.
+        """
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queue_depth": self._waiting,
+            "successes": self.successes,
+            "errors": self.errors,
+            "throttles": self.throttles,
+            "retries": self.retries,
+            "latency_ewma_ms": (
+                None if self._latency_ewma is None else self._latency_ewma * 1000
+            ),
+            "error_rate": self._error_ewma,
+        }
+
+    async def call(self, fn, *args, **kwargs):
+        """
+        Runs a blocking Boto3 call once a slot is free, retrying throttles.
+        Args:
+            fn: The client method to call, such as `bedrock_client.converse`.
+            *args, **kwargs: The arguments for `fn`.
+
+        Returns:
+            The response of `fn`.
+        """
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            await self._acquire()
+            started = time.perf_counter()
+            try:
+                response = await loop.run_in_executor(
+                    self._executor, lambda: fn(*args, **kwargs)
+                )
+            except ClientError as err:
+                if not is_throttling_error(err):
+                    self._on_error()
+                    raise
+                self._on_throttle()
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                self._on_success(time.perf_counter() - started)
+                return response
+            finally:
+                await self._release()
+
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+            attempt += 1
+            self.retries += 1
+            logger.debug("Throttled, retry %s in %.2f seconds", attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def _acquire(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            self._waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+
+    async def _release(self):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _on_success(self, latency):
+        self.successes += 1
+        self._error_ewma *= 0.9
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+
+        healthy = self._latency_ewma <= self._min_latency * self.latency_tolerance
+        # Only grow when the current limit is actually being used.
+        if healthy and self._in_flight >= self.limit - 1:
+            # +1 per round trip: each of the ~limit completions adds 1/limit.
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def _on_error(self):
+        self.errors += 1
+        self._error_ewma = 0.9 * self._error_ewma + 0.1
+        if self._error_ewma > self.error_rate_threshold:
+            self._decrease()
+
+    def _on_throttle(self):
+        self.throttles += 1
+        self._decrease()
+
+    def _decrease(self):
+        # Requests already in flight when the limit dropped will often be
+        # throttled too; count those as one congestion signal, not many.
+        now = time.monotonic()
+        window = self._latency_ewma or self.base_delay
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.backoff_factor)
+        logger.info("Concurrency limit lowered to %s", self.limit)
+
+    def close(self):
+        """Shuts down the worker threads."""
+        self._executor.shutdown(wait=False)
+
+
+async def converse_many(limiter, bedrock_client, model_id, prompts):
+    """
+    Sends independent single-turn conversations concurrently.
+    Args:
+        limiter (AdaptiveConcurrencyLimiter): The limiter to send through.
+        bedrock_client: The Boto3 Bedrock runtime client.
+        model_id (str): The model ID to use.
+        prompts (list): The user prompts to send.
+
+    Returns:
+        list: The responses (or exceptions), in prompt order.
+    """
+    return await asyncio.gather(
+        *(
+            limiter.call(
+                bedrock_client.converse,
+                modelId=model_id,
+                messages=[{"role": "user", "content": [{"text": prompt}]}],
+            )
+            for prompt in prompts
+        ),
+        return_exceptions=True,
+    )
+
+
+async def main():
+    """
+    Entrypoint for the adaptive concurrency example, run against a local stub
+    that throttles above 16 concurrent requests.
+    """
+    from stub_client import StubBedrockRuntimeClient
+
+    bedrock_client = StubBedrockRuntimeClient(capacity=16, latency=0.05)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+
+    prompts = [f"Tell me fact number {i} about rock music." for i in range(500)]
+    started = time.perf_counter()
+    responses = await converse_many(
+        limiter, bedrock_client, "meta.llama3-8b-instruct-v1:0", prompts
+    )
+    elapsed = time.perf_counter() - started
+    limiter.close()
+
+    failed = sum(isinstance(response, Exception) for response in responses)
+    print(f"Sent {len(prompts)} requests in {elapsed:.2f} seconds, {failed} failed")
+    print(f"Limiter: {limiter.metrics()}")
+    print(
+        f"Stub: {bedrock_client.calls} calls, {bedrock_client.throttles} throttled, "
+        f"max {bedrock_client.max_in_flight} in flight"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,15 +5,25 @@ Shows how to use the Converse API with Anthropic Claude 3 Sonnet (on demand).
 """
 
 import logging
+import time
 
 import boto3
 from botocore.exceptions import ClientError
+from history import ConversationHistory
+from metrics import default_collector
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
-def generate_conversation(bedrock_client, model_id, system_prompts, messages):
+def generate_conversation(
+    bedrock_client,
+    model_id,
+    system_prompts,
+    messages,
+    hedger=None,
+    collector=default_collector,
+):
     """
     Sends messages to a model.
     Args:
@@ -21,6 +31,9 @@ def generate_conversation(bedrock_client, model_id, system_prompts, messages):
         model_id (str): The model ID to use.
         system_prompts (JSON) : The system prompts for the model to use.
         messages (JSON) : The messages to send to the model.
+        hedger (Hedger) : Optional hedger that duplicates slow requests to a
+            secondary region or fallback model.
+        collector (MetricsCollector) : Where to record usage and latency.
 
     Returns:
         response (JSON): The conversation that the model generated.
@@ -38,17 +51,37 @@ def generate_conversation(bedrock_client, model_id, system_prompts, messages):
     # Additional inference parameters to use.
     # additional_model_fields = {"top_k": top_k}
 
+    request = {
+        "modelId": model_id,
+        "messages": messages,
+        "system": system_prompts,
+        "inferenceConfig": inference_config,
+        # "additionalModelRequestFields": additional_model_fields,
+    }
+
     # Send the message.
-    response = bedrock_client.converse(
-        modelId=model_id,
-        messages=messages,
-        system=system_prompts,
-        inferenceConfig=inference_config,
-        # additionalModelRequestFields=additional_model_fields,
-    )
+    started = time.perf_counter()
+    try:
+        if hedger is None:
+            response = bedrock_client.converse(**request)
+        else:
+            response = hedger.converse(bedrock_client, **request)
+    except ClientError:
+        collector.record(
+            model_id, "converse", time.perf_counter() - started, error=True
+        )
+        raise
 
-    # Log token usage.
+    # Log token usage, against the model that answered if a hedge won.
     token_usage = response["usage"]
+    collector.record(
+        response.get("modelId", model_id),
+        "converse",
+        time.perf_counter() - started,
+        input_tokens=token_usage["inputTokens"],
+        output_tokens=token_usage["outputTokens"],
+        stop_reason=response["stopReason"],
+    )
     logger.info("Input tokens: %s", token_usage["inputTokens"])
     logger.info("Output tokens: %s", token_usage["outputTokens"])
     logger.info("Total tokens: %s", token_usage["totalTokens"])
@@ -80,33 +113,35 @@ def main():
             {"text": "Make sure the songs are by artists from the United Kingdom."}
         ],
     }
-    messages = []
+    history = ConversationHistory(system_prompts, max_tokens=2000)
 
     try:
 
         bedrock_client = boto3.client(service_name="bedrock-runtime")
 
         # Start the conversation with the 1st message.
-        messages.append(message_1)
+        history.append(message_1)
         response = generate_conversation(
-            bedrock_client, model_id, system_prompts, messages
+            bedrock_client, model_id, history.system, history.messages
         )
+        history.calibrate(response["usage"]["inputTokens"])
 
         # Add the response message to the conversation.
         output_message = response["output"]["message"]
-        messages.append(output_message)
+        history.append(output_message)
 
         # Continue the conversation with the 2nd message.
-        messages.append(message_2)
+        history.append(message_2)
         response = generate_conversation(
-            bedrock_client, model_id, system_prompts, messages
+            bedrock_client, model_id, history.system, history.messages
         )
+        history.calibrate(response["usage"]["inputTokens"])
 
         output_message = response["output"]["message"]
-        messages.append(output_message)
+        history.append(output_message)
 
         # Show the complete conversation.
-        for message in messages:
+        for message in history.messages:
             print(f"Role: {message['role']}")
             for content in message["content"]:
                 print(f"Text: {content['text']}")
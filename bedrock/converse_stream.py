@@ -4,10 +4,15 @@
 Shows how to use the Converse API to stream a response from Anthropic Claude 3 Sonnet (on demand).
 """
 
+import asyncio
 import logging
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional, Union
 
 import boto3
 from botocore.exceptions import ClientError
+from metrics import default_collector
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +25,7 @@ def stream_conversation(
     system_prompts,
     inference_config,
     additional_model_fields,
+    collector=default_collector,
 ):
     """
     Sends messages to a model and streams the response.
@@ -30,6 +36,7 @@ def stream_conversation(
         system_prompts (JSON) : The system prompts to send.
         inference_config (JSON) : The inference configuration to use.
         additional_model_fields (JSON) : Additional model fields to use.
+        collector (MetricsCollector) : Where to record usage and latency.
 
     Returns:
         Nothing.
@@ -38,36 +45,271 @@ def stream_conversation(
 
     logger.info("Streaming messages with model %s", model_id)
 
-    response = bedrock_client.converse_stream(
-        modelId=model_id,
-        messages=messages,
-        system=system_prompts,
-        inferenceConfig=inference_config,
-        # additionalModelRequestFields=additional_model_fields,
-    )
+    timer = _StreamTimer()
+    usage = {}
+    stop_reason = None
+    try:
+        response = bedrock_client.converse_stream(
+            modelId=model_id,
+            messages=messages,
+            system=system_prompts,
+            inferenceConfig=inference_config,
+            # additionalModelRequestFields=additional_model_fields,
+        )
+    except ClientError:
+        collector.record(model_id, "converse_stream", timer.elapsed(), error=True)
+        raise
 
     stream = response.get("stream")
-    if stream:
-        for event in stream:
+    # Stays None if the loop is interrupted, e.g. by KeyboardInterrupt.
+    outcome = None
+    try:
+        if stream:
+            for event in stream:
+
+                if "messageStart" in event:
+                    print(f"\nRole: {event['messageStart']['role']}")
+
+                if "contentBlockDelta" in event:
+                    timer.token()
+                    print(event["contentBlockDelta"]["delta"]["text"], end="")
+
+                if "messageStop" in event:
+                    stop_reason = event["messageStop"]["stopReason"]
+                    print(f"\nStop reason: {event['messageStop']['stopReason']}")
+
+                if "metadata" in event:
+                    metadata = event["metadata"]
+                    if "usage" in metadata:
+                        usage = metadata["usage"]
+                        print("\nToken usage")
+                        print(f"Input tokens: {metadata['usage']['inputTokens']}")
+                        print(f":Output tokens: {metadata['usage']['outputTokens']}")
+                        print(f":Total tokens: {metadata['usage']['totalTokens']}")
+                    if "metrics" in event["metadata"]:
+                        print(
+                            f"Latency: {metadata['metrics']['latencyMs']} milliseconds"
+                        )
+        outcome = "complete"
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        if stream:
+            stream.close()
+        collector.record(
+            model_id,
+            "converse_stream",
+            timer.elapsed(),
+            input_tokens=usage.get("inputTokens"),
+            output_tokens=usage.get("outputTokens"),
+            stop_reason=stop_reason,
+            time_to_first_token=timer.time_to_first_token(),
+            error=outcome == "error",
+            cancelled=outcome is None,
+        )
+
+
+@dataclass
+class TextDelta:
+    """A chunk of generated text."""
+
+    text: str
+    content_block_index: int = 0
+
+
+@dataclass
+class MessageStop:
+    """The model finished generating the message."""
+
+    stop_reason: str
+
+
+@dataclass
+class Usage:
+    """Token usage reported in the stream metadata."""
 
-            if "messageStart" in event:
-                print(f"\nRole: {event['messageStart']['role']}")
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+
+
+@dataclass
+class Metrics:
+    """
+    Latency of a streamed response.
+
+    `latency_ms` is the server side `latencyMs` from the stream metadata; the
+    remaining fields are measured on the client from the moment the request
+    was sent.
+    """
+
+    latency_ms: Optional[int]
+    time_to_first_token_ms: Optional[float]
+    total_latency_ms: float
+    inter_token_latencies_ms: list = field(default_factory=list)
+
+    @property
+    def mean_inter_token_latency_ms(self) -> Optional[float]:
+        if not self.inter_token_latencies_ms:
+            return None
+        return sum(self.inter_token_latencies_ms) / len(self.inter_token_latencies_ms)
+
+    @property
+    def max_inter_token_latency_ms(self) -> Optional[float]:
+        if not self.inter_token_latencies_ms:
+            return None
+        return max(self.inter_token_latencies_ms)
+
+
+StreamEvent = Union[TextDelta, MessageStop, Usage, Metrics]
+
+
+class _StreamTimer:
+    """Records time to first token and the gaps between tokens."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.last_token = None
+        self.gaps_ms = []
+
+    def token(self):
+        now = time.perf_counter()
+        if self.first_token is None:
+            self.first_token = now
+        else:
+            self.gaps_ms.append((now - self.last_token) * 1000)
+        self.last_token = now
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def time_to_first_token(self):
+        if self.first_token is None:
+            return None
+        return self.first_token - self.started
+
+    def metrics(self, latency_ms):
+        ttft = self.time_to_first_token()
+        return Metrics(
+            latency_ms=latency_ms,
+            time_to_first_token_ms=None if ttft is None else ttft * 1000,
+            total_latency_ms=self.elapsed() * 1000,
+            inter_token_latencies_ms=self.gaps_ms,
+        )
+
+
+def _next_event(iterator):
+    # StopIteration can't cross an executor future, so signal the end with None.
+    return next(iterator, None)
+
+
+async def astream_conversation(
+    bedrock_client,
+    model_id,
+    messages,
+    system_prompts,
+    inference_config,
+    additional_model_fields=None,
+    collector=default_collector,
+) -> AsyncIterator[StreamEvent]:
+    """
+    Sends messages to a model and yields the response events as they arrive.
+
+    The blocking Boto3 event stream is read on a worker thread so the event
+    loop stays free to forward tokens to clients. Cancelling the consuming
+    task, or closing the iterator early, closes the underlying stream.
+    Args:
+        bedrock_client: The Boto3 Bedrock runtime client.
+        model_id (str): The model ID to use.
+        messages (JSON) : The messages to send.
+        system_prompts (JSON) : The system prompts to send.
+        inference_config (JSON) : The inference configuration to use.
+        additional_model_fields (JSON) : Additional model fields to use.
+        collector (MetricsCollector) : Where to record usage and latency.
+
+    Returns:
+        An async iterator of TextDelta, MessageStop, Usage and Metrics events.
+        Metrics is always the last event.
+
+    """
+
+    logger.info("Streaming messages with model %s", model_id)
+
+    request = {
+        "modelId": model_id,
+        "messages": messages,
+        "system": system_prompts,
+        "inferenceConfig": inference_config,
+    }
+    if additional_model_fields:
+        request["additionalModelRequestFields"] = additional_model_fields
+
+    timer = _StreamTimer()
+    try:
+        response = await asyncio.to_thread(bedrock_client.converse_stream, **request)
+    except ClientError:
+        collector.record(model_id, "converse_stream", timer.elapsed(), error=True)
+        raise
+    stream = response.get("stream")
+    if not stream:
+        yield timer.metrics(None)
+        return
+
+    latency_ms = None
+    usage = None
+    stop_reason = None
+    # Stays None on an early break, aclose() or cancellation.
+    outcome = None
+    events = iter(stream)
+    try:
+        while True:
+            event = await asyncio.to_thread(_next_event, events)
+            if event is None:
+                break
 
             if "contentBlockDelta" in event:
-                print(event["contentBlockDelta"]["delta"]["text"], end="")
+                delta = event["contentBlockDelta"]
+                text = delta["delta"].get("text")
+                if text:
+                    timer.token()
+                    yield TextDelta(text, delta.get("contentBlockIndex", 0))
 
             if "messageStop" in event:
-                print(f"\nStop reason: {event['messageStop']['stopReason']}")
+                stop_reason = event["messageStop"]["stopReason"]
+                yield MessageStop(stop_reason)
 
             if "metadata" in event:
                 metadata = event["metadata"]
                 if "usage" in metadata:
-                    print("\nToken usage")
-                    print(f"Input tokens: {metadata['usage']['inputTokens']}")
-                    print(f":Output tokens: {metadata['usage']['outputTokens']}")
-                    print(f":Total tokens: {metadata['usage']['totalTokens']}")
-                if "metrics" in event["metadata"]:
-                    print(f"Latency: {metadata['metrics']['latencyMs']} milliseconds")
+                    usage = Usage(
+                        metadata["usage"]["inputTokens"],
+                        metadata["usage"]["outputTokens"],
+                        metadata["usage"]["totalTokens"],
+                    )
+                    yield usage
+                if "metrics" in metadata:
+                    latency_ms = metadata["metrics"]["latencyMs"]
+        outcome = "complete"
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        # Runs on exhaustion, aclose() and cancellation alike.
+        stream.close()
+        collector.record(
+            model_id,
+            "converse_stream",
+            timer.elapsed(),
+            input_tokens=usage.input_tokens if usage else 0,
+            output_tokens=usage.output_tokens if usage else 0,
+            stop_reason=stop_reason,
+            time_to_first_token=timer.time_to_first_token(),
+            error=outcome == "error",
+            cancelled=outcome is None,
+        )
+    yield timer.metrics(latency_ms)
 
 
 def main():
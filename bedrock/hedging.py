@@ -0,0 +1,276 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+Hedged Converse API requests to cut tail latency.
+
+If the primary request hasn't responded (or, when streaming, produced its
+first event) within a delay taken from a percentile of recent latencies, a
+duplicate is sent to a secondary client (another region) and/or a fallback
+model. Whichever finishes first is used and the other is cancelled: not yet
+started requests are never sent, and late streams are closed as soon as they
+arrive. Responses carry the "modelId" of the request that produced them, so
+callers can attribute usage to the model that answered. A hedge budget caps
+the share of requests that are duplicated.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Keeps the most recent latencies and answers percentile queries."""
+
+    def __init__(self, window=200):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, percentile):
+        """
+        Args:
+            percentile (float): The percentile to return, between 0 and 100.
+
+        Returns:
+            float: The latency in seconds, or None with no samples yet.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        return latencies[index]
+
+
+class _PeekedStream:
+    """An event stream whose first event has already been read."""
+
+    def __init__(self, stream, iterator, first_event):
+        self._stream = stream
+        self._iterator = iterator
+        self._first_event = first_event
+
+    def __iter__(self):
+        if self._first_event is not None:
+            yield self._first_event
+        yield from self._iterator
+
+    def close(self):
+        self._stream.close()
+
+
+def _close_stream(response):
+    stream = response.get("stream") if isinstance(response, dict) else None
+    if stream is not None:
+        stream.close()
+
+
+class Hedger:
+    """
+    Sends Converse API requests with a hedge to a secondary region or a
+    fallback model.
+    """
+
+    def __init__(
+        self,
+        secondary_client=None,
+        fallback_model_id=None,
+        percentile=95,
+        initial_delay=2.0,
+        min_delay=0.05,
+        min_samples=20,
+        max_hedge_ratio=0.1,
+        window=200,
+        max_workers=32,
+    ):
+        """
+        Args:
+            secondary_client: Optional Bedrock runtime client for another region.
+            fallback_model_id (str): Optional model ID to use for the hedge.
+            percentile (float): The latency percentile to wait before hedging.
+            initial_delay (float): The delay to use until enough samples exist.
+            min_delay (float): The shortest delay before hedging, in seconds.
+            min_samples (int): Samples needed before using the percentile.
+            max_hedge_ratio (float): The largest share of requests to hedge.
+            window (int): The number of recent latencies to keep.
+            max_workers (int): Threads available for in-flight requests.
+        """
+        if secondary_client is None and fallback_model_id is None:
+            raise ValueError("A secondary client or fallback model is required.")
+        self.secondary_client = secondary_client
+        self.fallback_model_id = fallback_model_id
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+
+        self.latencies = LatencyTracker(window)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.skipped_hedges = 0
+
+    def delay(self):
+        """The current time to wait before hedging, in seconds."""
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, self.latencies.percentile(self.percentile))
+
+    def stats(self):
+        """
+        Returns:
+            dict: Request, hedge and win counters and the hedge rate.
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+                "primary_wins": self.primary_wins,
+                "hedge_wins": self.hedge_wins,
+                "skipped_hedges": self.skipped_hedges,
+                "delay_ms": self.delay() * 1000,
+            }
+
+    def converse(self, bedrock_client, **request):
+        """
+        Calls `converse`, hedging if the primary is slow.
+        Args:
+            bedrock_client: The primary Boto3 Bedrock runtime client.
+            **request: The keyword arguments for `converse`.
+
+        Returns:
+            response (JSON): The response of whichever request finished first,
+            with the "modelId" it was sent to.
+        """
+        secondary_client, secondary_request = self._secondary(bedrock_client, request)
+
+        def send(client, kwargs):
+            return dict(client.converse(**kwargs), modelId=kwargs["modelId"])
+
+        return self._race(
+            lambda: send(bedrock_client, request),
+            lambda: send(secondary_client, secondary_request),
+            discard=None,
+        )
+
+    def converse_stream(self, bedrock_client, **request):
+        """
+        Calls `converse_stream`, racing on the first stream event.
+        Args:
+            bedrock_client: The primary Boto3 Bedrock runtime client.
+            **request: The keyword arguments for `converse_stream`.
+
+        Returns:
+            response (JSON): The response of whichever stream started first,
+            with the "modelId" it was sent to.
+        """
+        secondary_client, secondary_request = self._secondary(bedrock_client, request)
+
+        def start(client, kwargs):
+            response = client.converse_stream(**kwargs)
+            stream = response.get("stream")
+            if stream:
+                events = iter(stream)
+                first_event = next(events, None)
+                response = dict(
+                    response, stream=_PeekedStream(stream, events, first_event)
+                )
+            return dict(response, modelId=kwargs["modelId"])
+
+        return self._race(
+            lambda: start(bedrock_client, request),
+            lambda: start(secondary_client, secondary_request),
+            discard=_close_stream,
+        )
+
+    def close(self):
+        """Shuts down the worker threads."""
+        self._executor.shutdown(wait=False)
+
+    def _secondary(self, bedrock_client, request):
+        client = self.secondary_client or bedrock_client
+        secondary_request = dict(request)
+        if self.fallback_model_id is not None:
+            secondary_request["modelId"] = self.fallback_model_id
+        return client, secondary_request
+
+    def _may_hedge(self):
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_ratio * self.requests:
+                self.skipped_hedges += 1
+                return False
+            self.hedges += 1
+            return True
+
+    def _race(self, primary, secondary, discard):
+        with self._lock:
+            self.requests += 1
+        started = time.perf_counter()
+        primary_future = self._executor.submit(primary)
+        # Track the primary's own latency, even when it loses, so hedge wins
+        # don't drag the percentile (and so the delay) ever lower.
+        primary_future.add_done_callback(
+            lambda future: self._record(future, time.perf_counter() - started)
+        )
+
+        done, _ = wait([primary_future], timeout=self.delay())
+        if done or not self._may_hedge():
+            return primary_future.result()
+
+        logger.info("Hedging request after %.0f ms", self.delay() * 1000)
+        hedge_future = self._executor.submit(secondary)
+        pending = {primary_future, hedge_future}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [future for future in done if future.exception() is None]
+            if not succeeded:
+                error = next(iter(done)).exception()
+                continue
+            # Both may finish together; the primary wins a tie.
+            winner = primary_future if primary_future in succeeded else succeeded[0]
+            for loser in pending:
+                self._cancel(loser, discard)
+            for loser in succeeded:
+                if loser is not winner and discard is not None:
+                    discard(loser.result())
+            with self._lock:
+                if winner is hedge_future:
+                    self.hedge_wins += 1
+                else:
+                    self.primary_wins += 1
+            return winner.result()
+        raise error
+
+    def _record(self, future, latency):
+        if not future.cancelled() and future.exception() is None:
+            self.latencies.record(latency)
+
+    @staticmethod
+    def _cancel(future, discard):
+        # A request that is already running can't be interrupted; drop its
+        # result (closing any stream) as soon as it arrives.
+        if future.cancel() or discard is None:
+            return
+
+        def discard_late(late):
+            if not late.cancelled() and late.exception() is None:
+                discard(late.result())
+
+        future.add_done_callback(discard_late)
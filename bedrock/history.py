@@ -0,0 +1,184 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+Keeps a Converse API conversation within a token budget.
+
+Every message is measured once when it is added, and running totals are
+updated as messages enter and leave the window, so adding a turn costs O(1)
+amortised work no matter how long the conversation gets.
+"""
+
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Rough English average; refined from real usage by calibrate().
+DEFAULT_CHARS_PER_TOKEN = 4.0
+
+
+def message_chars(message):
+    """
+    Counts the characters of text in a Converse API message.
+    Args:
+        message (JSON): A message with a role and a list of content blocks.
+
+    Returns:
+        int: The number of characters across all text content blocks.
+    """
+    return sum(len(content.get("text", "")) for content in message["content"])
+
+
+class ConversationHistory:
+    """
+    A conversation window that fits the system prompts, an optional summary of
+    older turns and the most recent turns into `max_tokens`.
+
+    When the window overflows, the oldest turns are dropped until it is back
+    under `low_water_ratio * max_tokens`, so trimming (and summarising) happens
+    in batches rather than on every turn. If a `summarizer` is given, dropped
+    turns are folded into a running summary that is sent as an extra system
+    prompt; otherwise they are discarded.
+    """
+
+    def __init__(
+        self,
+        system_prompts,
+        max_tokens=4000,
+        min_messages=2,
+        low_water_ratio=0.75,
+        summarizer=None,
+        chars_per_token=DEFAULT_CHARS_PER_TOKEN,
+    ):
+        """
+        Args:
+            system_prompts (JSON): The system prompts, always kept.
+            max_tokens (int): The input token budget for a request.
+            min_messages (int): The number of latest messages never dropped.
+            low_water_ratio (float): The fraction of the budget to trim down to.
+            summarizer: Optional callable taking the previous summary (str or
+                None) and the dropped messages, returning the new summary.
+            chars_per_token (float): The initial characters per token estimate.
+        """
+        self.system_prompts = list(system_prompts)
+        self.max_tokens = max_tokens
+        self.min_messages = min_messages
+        self.low_water_ratio = low_water_ratio
+        self.summarizer = summarizer
+        self.chars_per_token = chars_per_token
+
+        self.summary = None
+        self._messages = deque()
+        self._message_chars = 0
+        self._system_chars = sum(len(p.get("text", "")) for p in self.system_prompts)
+        self._summary_chars = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    @property
+    def messages(self):
+        """The messages to send, oldest first."""
+        return [message for message, _ in self._messages]
+
+    @property
+    def system(self):
+        """The system prompts to send, including the summary if there is one."""
+        if self.summary is None:
+            return self.system_prompts
+        return self.system_prompts + [
+            {"text": f"Summary of the earlier conversation: {self.summary}"}
+        ]
+
+    @property
+    def estimated_tokens(self):
+        """The estimated input tokens of the current window."""
+        chars = self._system_chars + self._summary_chars + self._message_chars
+        return chars / self.chars_per_token
+
+    def append(self, message):
+        """
+        Adds a message and trims the window if it went over budget.
+        Args:
+            message (JSON): The user or assistant message to add.
+        """
+        chars = message_chars(message)
+        self._messages.append((message, chars))
+        self._message_chars += chars
+        if self.estimated_tokens > self.max_tokens:
+            self._trim()
+
+    def calibrate(self, input_tokens):
+        """
+        Refines the characters per token estimate from a model response.
+
+        Call with `response["usage"]["inputTokens"]` of the request that sent
+        the current window (before the model reply is appended).
+        Args:
+            input_tokens (int): The input tokens the model actually counted.
+        """
+        chars = self._system_chars + self._summary_chars + self._message_chars
+        if input_tokens > 0 and chars > 0:
+            self.chars_per_token = chars / input_tokens
+
+    def _trim(self):
+        target = self.max_tokens * self.low_water_ratio
+        dropped = []
+        while (
+            len(self._messages) > self.min_messages and self.estimated_tokens > target
+        ):
+            dropped.append(self._pop_oldest())
+
+        # The Converse API requires the conversation to start with a user turn.
+        while len(self._messages) > 1 and self._messages[0][0]["role"] != "user":
+            dropped.append(self._pop_oldest())
+
+        if not dropped:
+            return
+
+        logger.info("Dropped %s messages from the conversation", len(dropped))
+        if self.summarizer is not None:
+            self.summary = self.summarizer(self.summary, dropped)
+            self._summary_chars = len(self.summary)
+
+    def _pop_oldest(self):
+        message, chars = self._messages.popleft()
+        self._message_chars -= chars
+        return message
+
+
+def model_summarizer(bedrock_client, model_id, max_tokens=300):
+    """
+    Builds a summarizer that asks a model to condense dropped turns.
+    Args:
+        bedrock_client: The Boto3 Bedrock runtime client.
+        model_id (str): The model ID to use for summaries.
+        max_tokens (int): The maximum length of a summary.
+
+    Returns:
+        A callable suitable for ConversationHistory(summarizer=...).
+    """
+
+    def summarize(previous_summary, messages):
+        lines = []
+        if previous_summary:
+            lines.append(f"Earlier summary: {previous_summary}")
+        for message in messages:
+            for content in message["content"]:
+                if "text" in content:
+                    lines.append(f"{message['role']}: {content['text']}")
+
+        response = bedrock_client.converse(
+            modelId=model_id,
+            messages=[{"role": "user", "content": [{"text": "\n".join(lines)}]}],
+            system=[
+                {
+                    "text": "Summarize this conversation in a few sentences, "
+                    "keeping any facts, names and decisions."
+                }
+            ],
+            inferenceConfig={"maxTokens": max_tokens, "temperature": 0},
+        )
+        return response["output"]["message"]["content"][0]["text"]
+
+    return summarize
@@ -1,26 +1,197 @@
-import json
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+Shows how to use the InvokeModel and InvokeModelWithResponseStream APIs with
+any model family that has a registered codec.
+"""
+
+import logging
+import time
 
 import boto3
+from botocore.exceptions import ClientError
+from metrics import default_collector
+from model_codecs import codec_for, loads
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+
+def invoke(bedrock_client, model_id, prompt, collector=default_collector, **params):
+    """
+    Invokes a model with its native request body.
+    Args:
+        bedrock_client: The Boto3 Bedrock runtime client.
+        model_id (str): The model ID to use.
+        prompt (str): The prompt to send.
+        collector (MetricsCollector): Where to record usage and latency.
+        **params: Inference parameters: max_tokens, temperature, top_p and
+            any model specific fields.
+
+    Returns:
+        Completion: The generated text, stop reason and token counts.
+    """
+
+    logger.info("Invoking model %s", model_id)
+
+    codec = codec_for(model_id)
+    started = time.perf_counter()
+    try:
+        response = bedrock_client.invoke_model(
+            body=codec.encode(codec.build_request(prompt, **params)),
+            modelId=model_id,
+            accept=codec.accept,
+            contentType=codec.content_type,
+        )
+        completion = codec.parse_response(loads(response["body"].read()))
+    except ClientError:
+        collector.record(
+            model_id, "invoke_model", time.perf_counter() - started, error=True
+        )
+        raise
+
+    collector.record(
+        model_id,
+        "invoke_model",
+        time.perf_counter() - started,
+        input_tokens=completion.input_tokens,
+        output_tokens=completion.output_tokens,
+        stop_reason=completion.stop_reason,
+    )
+    return completion
+
+
+def invoke_stream(
+    bedrock_client, model_id, prompt, collector=default_collector, **params
+):
+    """
+    Invokes a model and yields the response as it is generated.
+    Args:
+        bedrock_client: The Boto3 Bedrock runtime client.
+        model_id (str): The model ID to use.
+        prompt (str): The prompt to send.
+        collector (MetricsCollector): Where to record usage and latency.
+        **params: Inference parameters, as for invoke().
+
+    Returns:
+        A generator of Chunk objects. The last chunk carries the invocation
+        metrics (token counts and latency) reported by Bedrock.
+    """
+
+    logger.info("Streaming invocation of model %s", model_id)
+
+    codec = codec_for(model_id)
+    started = time.perf_counter()
+    try:
+        response = bedrock_client.invoke_model_with_response_stream(
+            body=codec.encode(codec.build_request(prompt, **params)),
+            modelId=model_id,
+            accept=codec.accept,
+            contentType=codec.content_type,
+        )
+    except ClientError:
+        collector.record(
+            model_id,
+            "invoke_model_with_response_stream",
+            time.perf_counter() - started,
+            error=True,
+        )
+        raise
+
+    first_token = None
+    stop_reason = None
+    metrics = {}
+    # Stays None if the consumer stops early, closes or abandons the generator.
+    outcome = None
+    stream = response["body"]
+    try:
+        for event in stream:
+            chunk = codec.decode_chunk(event)
+            if chunk is None:
+                continue
+            if chunk.text and first_token is None:
+                first_token = time.perf_counter() - started
+            stop_reason = chunk.stop_reason or stop_reason
+            metrics = chunk.metrics or metrics
+            yield chunk
+        outcome = "complete"
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        stream.close()
+        collector.record(
+            model_id,
+            "invoke_model_with_response_stream",
+            time.perf_counter() - started,
+            input_tokens=metrics.get("inputTokenCount"),
+            output_tokens=metrics.get("outputTokenCount"),
+            stop_reason=stop_reason,
+            time_to_first_token=first_token,
+            error=outcome == "error",
+            cancelled=outcome is None,
+        )
+
+
+def embed(bedrock_client, model_id, text, **params):
+    """
+    Embeds text with an embedding model.
+    Args:
+        bedrock_client: The Boto3 Bedrock runtime client.
+        model_id (str): The embedding model ID to use.
+        text (str): The text to embed.
+        **params: Model specific fields, e.g. dimensions for Titan v2.
+
+    Returns:
+        list: The embedding vector.
+    """
+
+    codec = codec_for(model_id)
+    response = bedrock_client.invoke_model(
+        body=codec.encode(codec.build_request(text, **params)),
+        modelId=model_id,
+        accept=codec.accept,
+        contentType=codec.content_type,
+    )
+    return codec.parse_embedding(loads(response["body"].read()))
+
+
+def main():
+    """
+    Entrypoint for the InvokeModel example.
+    """
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    model_id = "meta.llama3-8b-instruct-v1:0"
+    prompt = "Explain black holes to 8th graders."
+
+    try:
+        bedrock_client = boto3.client(service_name="bedrock-runtime")
+
+        completion = invoke(
+            bedrock_client, model_id, prompt, temperature=0.1, top_p=0.9
+        )
+        print(completion.text)
 
-brt = boto3.client(service_name="bedrock-runtime")
+        for chunk in invoke_stream(
+            bedrock_client, model_id, prompt, temperature=0.1, top_p=0.9
+        ):
+            print(chunk.text, end="")
+            if chunk.stop_reason:
+                print(f"\nStop reason: {chunk.stop_reason}")
+            if chunk.metrics:
+                print(f"Invocation metrics: {chunk.metrics}")
 
-body = json.dumps(
-    {
-        "prompt": "\n\nHuman: explain black holes to 8th graders\n\nAssistant:",
-        # "max_tokens_to_sample": 300,
-        "temperature": 0.1,
-        "top_p": 0.9,
-    }
-)
+    except ClientError as err:
+        message = err.response["Error"]["Message"]
+        logger.error("A client error occurred: %s", message)
+        print(f"A client error occured: {message}")
 
-modelId = "meta.llama3-8b-instruct-v1:0"
-accept = "application/json"
-contentType = "application/json"
+    else:
+        print(f"Finished invoking model {model_id}.")
+        print(default_collector.to_prometheus())
 
-response = brt.invoke_model(
-    body=body, modelId=modelId, accept=accept, contentType=contentType
-)
 
-response_body = json.loads(response.get("body").read())
-# text
-print(response_body.get("generation"))
+if __name__ == "__main__":
+    main()
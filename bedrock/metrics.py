@@ -0,0 +1,282 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+Collects token usage, latency, stop reasons and estimated cost of Bedrock calls.
+
+The converse, converse_stream and invoke examples record every call into
+`default_collector`. Aggregates are kept in memory per model and operation,
+with fixed-bucket latency histograms so recording a call is a few additions
+under a lock. Snapshots can be exported as JSON or in the Prometheus text
+exposition format.
+"""
+
+import json
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# On-demand USD prices per 1,000 input and output tokens in us-east-1, by model
+# ID prefix. Check current pricing and override with set_price() as needed.
+PRICES_PER_1K_TOKENS = {
+    "meta.llama3-8b-instruct": (0.0003, 0.0006),
+    "meta.llama3-70b-instruct": (0.00265, 0.0035),
+    "anthropic.claude-3-haiku": (0.00025, 0.00125),
+    "anthropic.claude-3-sonnet": (0.003, 0.015),
+    "anthropic.claude-3-5-sonnet": (0.003, 0.015),
+    "amazon.titan-text-express": (0.0002, 0.0006),
+    "amazon.titan-text-lite": (0.00015, 0.0002),
+    "amazon.titan-embed-text-v2": (0.00002, 0.0),
+    "mistral.mistral-7b-instruct": (0.00015, 0.0002),
+}
+
+
+class Histogram:
+    """A cumulative-friendly histogram with fixed bucket bounds."""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # One extra bucket for values above the last bound (+Inf).
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimates a quantile as the upper bound of the bucket containing it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "buckets": dict(zip([str(b) for b in self.bounds] + ["+Inf"], self.counts)),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class _CallStats:
+    __slots__ = (
+        "calls",
+        "errors",
+        "cancelled",
+        "input_tokens",
+        "output_tokens",
+        "cost",
+        "stop_reasons",
+        "latency",
+        "time_to_first_token",
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.stop_reasons = Counter()
+        self.latency = Histogram()
+        self.time_to_first_token = Histogram()
+
+
+def _base_model_id(model_id):
+    # Cross-region inference profiles, e.g. "us.anthropic.claude-3-haiku-...".
+    head, _, rest = model_id.partition(".")
+    return rest if head in ("us", "eu", "apac", "us-gov") and rest else model_id
+
+
+class MetricsCollector:
+    """In-memory aggregates of Bedrock calls, keyed by model and operation."""
+
+    def __init__(self, prices=None):
+        """
+        Args:
+            prices (dict): Optional prices per 1,000 input and output tokens by
+                model ID prefix. Defaults to PRICES_PER_1K_TOKENS.
+        """
+        self.prices = dict(PRICES_PER_1K_TOKENS if prices is None else prices)
+        self._stats = {}
+        self._price_cache = {}
+        self._lock = threading.Lock()
+
+    def set_price(self, model_prefix, input_per_1k, output_per_1k):
+        """Sets the price per 1,000 tokens for models starting with a prefix."""
+        with self._lock:
+            self.prices[model_prefix] = (input_per_1k, output_per_1k)
+            self._price_cache.clear()
+
+    def estimate_cost(self, model_id, input_tokens, output_tokens):
+        """
+        Returns:
+            float: The estimated USD cost, or 0.0 for models without a price.
+        """
+        price = self._price_cache.get(model_id)
+        if price is None:
+            base_id = _base_model_id(model_id)
+            matches = [prefix for prefix in self.prices if base_id.startswith(prefix)]
+            price = self.prices[max(matches, key=len)] if matches else (0.0, 0.0)
+            self._price_cache[model_id] = price
+        return (input_tokens * price[0] + output_tokens * price[1]) / 1000
+
+    def record(
+        self,
+        model_id,
+        operation,
+        latency,
+        input_tokens=0,
+        output_tokens=0,
+        stop_reason=None,
+        time_to_first_token=None,
+        error=False,
+        cancelled=False,
+    ):
+        """
+        Records one call.
+        Args:
+            model_id (str): The model ID that was called.
+            operation (str): The API operation, e.g. "converse".
+            latency (float): The client-side latency in seconds.
+            input_tokens (int): The input tokens reported by Bedrock.
+            output_tokens (int): The output tokens reported by Bedrock.
+            stop_reason (str): Why the model stopped generating.
+            time_to_first_token (float): Seconds to the first streamed token.
+            error (bool): True if the call failed.
+            cancelled (bool): True if a stream was closed before the response
+                ended; its tokens are those seen until then.
+        """
+        input_tokens = input_tokens or 0
+        output_tokens = output_tokens or 0
+        cost = self.estimate_cost(model_id, input_tokens, output_tokens)
+        key = (model_id, operation)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _CallStats()
+            stats.calls += 1
+            stats.latency.observe(latency)
+            if error:
+                stats.errors += 1
+                return
+            if cancelled:
+                stats.cancelled += 1
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost += cost
+            if stop_reason:
+                stats.stop_reasons[stop_reason] += 1
+            if time_to_first_token is not None:
+                stats.time_to_first_token.observe(time_to_first_token)
+
+    def reset(self):
+        """Discards everything recorded so far."""
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self):
+        """
+        Returns:
+            list: One dict of aggregates per model and operation.
+        """
+        with self._lock:
+            return [
+                {
+                    "model_id": model_id,
+                    "operation": operation,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "cancelled": stats.cancelled,
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                    "estimated_cost_usd": round(stats.cost, 6),
+                    "stop_reasons": dict(stats.stop_reasons),
+                    "latency_seconds": stats.latency.to_dict(),
+                    "time_to_first_token_seconds": (
+                        stats.time_to_first_token.to_dict()
+                    ),
+                }
+                for (model_id, operation), stats in self._stats.items()
+            ]
+
+    def to_json(self, **kwargs):
+        """Exports a snapshot as a JSON string."""
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self):
+        """Exports a snapshot in the Prometheus text exposition format."""
+        lines = []
+        counters = (
+            ("bedrock_calls_total", "Bedrock calls.", "calls"),
+            ("bedrock_errors_total", "Failed Bedrock calls.", "errors"),
+            (
+                "bedrock_cancelled_total",
+                "Streams closed before the response ended.",
+                "cancelled",
+            ),
+            ("bedrock_input_tokens_total", "Input tokens.", "input_tokens"),
+            ("bedrock_output_tokens_total", "Output tokens.", "output_tokens"),
+            (
+                "bedrock_estimated_cost_usd_total",
+                "Estimated cost in USD.",
+                "estimated_cost_usd",
+            ),
+        )
+        snapshot = self.snapshot()
+        for name, help_text, field in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for entry in snapshot:
+                lines.append(f"{name}{{{_labels(entry)}}} {entry[field]}")
+
+        lines.append("# HELP bedrock_stop_reasons_total Responses by stop reason.")
+        lines.append("# TYPE bedrock_stop_reasons_total counter")
+        for entry in snapshot:
+            for reason, count in entry["stop_reasons"].items():
+                labels = f'{_labels(entry)},stop_reason="{reason}"'
+                lines.append(f"bedrock_stop_reasons_total{{{labels}}} {count}")
+
+        for name, help_text, field in (
+            ("bedrock_latency_seconds", "Call latency.", "latency_seconds"),
+            (
+                "bedrock_time_to_first_token_seconds",
+                "Time to the first streamed token.",
+                "time_to_first_token_seconds",
+            ),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for entry in snapshot:
+                histogram = entry[field]
+                cumulative = 0
+                for bound, count in histogram["buckets"].items():
+                    cumulative += count
+                    labels = f'{_labels(entry)},le="{bound}"'
+                    lines.append(f"{name}_bucket{{{labels}}} {cumulative}")
+                lines.append(f"{name}_sum{{{_labels(entry)}}} {histogram['sum']}")
+                lines.append(f"{name}_count{{{_labels(entry)}}} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(entry):
+    return f'model_id="{entry["model_id"]}",operation="{entry["operation"]}"'
+
+
+default_collector = MetricsCollector()
@@ -0,0 +1,320 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+Request builders and response parsers for InvokeModel, by model family.
+
+Each model family on Bedrock has its own native request and response body.
+A codec hides those differences behind `build_request`, `parse_response` and
+`parse_chunk`, and `codec_for(model_id)` picks the codec for a model ID, so
+switching models needs no code changes. Streamed chunks are decoded one at a
+time as they arrive.
+"""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+try:
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+
+except ImportError:  # pragma: no cover - orjson is optional
+    import json
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    loads = json.loads
+
+
+# Cross-region inference profile IDs, e.g. "us.meta.llama3-8b-instruct-v1:0".
+_INFERENCE_PROFILE_PREFIXES = ("us.", "eu.", "apac.", "us-gov.")
+
+
+@dataclass
+class Completion:
+    """A complete model response."""
+
+    text: str
+    stop_reason: Optional[str] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+
+@dataclass
+class Chunk:
+    """A decoded piece of a streamed response."""
+
+    text: str = ""
+    stop_reason: Optional[str] = None
+    # amazon-bedrock-invocationMetrics, present on the last chunk.
+    metrics: dict = field(default_factory=dict)
+
+
+def _drop_none(params):
+    return {key: value for key, value in params.items() if value is not None}
+
+
+class ModelCodec:
+    """Base codec. Subclasses implement one model family's body format."""
+
+    content_type = "application/json"
+    accept = "application/json"
+
+    def build_request(
+        self, prompt, max_tokens=None, temperature=None, top_p=None, **extra
+    ):
+        raise NotImplementedError
+
+    def parse_response(self, body):
+        raise NotImplementedError
+
+    def parse_chunk(self, chunk):
+        raise NotImplementedError
+
+    def encode(self, request):
+        """Serialises a request body to bytes."""
+        return dumps(request)
+
+    def decode_chunk(self, event):
+        """
+        Decodes one event of an InvokeModelWithResponseStream body.
+        Args:
+            event (JSON): A stream event, e.g. {"chunk": {"bytes": b"..."}}.
+
+        Returns:
+            Chunk: The decoded chunk, or None if the event carries no chunk.
+        """
+        payload = event.get("chunk")
+        if payload is None:
+            return None
+        chunk = loads(payload["bytes"])
+        decoded = self.parse_chunk(chunk) or Chunk()
+        metrics = chunk.get("amazon-bedrock-invocationMetrics")
+        if metrics:
+            decoded.metrics = metrics
+        return decoded
+
+
+class LlamaCodec(ModelCodec):
+    """Meta Llama 3 instruct models."""
+
+    def build_request(
+        self, prompt, max_tokens=None, temperature=None, top_p=None, **extra
+    ):
+        formatted = (
+            "<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n"
+            f"{prompt}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
+        )
+        return _drop_none(
+            {
+                "prompt": formatted,
+                "max_gen_len": max_tokens,
+                "temperature": temperature,
+                "top_p": top_p,
+                **extra,
+            }
+        )
+
+    def parse_response(self, body):
+        return Completion(
+            text=body.get("generation", ""),
+            stop_reason=body.get("stop_reason"),
+            input_tokens=body.get("prompt_token_count"),
+            output_tokens=body.get("generation_token_count"),
+        )
+
+    def parse_chunk(self, chunk):
+        return Chunk(chunk.get("generation") or "", chunk.get("stop_reason"))
+
+
+class AnthropicCodec(ModelCodec):
+    """Anthropic Claude models, using the Messages API body."""
+
+    def build_request(
+        self, prompt, max_tokens=None, temperature=None, top_p=None, **extra
+    ):
+        return _drop_none(
+            {
+                "anthropic_version": "bedrock-2023-05-31",
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens or 512,
+                "temperature": temperature,
+                "top_p": top_p,
+                **extra,
+            }
+        )
+
+    def parse_response(self, body):
+        usage = body.get("usage", {})
+        return Completion(
+            text="".join(
+                content.get("text", "")
+                for content in body.get("content", [])
+                if content.get("type") == "text"
+            ),
+            stop_reason=body.get("stop_reason"),
+            input_tokens=usage.get("input_tokens"),
+            output_tokens=usage.get("output_tokens"),
+        )
+
+    def parse_chunk(self, chunk):
+        kind = chunk.get("type")
+        if kind == "content_block_delta":
+            return Chunk(chunk["delta"].get("text", ""))
+        if kind == "message_delta":
+            return Chunk(stop_reason=chunk["delta"].get("stop_reason"))
+        return None
+
+
+class TitanTextCodec(ModelCodec):
+    """Amazon Titan text models."""
+
+    def build_request(
+        self, prompt, max_tokens=None, temperature=None, top_p=None, **extra
+    ):
+        return {
+            "inputText": prompt,
+            "textGenerationConfig": _drop_none(
+                {
+                    "maxTokenCount": max_tokens,
+                    "temperature": temperature,
+                    "topP": top_p,
+                    **extra,
+                }
+            ),
+        }
+
+    def parse_response(self, body):
+        result = body["results"][0]
+        return Completion(
+            text=result.get("outputText", ""),
+            stop_reason=result.get("completionReason"),
+            input_tokens=body.get("inputTextTokenCount"),
+            output_tokens=result.get("tokenCount"),
+        )
+
+    def parse_chunk(self, chunk):
+        return Chunk(chunk.get("outputText", ""), chunk.get("completionReason"))
+
+
+class TitanEmbeddingCodec(ModelCodec):
+    """Amazon Titan text embedding models. The completion text is unused."""
+
+    def build_request(
+        self, prompt, max_tokens=None, temperature=None, top_p=None, **extra
+    ):
+        return {"inputText": prompt, **extra}
+
+    def parse_response(self, body):
+        return Completion(text="", input_tokens=body.get("inputTextTokenCount"))
+
+    def parse_embedding(self, body):
+        return body["embedding"]
+
+    def parse_chunk(self, chunk):
+        raise ValueError("Embedding models don't stream.")
+
+
+class MistralCodec(ModelCodec):
+    """Mistral AI text models."""
+
+    def build_request(
+        self, prompt, max_tokens=None, temperature=None, top_p=None, **extra
+    ):
+        return _drop_none(
+            {
+                "prompt": f"<s>[INST] {prompt} [/INST]",
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "top_p": top_p,
+                **extra,
+            }
+        )
+
+    def parse_response(self, body):
+        output = body["outputs"][0]
+        return Completion(
+            text=output.get("text", ""), stop_reason=output.get("stop_reason")
+        )
+
+    def parse_chunk(self, chunk):
+        output = chunk["outputs"][0]
+        return Chunk(output.get("text", ""), output.get("stop_reason"))
+
+
+class CohereCommandRCodec(ModelCodec):
+    """Cohere Command R and R+ models."""
+
+    def build_request(
+        self, prompt, max_tokens=None, temperature=None, top_p=None, **extra
+    ):
+        return _drop_none(
+            {
+                "message": prompt,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "p": top_p,
+                **extra,
+            }
+        )
+
+    def parse_response(self, body):
+        return Completion(
+            text=body.get("text", ""), stop_reason=body.get("finish_reason")
+        )
+
+    def parse_chunk(self, chunk):
+        if chunk.get("event_type") == "text-generation":
+            return Chunk(chunk.get("text", ""))
+        if chunk.get("event_type") == "stream-end":
+            return Chunk(stop_reason=chunk.get("finish_reason"))
+        return None
+
+
+_CODECS = {}
+
+
+def register_codec(model_prefix, codec):
+    """
+    Registers a codec for every model ID starting with a prefix.
+    Args:
+        model_prefix (str): A model ID prefix, e.g. "meta.llama3".
+        codec (ModelCodec): The codec to use for matching models.
+    """
+    _CODECS[model_prefix] = codec
+    codec_for.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def codec_for(model_id):
+    """
+    Finds the codec for a model ID, preferring the longest matching prefix.
+    Args:
+        model_id (str): A model ID or cross-region inference profile ID.
+
+    Returns:
+        ModelCodec: The codec for the model's family.
+    """
+    base_id = model_id
+    for prefix in _INFERENCE_PROFILE_PREFIXES:
+        if model_id.startswith(prefix):
+            base_id = model_id[len(prefix) :]
+            break
+
+    matches = [prefix for prefix in _CODECS if base_id.startswith(prefix)]
+    if not matches:
+        raise ValueError(f"No codec registered for model {model_id}.")
+    return _CODECS[max(matches, key=len)]
+
+
+register_codec("meta.llama3", LlamaCodec())
+register_codec("anthropic.claude", AnthropicCodec())
+register_codec("amazon.titan-text", TitanTextCodec())
+register_codec("amazon.titan-embed-text", TitanEmbeddingCodec())
+register_codec("mistral.", MistralCodec())
+register_codec("cohere.command-r", CohereCommandRCodec())
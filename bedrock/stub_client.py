@@ -0,0 +1,174 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+A local stand-in for the Boto3 Bedrock runtime client.
+
+It serves canned responses with configurable latency and raises
+ThrottlingException once more than `capacity` requests are in flight (or at
+random with `throttle_rate`), so throughput and throttling behaviour can be
+exercised without calling AWS.
+"""
+
+import io
+import json
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+def _throttling_error(operation_name):
+    return ClientError(
+        {
+            "Error": {"Code": "ThrottlingException", "Message": "Too many requests"},
+            "ResponseMetadata": {"HTTPStatusCode": 429},
+        },
+        operation_name,
+    )
+
+
+class _StubEventStream:
+    def __init__(self, events, token_latency):
+        self._events = events
+        self._token_latency = token_latency
+        self.closed = False
+
+    def __iter__(self):
+        for event in self._events:
+            if self.closed:
+                return
+            if "contentBlockDelta" in event or "chunk" in event:
+                time.sleep(self._token_latency)
+            yield event
+
+    def close(self):
+        self.closed = True
+
+
+class StubBedrockRuntimeClient:
+    """
+    Implements converse, converse_stream and invoke_model like the Bedrock
+    runtime client, without network calls.
+    """
+
+    def __init__(
+        self,
+        capacity=8,
+        latency=0.05,
+        latency_jitter=0.02,
+        throttle_rate=0.0,
+        token_latency=0.005,
+        reply="This is a stubbed reply from the model.",
+        seed=None,
+    ):
+        """
+        Args:
+            capacity (int): Concurrent requests served before throttling.
+            latency (float): Mean seconds until a response (or first token).
+            latency_jitter (float): Uniform jitter added to `latency`.
+            throttle_rate (float): Probability of throttling any request.
+            token_latency (float): Seconds between streamed tokens.
+            reply (str): The text every model replies with.
+            seed (int): Optional seed for reproducible runs.
+        """
+        self.capacity = capacity
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.throttle_rate = throttle_rate
+        self.token_latency = token_latency
+        self.reply = reply
+
+        self.calls = 0
+        self.throttles = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def _admit(self, operation_name):
+        with self._lock:
+            self.calls += 1
+            if (
+                self._in_flight >= self.capacity
+                or self._random.random() < self.throttle_rate
+            ):
+                self.throttles += 1
+                raise _throttling_error(operation_name)
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            delay = self.latency + self._random.uniform(0, self.latency_jitter)
+        return delay
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _usage(self, messages):
+        input_tokens = sum(
+            len(content.get("text", "").split())
+            for message in messages
+            for content in message["content"]
+        )
+        output_tokens = len(self.reply.split())
+        return {
+            "inputTokens": input_tokens,
+            "outputTokens": output_tokens,
+            "totalTokens": input_tokens + output_tokens,
+        }
+
+    def converse(self, modelId, messages, **kwargs):
+        delay = self._admit("Converse")
+        try:
+            time.sleep(delay)
+        finally:
+            self._release()
+        return {
+            "output": {
+                "message": {"role": "assistant", "content": [{"text": self.reply}]}
+            },
+            "stopReason": "end_turn",
+            "usage": self._usage(messages),
+            "metrics": {"latencyMs": int(delay * 1000)},
+        }
+
+    def converse_stream(self, modelId, messages, **kwargs):
+        delay = self._admit("ConverseStream")
+        try:
+            time.sleep(delay)
+        finally:
+            self._release()
+        words = self.reply.split(" ")
+        events = [{"messageStart": {"role": "assistant"}}]
+        events += [
+            {
+                "contentBlockDelta": {
+                    "delta": {"text": word + " "},
+                    "contentBlockIndex": 0,
+                }
+            }
+            for word in words
+        ]
+        events += [
+            {"contentBlockStop": {"contentBlockIndex": 0}},
+            {"messageStop": {"stopReason": "end_turn"}},
+            {
+                "metadata": {
+                    "usage": self._usage(messages),
+                    "metrics": {"latencyMs": int(delay * 1000)},
+                }
+            },
+        ]
+        return {"stream": _StubEventStream(events, self.token_latency)}
+
+    def invoke_model(self, body, modelId, **kwargs):
+        delay = self._admit("InvokeModel")
+        try:
+            time.sleep(delay)
+        finally:
+            self._release()
+        payload = json.dumps({"generation": self.reply, "stop_reason": "stop"})
+        return {
+            "body": io.BytesIO(payload.encode()),
+            "contentType": "application/json",
+        }
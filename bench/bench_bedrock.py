@@ -0,0 +1,106 @@
+"""
+Benchmarks the Converse and ConverseStream helpers in bedrock/ against
+StubBedrockRuntimeClient.
+
+The stub's response latency and per-token delay are injected from the
+options. The stub's capacity is set above --concurrency, so no request is
+throttled unless --throttle-rate is set. Streaming reports the full response
+and the time to first token as separate results.
+
+    python bench_bedrock.py [--count N] [--concurrency N] [--token-ms N]
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+from harness import BenchResult, argument_parser, emit, measure, rounds
+from stubs import synthetic_passages
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "bedrock")]
+
+from converse import generate_conversation  # noqa: E402
+from converse_stream import TextDelta, astream_conversation  # noqa: E402
+from stub_client import StubBedrockRuntimeClient  # noqa: E402
+
+MODEL_ID = "meta.llama3-8b-instruct-v1:0"
+
+
+async def run(args) -> list:
+    # The helpers log every call at INFO.
+    for name in ("converse", "converse_stream"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    client = StubBedrockRuntimeClient(
+        capacity=args.concurrency * 2,
+        latency=args.latency_ms / 1000,
+        latency_jitter=args.jitter_ms / 1000,
+        throttle_rate=args.throttle_rate,
+        token_latency=args.token_ms / 1000,
+        reply=synthetic_passages(1, args.reply_words, seed=args.seed)[0],
+        seed=args.seed,
+    )
+    prompts = synthetic_passages(args.count, 200, seed=args.seed)
+    system = [{"text": "Answer from the sources."}]
+
+    def messages(i):
+        return [{"role": "user", "content": [{"text": prompts[i]}]}]
+
+    async def converse(i):
+        await asyncio.to_thread(
+            generate_conversation, client, MODEL_ID, system, messages(i)
+        )
+
+    first_token = BenchResult("bedrock.converse_stream.ttft")
+    calls = 0
+
+    async def converse_stream(i):
+        nonlocal calls
+        # measure() makes the warm-up calls first; they are left out of the TTFT.
+        warmup = calls < args.warmup
+        calls += 1
+        started = time.perf_counter()
+        first = None
+        async for event in astream_conversation(
+            client, MODEL_ID, messages(i), system, {"temperature": 0.5}
+        ):
+            if first is None and isinstance(event, TextDelta):
+                first = time.perf_counter() - started
+        if first is None:
+            raise RuntimeError("stream ended without any text")
+        if not warmup:
+            first_token.latencies.append(first)
+
+    results = [
+        await measure(
+            "bedrock.converse", converse, args.count, args.concurrency, **rounds(args)
+        ),
+        await measure(
+            "bedrock.converse_stream",
+            converse_stream,
+            args.count,
+            args.concurrency,
+            **rounds(args),
+        ),
+    ]
+    first_token.errors = results[-1].errors
+    first_token.seconds = results[-1].seconds
+    first_token.rounds = results[-1].rounds
+    results.append(first_token)
+    return results
+
+
+def main():
+    parser = argument_parser("Benchmark Converse and ConverseStream on a stub")
+    parser.add_argument("--token-ms", type=float, default=2.0, help="Per token")
+    parser.add_argument("--reply-words", type=int, default=60)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    emit(asyncio.run(run(args)), args.json)
+
+
+if __name__ == "__main__":
+    main()
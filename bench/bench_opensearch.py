@@ -0,0 +1,155 @@
+"""
+Benchmarks bulk indexing (ingest/indexer.py) and hybrid search
+(opensearch/search.py) against a stub or a local OpenSearch container.
+
+By default requests go to StubOpenSearchClient, with the injected latency.
+With --opensearch the real client talks to a local cluster, e.g.
+
+    docker run -p 9200:9200 -e discovery.type=single-node \
+        -e DISABLE_SECURITY_PLUGIN=true opensearchproject/opensearch:2.13.0
+    python bench_opensearch.py --opensearch http://localhost:9200
+
+and a scratch index is created for the run and deleted after it.
+"""
+
+import asyncio
+import os
+import random
+import sys
+from pathlib import Path
+
+from harness import argument_parser, emit, latency_model, measure, rounds
+from stubs import StubOpenSearchClient, synthetic_passages, synthetic_vectors
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "ingest"), str(ROOT / "opensearch")]
+
+from indexer import BulkIndexer  # noqa: E402
+from search import hybrid_query  # noqa: E402
+
+INDEX_NAME = "bench-documents"
+
+
+async def container_client(url: str, dimensions: int):
+    from opensearchpy import AsyncOpenSearch
+
+    user, password = os.getenv("OPENSEARCH_USER"), os.getenv("OPENSEARCH_PASSWORD")
+    client = AsyncOpenSearch(
+        hosts=[url],
+        http_auth=(user, password) if user else None,
+        verify_certs=False,
+        ssl_show_warn=False,
+        timeout=60,
+    )
+    if await client.indices.exists(index=INDEX_NAME):
+        await client.indices.delete(index=INDEX_NAME)
+    await client.indices.create(
+        index=INDEX_NAME,
+        body={
+            "settings": {"index": {"knn": True}},
+            "mappings": {
+                "properties": {
+                    "embedding": {
+                        "type": "knn_vector",
+                        "dimension": dimensions,
+                        "method": {
+                            "engine": "nmslib",
+                            "name": "hnsw",
+                            "space_type": "cosinesimil",
+                        },
+                    },
+                    "content": {"type": "text"},
+                    "sourcepage": {"type": "text"},
+                    "tags": {"type": "long"},
+                }
+            },
+        },
+    )
+    return client
+
+
+async def run(args) -> list:
+    if args.opensearch:
+        client = await container_client(args.opensearch, args.dimensions)
+    else:
+        client = StubOpenSearchClient(latency_model(args))
+
+    documents = args.count * args.batch
+    passages = synthetic_passages(documents, seed=args.seed)
+    vectors = synthetic_vectors(documents, args.dimensions, seed=args.seed)
+    indexer = BulkIndexer(client, INDEX_NAME, max_docs=args.batch)
+
+    async def index(i):
+        # One bulk request of `batch` documents per operation.
+        for n in range(i * args.batch, (i + 1) * args.batch):
+            await indexer.add(
+                {
+                    "content": passages[n],
+                    "sourcepage": f"bench.pdf#page={n}",
+                    "tags": [n % 5],
+                    "embedding": vectors[n],
+                }
+            )
+        await indexer.flush()
+        if indexer.stats.failed:
+            raise RuntimeError(f"{indexer.stats.failed} documents failed")
+
+    rng = random.Random(args.seed)
+    queries = [
+        (" ".join(passages[rng.randrange(documents)].split()[:6]), vector)
+        for vector in synthetic_vectors(args.count, args.dimensions, seed=args.seed + 1)
+    ]
+
+    async def search(i):
+        text, vector = queries[i]
+        response = await client.search(
+            body=hybrid_query(
+                text,
+                vector,
+                tags=[i % 5] if i % 2 else None,
+                source=["content", "sourcepage"],
+            ),
+            index=INDEX_NAME,
+        )
+        if not response["hits"]["hits"]:
+            raise RuntimeError(f"no hits for {text!r}")
+
+    try:
+        results = [
+            await measure(
+                "opensearch.index",
+                index,
+                args.count,
+                items_per_operation=args.batch,
+                **rounds(args),
+            )
+        ]
+        if args.opensearch:
+            await client.indices.refresh(index=INDEX_NAME)
+        results.append(
+            await measure(
+                "opensearch.search",
+                search,
+                args.count,
+                args.concurrency,
+                **rounds(args),
+            )
+        )
+    finally:
+        if args.opensearch:
+            await client.indices.delete(index=INDEX_NAME)
+        await client.close()
+    return results
+
+
+def main():
+    parser = argument_parser("Benchmark bulk indexing and hybrid search")
+    parser.add_argument("--opensearch", help="URL of a local OpenSearch cluster")
+    parser.add_argument("--batch", type=int, default=100, help="Documents per bulk")
+    parser.add_argument("--dimensions", type=int, default=256)
+    args = parser.parse_args()
+    emit(asyncio.run(run(args)), args.json)
+
+
+if __name__ == "__main__":
+    main()
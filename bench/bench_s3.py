@@ -0,0 +1,141 @@
+"""
+Benchmarks the S3 helpers in s3/ against a local moto server.
+
+The helpers build their own aioboto3 sessions from the environment, so they
+run unmodified: AWS_ENDPOINT_URL points every client at the moto server, and
+the access keys are moto's dummies. Every request is delayed by the injected
+latency. The benchmarks are skipped if moto isn't installed.
+
+    python bench_s3.py [--count N] [--concurrency N] [--size-kib N] [--json PATH]
+"""
+
+import asyncio
+import io
+import logging
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from harness import (
+    BenchResult,
+    argument_parser,
+    aws_latency,
+    emit,
+    latency_model,
+    measure,
+    rounds,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+BUCKET = "bench-s3"
+NAMES = ("s3.upload", "s3.list", "s3.download")
+
+
+def start_moto():
+    """Starts moto on a free port and points AWS clients at it."""
+    from moto.server import ThreadedMotoServer
+
+    # werkzeug logs every request at INFO, which would swamp the results.
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    os.environ.update(
+        AWS_ENDPOINT_URL=f"http://{host}:{port}",
+        AWS_ACCESS_KEY="testing",
+        AWS_SECRET_KEY="testing",
+        AWS_ACCESS_KEY_ID="testing",
+        AWS_SECRET_ACCESS_KEY="testing",
+        AWS_DEFAULT_REGION="us-east-1",
+    )
+    return server
+
+
+async def run(args) -> list:
+    # Imported once the environment points at moto; constants.py reads the
+    # keys at import.
+    sys.path[:0] = [str(ROOT / "s3")]
+    import aioboto3
+    from download_file import get_chunks
+    from list_files import list_objects
+    from upload_file import upload_file
+
+    session = aioboto3.Session()
+    async with session.client("s3") as s3_client:
+        await s3_client.create_bucket(Bucket=BUCKET)
+
+    with tempfile.NamedTemporaryFile(suffix=".bin") as payload:
+        payload.write(os.urandom(args.size_kib * 1024))
+        payload.flush()
+
+        async def upload(i):
+            if await upload_file(payload.name, BUCKET, f"bench/{i}.bin") is None:
+                raise RuntimeError("upload_file failed")
+
+        with aws_latency(latency_model(args)):
+            results = [
+                await measure(
+                    "s3.upload", upload, args.count, args.concurrency, **rounds(args)
+                )
+            ]
+
+            async def list_all(i):
+                # list_objects prints every key.
+                with redirect_stdout(io.StringIO()):
+                    await list_objects(BUCKET)
+
+            results.append(
+                await measure(
+                    "s3.list",
+                    list_all,
+                    max(1, args.count // 10),
+                    args.concurrency,
+                    **rounds(args),
+                )
+            )
+
+            async with session.client("s3") as s3_client:
+
+                async def download(i):
+                    response = await s3_client.get_object(
+                        Bucket=BUCKET, Key=f"bench/{i}.bin"
+                    )
+                    async for _ in get_chunks(response["Body"], 64 * 1024):
+                        pass
+
+                results.append(
+                    await measure(
+                        "s3.download",
+                        download,
+                        args.count,
+                        args.concurrency,
+                        **rounds(args),
+                    )
+                )
+    return results
+
+
+def main():
+    parser = argument_parser("Benchmark the S3 helpers against moto")
+    parser.add_argument("--size-kib", type=int, default=256, help="Object size")
+    args = parser.parse_args()
+
+    try:
+        server = start_moto()
+    except ImportError:
+        emit(
+            [BenchResult(name, skipped="moto not installed") for name in NAMES],
+            args.json,
+        )
+        return
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        server.stop()
+    emit(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmarks parsing Textract responses: table reconstruction
+(textract/tables.py) and the page-by-page chunking that ingestion uses
+(ingest/documents.py), on synthetic blocks from textract/stub_client.py.
+
+Parsing runs locally, so no latency is injected. Throughput is in document
+pages per second.
+
+    python bench_textract.py [--count N] [--pages N] [--tables N] [--rows N]
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from harness import argument_parser, emit, measure, measure_sync, rounds
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "ingest"), str(ROOT / "textract")]
+
+from documents import page_documents, split_pages  # noqa: E402
+from stub_client import synthetic_blocks  # noqa: E402
+from tables import extract_tables  # noqa: E402
+
+
+async def run(args) -> list:
+    blocks = synthetic_blocks(
+        pages=args.pages,
+        lines_per_page=40,
+        tables_per_page=args.tables,
+        rows=args.rows,
+        columns=5,
+    )
+    # Textract hands out results in pages of up to 1000 blocks.
+    result_pages = [blocks[i : i + 1000] for i in range(0, len(blocks), 1000)]
+
+    def tables(i):
+        for table in extract_tables(blocks):
+            table.to_html()
+
+    async def chunks(i):
+        async def results():
+            for result_page in result_pages:
+                yield result_page
+
+        async for page, page_blocks in split_pages(results()):
+            page_documents(page, page_blocks)
+
+    return [
+        measure_sync(
+            "textract.tables",
+            tables,
+            args.count,
+            items_per_operation=args.pages,
+            **rounds(args),
+        ),
+        await measure(
+            "textract.documents",
+            chunks,
+            args.count,
+            items_per_operation=args.pages,
+            **rounds(args),
+        ),
+    ]
+
+
+def main():
+    parser = argument_parser("Benchmark Textract response parsing")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document")
+    parser.add_argument("--tables", type=int, default=2, help="Tables per page")
+    parser.add_argument("--rows", type=int, default=20, help="Rows per table")
+    parser.set_defaults(count=50)
+    args = parser.parse_args()
+    emit(asyncio.run(run(args)), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Timing, reporting and baseline comparison shared by the benchmark scripts.
+
+A benchmark warms up with a few unrecorded calls, then runs one operation
+`count` times with `concurrency` callers, in several rounds, and records
+every call's latency. Throughput is the median round's, so one slow round
+doesn't move it, and percentiles are taken over the calls of all rounds, so
+p99 rests on more than a handful of samples. Results print as one table row
+each. Each bench_*.py script can write its results as JSON, and run.py
+compares them with a baseline.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+
+def percentile(ordered: list, q: float) -> float:
+    """The q-th percentile (0-100) of sorted values, by nearest rank."""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(q / 100 * len(ordered)) - 1
+    return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+@dataclass
+class BenchResult:
+    name: str
+    seconds: float = 0.0
+    latencies: list = field(default_factory=list, repr=False)
+    errors: int = 0
+    # Units of work per operation, e.g. pages parsed or documents indexed,
+    # so throughput reads as work per second rather than calls per second.
+    items_per_operation: int = 1
+    skipped: str = None
+    # Operations per second of each round.
+    rounds: list = field(default_factory=list, repr=False)
+
+    def to_dict(self) -> dict:
+        if self.skipped:
+            return {"name": self.name, "skipped": self.skipped}
+        ordered = sorted(self.latencies)
+        operations = len(ordered)
+        if self.rounds:
+            per_second = statistics.median(self.rounds) * self.items_per_operation
+        elif self.seconds:
+            per_second = operations * self.items_per_operation / self.seconds
+        else:
+            per_second = 0.0
+        return {
+            "name": self.name,
+            "operations": operations,
+            "rounds": len(self.rounds),
+            "errors": self.errors,
+            "seconds": self.seconds,
+            "per_second": per_second,
+            "mean_ms": sum(ordered) / operations * 1000 if operations else 0.0,
+            "p50_ms": percentile(ordered, 50) * 1000,
+            "p95_ms": percentile(ordered, 95) * 1000,
+            "p99_ms": percentile(ordered, 99) * 1000,
+            "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+        }
+
+
+async def measure(
+    name: str,
+    operation,
+    count: int,
+    concurrency: int = 1,
+    items_per_operation: int = 1,
+    warmup: int = 0,
+    rounds: int = 1,
+) -> BenchResult:
+    """Awaits operation(i) for i in range(count), concurrency at a time.
+
+    Failed calls are counted as errors and left out of the latencies.
+
+    :param warmup: Unrecorded calls first, with i cycling through range(count)
+    :param rounds: Times the count calls are made and recorded
+    """
+    result = BenchResult(name, items_per_operation=items_per_operation)
+
+    async def calls(numbers, record: bool):
+        numbers = iter(numbers)
+
+        async def caller():
+            for i in numbers:
+                started = time.perf_counter()
+                try:
+                    await operation(i)
+                except Exception as error:
+                    if record:
+                        result.errors += 1
+                        if result.errors == 1:
+                            print(f"{name}: {error!r}")
+                    continue
+                if record:
+                    result.latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(caller() for _ in range(concurrency)))
+
+    await calls((i % count for i in range(warmup)), record=False)
+    for _ in range(rounds):
+        succeeded = len(result.latencies)
+        started = time.perf_counter()
+        await calls(range(count), record=True)
+        seconds = time.perf_counter() - started
+        succeeded = len(result.latencies) - succeeded
+        result.seconds += seconds
+        result.rounds.append(succeeded / seconds if seconds else 0.0)
+    return result
+
+
+def measure_sync(
+    name: str,
+    operation,
+    count: int,
+    items_per_operation: int = 1,
+    warmup: int = 0,
+    rounds: int = 1,
+) -> BenchResult:
+    """Calls operation(i) for i in range(count) on this thread, like measure()."""
+    result = BenchResult(name, items_per_operation=items_per_operation)
+
+    def calls(numbers, record: bool):
+        for i in numbers:
+            started = time.perf_counter()
+            try:
+                operation(i)
+            except Exception as error:
+                if record:
+                    result.errors += 1
+                    if result.errors == 1:
+                        print(f"{name}: {error!r}")
+                continue
+            if record:
+                result.latencies.append(time.perf_counter() - started)
+
+    calls((i % count for i in range(warmup)), record=False)
+    for _ in range(rounds):
+        succeeded = len(result.latencies)
+        started = time.perf_counter()
+        calls(range(count), record=True)
+        seconds = time.perf_counter() - started
+        succeeded = len(result.latencies) - succeeded
+        result.seconds += seconds
+        result.rounds.append(succeeded / seconds if seconds else 0.0)
+    return result
+
+
+class LatencyModel:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = None):
+        """
+        :param latency: Seconds added to every call
+        :param jitter: Upper bound of a uniform random addition to latency
+        :param seed: Optional seed for reproducible delays
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        return self.latency + (
+            self._random.uniform(0, self.jitter) if self.jitter else 0
+        )
+
+    async def sleep(self):
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+@contextmanager
+def aws_latency(model: LatencyModel):
+    """Delays every request of aioboto3 clients created in the block.
+
+    Local stand-ins such as moto answer in microseconds; the delay makes
+    concurrency and connection reuse matter as they would against AWS.
+    """
+    from aiobotocore.session import AioSession
+
+    async def before_send(**kwargs):
+        await model.sleep()
+        # Returning None lets the request go out as usual.
+
+    original = AioSession._create_client
+
+    async def _create_client(session, *args, **kwargs):
+        client = await original(session, *args, **kwargs)
+        client.meta.events.register("before-send", before_send)
+        return client
+
+    AioSession._create_client = _create_client
+    try:
+        yield
+    finally:
+        AioSession._create_client = original
+
+
+def print_results(results):
+    print(
+        f"{'benchmark':<28}{'ops':>7}{'err':>5}{'per s':>10}{'p50 ms':>9}"
+        f"{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    )
+    for result in results:
+        if result.get("skipped"):
+            print(f"{result['name']:<28}  skipped: {result['skipped']}")
+            continue
+        print(
+            f"{result['name']:<28}{result['operations']:>7}{result['errors']:>5}"
+            f"{result['per_second']:>10.1f}{result['p50_ms']:>9.1f}"
+            f"{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+            f"{result['max_ms']:>9.1f}"
+        )
+
+
+def emit(results, json_path: str = None):
+    """Prints BenchResults and writes them to json_path, if given."""
+    results = [result.to_dict() for result in results]
+    print_results(results)
+    if json_path is not None:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+def compare(results, baseline: dict, threshold: float, suites=None) -> list:
+    """Lists how results fall short of a baseline.
+
+    A benchmark regresses if its throughput drops, or its p99 latency rises,
+    by more than its threshold: the baseline's "thresholds" entry for it, or
+    `threshold` (a fraction, 0.25 for 25%). A benchmark the baseline has
+    results for also fails if it is missing from results or was skipped.
+
+    :param results: Result dicts, as emit() returns them
+    :param baseline: {"results": [...], "thresholds": {name: fraction}}
+    :param suites: Prefixes of the benchmarks that were run, e.g. ["s3"];
+        all of the baseline's by default
+    :return: One line per regression
+    """
+    expected = {
+        result["name"]: result
+        for result in baseline.get("results", [])
+        if suites is None or result["name"].split(".")[0] in suites
+    }
+    thresholds = baseline.get("thresholds", {})
+    regressions = []
+    names = {result["name"] for result in results}
+    for name, before in expected.items():
+        if name not in names and not before.get("skipped"):
+            regressions.append(f"{name}: missing, baseline has results")
+    for result in results:
+        before = expected.get(result["name"])
+        if before is None or before.get("skipped"):
+            continue
+        if result.get("skipped"):
+            regressions.append(
+                f"{result['name']}: skipped ({result['skipped']}), "
+                "baseline has results"
+            )
+            continue
+        allowed = thresholds.get(result["name"], threshold)
+        name = result["name"]
+        if result["errors"] > before["errors"]:
+            regressions.append(
+                f"{name}: {result['errors']} errors, baseline {before['errors']}"
+            )
+        if result["per_second"] < before["per_second"] * (1 - allowed):
+            regressions.append(
+                f"{name}: {result['per_second']:.1f}/s, baseline "
+                f"{before['per_second']:.1f}/s (-{allowed:.0%} allowed)"
+            )
+        if result["p99_ms"] > before["p99_ms"] * (1 + allowed):
+            regressions.append(
+                f"{name}: p99 {result['p99_ms']:.1f} ms, baseline "
+                f"{before['p99_ms']:.1f} ms (+{allowed:.0%} allowed)"
+            )
+    return regressions
+
+
+def argument_parser(description: str):
+    """Options every benchmark script takes, so run.py can pass them on."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--count", type=int, default=200, help="Calls per benchmark")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--rounds", type=int, default=5, help="Recorded rounds of --count calls"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=10, help="Unrecorded calls before the rounds"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=20.0, help="Injected per-call latency"
+    )
+    parser.add_argument(
+        "--jitter-ms", type=float, default=10.0, help="Injected latency jitter"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results here")
+    return parser
+
+
+def rounds(args) -> dict:
+    """measure() keyword arguments for the --warmup and --rounds options."""
+    return {"warmup": args.warmup, "rounds": args.rounds}
+
+
+def latency_model(args) -> LatencyModel:
+    return LatencyModel(args.latency_ms / 1000, args.jitter_ms / 1000, args.seed)
@@ -0,0 +1,134 @@
+"""
+Runs the offline benchmark suite and fails on performance regressions.
+
+Each bench_*.py script runs in its own process, because the directories
+they import from have modules of the same name (constants, stub_client). The
+results are compared with a baseline: a benchmark regresses if its
+median-round throughput drops, or its p99 latency over all rounds rises, by
+more than --threshold, or by its own entry under "thresholds" in the
+baseline file.
+
+    python run.py                     # compare with baseline.json
+    python run.py --update-baseline   # record a new baseline
+    python run.py --only s3,bedrock --threshold 0.5
+
+The exit status is 1 on a regression or a failed benchmark script. A
+benchmark in the baseline that is missing or skipped counts as a
+regression, and the baseline is not updated if a script failed.
+Baselines are only comparable when recorded on the same machine with the
+same options.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from harness import compare, print_results
+
+HERE = Path(__file__).resolve().parent
+SUITES = ("s3", "opensearch", "bedrock", "textract")
+
+
+def run_suite(name: str, options: list) -> list:
+    """Runs bench_<name>.py and returns its results."""
+    print(f"running bench_{name}.py", flush=True)
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, f"{name}.json")
+        subprocess.run(
+            [sys.executable, str(HERE / f"bench_{name}.py"), *options]
+            + ["--json", json_path],
+            cwd=HERE,
+            check=True,
+            # The script's own table; run.py prints all results together.
+            stdout=subprocess.DEVNULL,
+        )
+        with open(json_path) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--only", help=f"Comma-separated subset of {SUITES}")
+    parser.add_argument("--baseline", default=str(HERE / "baseline.json"))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed throughput drop or p99 rise, as a fraction",
+    )
+    parser.add_argument("--count", type=int, help="Calls per benchmark")
+    parser.add_argument("--concurrency", type=int)
+    parser.add_argument("--rounds", type=int, help="Recorded rounds per benchmark")
+    parser.add_argument("--warmup", type=int, help="Unrecorded calls first")
+    parser.add_argument("--latency-ms", type=float, help="Injected per-call latency")
+    parser.add_argument("--jitter-ms", type=float)
+    parser.add_argument("--opensearch", help="URL of a local OpenSearch cluster")
+    args = parser.parse_args()
+
+    common = []
+    for option in (
+        "count",
+        "concurrency",
+        "rounds",
+        "warmup",
+        "latency_ms",
+        "jitter_ms",
+    ):
+        value = getattr(args, option)
+        if value is not None:
+            common += [f"--{option.replace('_', '-')}", str(value)]
+
+    suites = args.only.split(",") if args.only else SUITES
+    results, failed = [], []
+    for name in suites:
+        options = list(common)
+        if name == "opensearch" and args.opensearch:
+            options += ["--opensearch", args.opensearch]
+        try:
+            results += run_suite(name, options)
+        except subprocess.CalledProcessError as error:
+            failed.append(f"bench_{name}.py exited with {error.returncode}")
+
+    print_results(results)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.update_baseline and failed:
+        print(f"Not writing {args.baseline}: the suite did not run completely")
+        regressions = []
+    elif args.update_baseline:
+        recorded = {result["name"]: result for result in baseline.get("results", [])}
+        # A skipped benchmark keeps the results recorded for it before.
+        recorded.update(
+            (result["name"], result)
+            for result in results
+            if not result.get("skipped") or result["name"] not in recorded
+        )
+        baseline["results"] = sorted(recorded.values(), key=lambda r: r["name"])
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        regressions = []
+    elif baseline:
+        regressions = compare(results, baseline, args.threshold, suites)
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline")
+        regressions = []
+
+    for line in failed:
+        print(f"FAILED {line}")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Local stand-ins for the OpenSearch client and synthetic corpora.
+
+StubOpenSearchClient takes bulk and search requests like opensearch-py's
+AsyncOpenSearch. Each request waits for the injected latency. Bodies are
+serialized and parsed as they would be on the wire, so client-side encoding
+costs still count. Search scores documents by matching terms through an
+inverted index, and honours the tags filter, size and _source. It doesn't
+emulate kNN scoring; point bench_opensearch.py at a local OpenSearch
+container for that.
+"""
+
+import json
+import random
+from collections import Counter, defaultdict
+
+from harness import LatencyModel
+
+_WORDS = (
+    "revenue quarter growth margin customer region product service market "
+    "policy contract invoice payment delivery warranty support account "
+    "report summary risk compliance audit budget forecast supplier order "
+    "shipment inventory price discount tax employee project milestone"
+).split()
+
+
+def synthetic_passages(count: int, words: int = 120, seed: int = 1) -> list:
+    """Passages of random words drawn from a small business vocabulary."""
+    rng = random.Random(seed)
+    vocabulary = _WORDS + [f"term{i}" for i in range(2000)]
+    return [
+        " ".join(rng.choice(vocabulary) for _ in range(words)) for _ in range(count)
+    ]
+
+
+def synthetic_vectors(count: int, dimensions: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [
+        [round(rng.uniform(-1, 1), 6) for _ in range(dimensions)] for _ in range(count)
+    ]
+
+
+class StubOpenSearchClient:
+    def __init__(self, latency: LatencyModel = None):
+        """
+        :param latency: Delay of every request; none by default
+        """
+        self.latency = latency or LatencyModel()
+        self.documents = []
+        self.requests = 0
+        self._terms = defaultdict(set)
+
+    async def bulk(self, body, **kwargs):
+        self.requests += 1
+        await self.latency.sleep()
+        if isinstance(body, (bytes, bytearray)):
+            body = body.decode()
+        lines = body.splitlines()
+        items = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            json.loads(action)
+            document = json.loads(source)
+            number = len(self.documents)
+            self.documents.append(document)
+            for term in set(str(document.get("content", "")).lower().split()):
+                self._terms[term].add(number)
+            items.append({"index": {"_id": str(number), "status": 201}})
+        return {"took": 1, "errors": False, "items": items}
+
+    async def search(self, body=None, index=None, **kwargs):
+        self.requests += 1
+        await self.latency.sleep()
+        body = json.loads(json.dumps(body))
+        query = body["query"]["bool"]
+        text = ""
+        for clause in query.get("must", []):
+            if "multi_match" in clause:
+                text = clause["multi_match"]["query"]
+        tags = None
+        for clause in query.get("filter", []):
+            tags = set(clause["terms"]["tags"])
+
+        scores = Counter()
+        for term in text.lower().split():
+            for number in self._terms.get(term, ()):
+                scores[number] += 1
+        hits = []
+        for number, score in scores.most_common():
+            document = self.documents[number]
+            if tags is not None and not tags.intersection(document.get("tags", [])):
+                continue
+            fields = body.get("_source")
+            source = (
+                {key: document[key] for key in fields if key in document}
+                if fields is not None
+                else document
+            )
+            hits.append({"_id": str(number), "_score": float(score), "_source": source})
+            if len(hits) == body.get("size", 10):
+                break
+        response = {"hits": {"total": {"value": len(scores)}, "hits": hits}}
+        return json.loads(json.dumps(response))
+
+    async def delete_by_query(self, index=None, body=None, **kwargs):
+        self.requests += 1
+        await self.latency.sleep()
+        return {"deleted": 0}
+
+    async def close(self):
+        pass
@@ -0,0 +1,468 @@
+"""
+One entry point for the S3, OpenSearch, Textract, Bedrock, RAG, ingest and
+identity operations.
+
+    python cli.py s3 upload msdhoni.pdf --key testdir/msdhoni.pdf
+    python cli.py textract tables table.pdf
+    python cli.py rag ask "Where was MS Dhoni born?"
+    python cli.py --profile aws-calls.json ingest run *.pdf
+
+Only the standard library is imported at start-up. Each subcommand imports
+the SDKs it needs (aioboto3, opensearch-py, pypdf, ...) when it runs, so
+`--help` or an S3 command doesn't pay for OpenSearch or PDF parsing.
+Configuration is read once from the environment and .env into a Config,
+and the subcommands get names from it instead of module constants.
+`python cli.py startup` measures cold start against importing the SDKs.
+
+Environment: AWS_KM_BUCKET, AWS_KM_COLLECTION, AWS_KM_INDEX, AWS_KM_MODEL_ID,
+AWS_KM_EMBEDDING_MODEL_ID, plus the AWS_ACCESS_KEY/AWS_SECRET_KEY/AWS_ROLE_ARN
+the scripts already use.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+
+# What a script importing the SDKs at module level pays before doing anything.
+SDK_MODULES = ("aioboto3", "boto3", "opensearchpy", "pypdf", "dotenv")
+
+
+# A namedtuple rather than a frozen dataclass: importing dataclasses (and the
+# inspect module behind it) costs more than the rest of the start-up.
+_Config = namedtuple(
+    "Config",
+    ["bucket", "collection", "index", "model_id", "embedding_model_id"],
+    defaults=[
+        "soham-boto-s3-test",
+        "documents",
+        "documents",
+        "meta.llama3-8b-instruct-v1:0",
+        "amazon.titan-embed-text-v2:0",
+    ],
+)
+
+
+class Config(_Config):
+    __slots__ = ()
+
+    @classmethod
+    def load(cls) -> "Config":
+        """Reads .env, if present, into the environment, then the settings."""
+        env_file = os.path.join(os.getcwd(), ".env")
+        if os.path.exists(env_file):
+            from dotenv import load_dotenv
+
+            load_dotenv(env_file)
+        defaults = cls()
+        return cls(
+            bucket=os.getenv("AWS_KM_BUCKET", defaults.bucket),
+            collection=os.getenv("AWS_KM_COLLECTION", defaults.collection),
+            index=os.getenv("AWS_KM_INDEX", defaults.index),
+            model_id=os.getenv("AWS_KM_MODEL_ID", defaults.model_id),
+            embedding_model_id=os.getenv(
+                "AWS_KM_EMBEDDING_MODEL_ID", defaults.embedding_model_id
+            ),
+        )
+
+
+def _use(*directories: str):
+    """Makes the modules of repository directories importable."""
+    for directory in reversed(directories):
+        path = os.path.join(ROOT, directory)
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def _provider():
+    _use("identity")
+    from credentials import default_provider
+
+    return default_provider()
+
+
+# identity --------------------------------------------------------------
+
+
+def identity_whoami(config: Config, args):
+    provider = _provider()
+    print(provider.identity)
+    if provider.role_arn:
+        print(f"Assumed {provider.role_arn}, cached in {provider.cache_path}")
+
+
+# s3 --------------------------------------------------------------------
+
+
+async def s3_upload(config: Config, args):
+    async with _provider().aioboto3_session().client("s3") as s3_client:
+        key = args.key or os.path.basename(args.file)
+        # Public, like s3/upload_file.py, so the printed URL can be opened.
+        await s3_client.upload_file(
+            args.file, config.bucket, key, ExtraArgs={"ACL": "public-read"}
+        )
+    print(f"https://{config.bucket}.s3.amazonaws.com/{key}")
+
+
+async def s3_list(config: Config, args):
+    async with _provider().aioboto3_session().client("s3") as s3_client:
+        paginator = s3_client.get_paginator("list_objects_v2")
+        async for page in paginator.paginate(Bucket=config.bucket, Prefix=args.prefix):
+            for obj in page.get("Contents", []):
+                print(f"{obj['Size']:>12}  {obj['Key']}")
+
+
+async def s3_download(config: Config, args):
+    output = args.output or os.path.basename(args.key)
+    async with _provider().aioboto3_session().client("s3") as s3_client:
+        await s3_client.download_file(config.bucket, args.key, output)
+    print(f"Downloaded to {output}")
+
+
+async def s3_delete(config: Config, args):
+    async with _provider().aioboto3_session().client("s3") as s3_client:
+        await s3_client.delete_object(Bucket=config.bucket, Key=args.key)
+
+
+# opensearch ------------------------------------------------------------
+
+
+async def opensearch_search(config: Config, args):
+    import asyncio
+
+    _use("bedrock", "opensearch")
+    from invoke import embed
+    from search import get_opensearch_client, hybrid_query
+
+    provider = _provider()
+    vector = await asyncio.to_thread(
+        embed,
+        provider.boto3_session().client("bedrock-runtime"),
+        config.embedding_model_id,
+        args.query,
+    )
+    client = await get_opensearch_client(
+        provider.aioboto3_session(),
+        provider.botocore_credentials(),
+        collection=config.collection,
+    )
+    try:
+        response = await client.search(
+            body=hybrid_query(
+                args.query,
+                vector,
+                tags=args.tag,
+                size=args.size,
+                source=["content", "sourcepage"],
+            ),
+            index=config.index,
+        )
+    finally:
+        await client.close()
+    for hit in response["hits"]["hits"]:
+        source = hit["_source"]
+        print(f"{hit['_score']:8.3f}  {source.get('sourcepage', '')}")
+        print(f"          {source.get('content', '')[:200]!r}")
+
+
+async def opensearch_create(config: Config, args):
+    _use("opensearch")
+    import create_collection_and_index
+
+    await create_collection_and_index.main(
+        collection=config.collection,
+        index=config.index,
+        session=_provider().aioboto3_session(),
+    )
+
+
+# textract --------------------------------------------------------------
+
+
+async def textract_tables(config: Config, args):
+    _use("textract")
+    from analyze import analyze_to_html
+
+    tables = await analyze_to_html(
+        _provider().aioboto3_session(),
+        config.bucket,
+        args.key,
+        args.feature or ["TABLES"],
+        html_path=args.html,
+        ndjson_path=args.ndjson,
+    )
+    print(f"Wrote {tables} tables to {args.html}")
+
+
+# bedrock ---------------------------------------------------------------
+
+
+def bedrock_invoke(config: Config, args):
+    _use("bedrock")
+    from invoke import invoke
+
+    client = _provider().boto3_session().client("bedrock-runtime")
+    completion = invoke(client, args.model or config.model_id, args.prompt)
+    print(completion.text)
+    print(
+        f"\n[{completion.stop_reason}, {completion.input_tokens} in, "
+        f"{completion.output_tokens} out]"
+    )
+
+
+def bedrock_embed(config: Config, args):
+    _use("bedrock")
+    from invoke import embed
+
+    client = _provider().boto3_session().client("bedrock-runtime")
+    vector = embed(client, args.model or config.embedding_model_id, args.text)
+    print(f"{len(vector)} dimensions: {vector[:8]} ...")
+
+
+# rag -------------------------------------------------------------------
+
+
+async def rag_ask(config: Config, args):
+    _use("rag")
+    from converse_stream import TextDelta
+    from pipeline import RagPipeline, StageTimings
+
+    provider = _provider()
+    pipeline = RagPipeline(
+        provider.aioboto3_session(),
+        provider.boto3_session().client("bedrock-runtime"),
+        model_id=args.model or config.model_id,
+        embedding_model_id=config.embedding_model_id,
+        collection=config.collection,
+        index=config.index,
+    )
+    try:
+        async for event in pipeline.ask(args.question, tags=args.tag):
+            if isinstance(event, TextDelta):
+                print(event.text, end="", flush=True)
+            elif isinstance(event, StageTimings) and args.timings:
+                print(f"\n\n{event}")
+    finally:
+        await pipeline.close()
+    print()
+
+
+# ingest ----------------------------------------------------------------
+
+
+async def _ingest_in_process(config: Config, args):
+    _use("ingest")
+    from checkpoint import CheckpointStore
+    from dedup import SignatureStore
+    from orchestrator import IngestOrchestrator, format_stats
+    from search import get_opensearch_client
+
+    provider = _provider()
+    session = provider.aioboto3_session()
+    opensearch_client = await get_opensearch_client(
+        session, provider.botocore_credentials(), collection=config.collection
+    )
+    checkpoint = CheckpointStore(args.checkpoint)
+    dedup = None if args.no_dedup else SignatureStore(args.dedup)
+    try:
+        async with session.client("s3") as s3_client, session.client(
+            "textract"
+        ) as textract_client:
+            orchestrator = IngestOrchestrator(
+                s3_client,
+                textract_client,
+                opensearch_client,
+                provider.boto3_session().client("bedrock-runtime"),
+                bucket=config.bucket,
+                index=config.index,
+                checkpoint=checkpoint,
+                embedding_model_id=config.embedding_model_id,
+                dedup=dedup,
+                drop_duplicates=not args.keep_duplicates,
+            )
+            stats = await orchestrator.run(args.sources)
+    finally:
+        await opensearch_client.close()
+        checkpoint.close()
+        if dedup is not None:
+            dedup.close()
+    print(format_stats(stats))
+    return 1 if stats["documents"]["failed"] else 0
+
+
+def ingest_run(config: Config, args):
+    if args.workers <= 1:
+        return _ingest_in_process(config, args)
+
+    _use("ingest")
+    from workers import coordinate
+
+    _provider()  # Resolve credentials once, before the workers start.
+    return coordinate(
+        args.sources,
+        args.workers,
+        {
+            "bucket": config.bucket,
+            "collection": config.collection,
+            "index": config.index,
+            "embedding_model_id": config.embedding_model_id,
+            "checkpoint": args.checkpoint,
+            "dedup": None if args.no_dedup else args.dedup,
+            "keep_duplicates": args.keep_duplicates,
+            "embed_workers": 8,
+            "report_interval": 10.0,
+            "pool_size": 16,
+        },
+    )
+
+
+# startup ---------------------------------------------------------------
+
+
+def _best_of(command: list, runs: int) -> float:
+    import subprocess
+
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def startup(config: Config, args):
+    """Compares the CLI's cold start with importing the SDKs up front."""
+    python = [sys.executable]
+    interpreter = _best_of(python + ["-c", "pass"], args.runs)
+    cli = _best_of(python + [os.path.join(ROOT, "cli.py"), "--help"], args.runs)
+
+    import subprocess
+
+    available = []
+    for module in SDK_MODULES:
+        check = subprocess.run(python + ["-c", f"import {module}"], capture_output=True)
+        if check.returncode == 0:
+            available.append(module)
+    print(f"interpreter:      {interpreter * 1000:7.1f} ms")
+    print(f"cli.py --help:    {cli * 1000:7.1f} ms")
+    if available:
+        imports = _best_of(python + ["-c", f"import {', '.join(available)}"], args.runs)
+        print(f"import SDKs:      {imports * 1000:7.1f} ms  ({', '.join(available)})")
+    missing = sorted(set(SDK_MODULES) - set(available))
+    if missing:
+        print(f"not installed:    {', '.join(missing)}")
+
+    overhead = (cli - interpreter) * 1000
+    print(f"cli overhead:     {overhead:7.1f} ms (target {args.target_ms:.0f} ms)")
+    return 0 if overhead <= args.target_ms else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="AWS knowledge management tools"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="REPORT",
+        help="Record every AWS call and write a JSON report here",
+    )
+    commands = parser.add_subparsers(dest="group", required=True)
+
+    identity = commands.add_parser("identity").add_subparsers(required=True)
+    identity.add_parser("whoami").set_defaults(handler=identity_whoami)
+
+    s3 = commands.add_parser("s3").add_subparsers(required=True)
+    command = s3.add_parser("upload")
+    command.add_argument("file")
+    command.add_argument("--key")
+    command.set_defaults(handler=s3_upload)
+    command = s3.add_parser("list")
+    command.add_argument("--prefix", default="")
+    command.set_defaults(handler=s3_list)
+    command = s3.add_parser("download")
+    command.add_argument("key")
+    command.add_argument("--output")
+    command.set_defaults(handler=s3_download)
+    command = s3.add_parser("delete")
+    command.add_argument("key")
+    command.set_defaults(handler=s3_delete)
+
+    opensearch = commands.add_parser("opensearch").add_subparsers(required=True)
+    command = opensearch.add_parser("search")
+    command.add_argument("query")
+    command.add_argument("--tag", type=int, action="append")
+    command.add_argument("--size", type=int, default=10)
+    command.set_defaults(handler=opensearch_search)
+    opensearch.add_parser("create").set_defaults(handler=opensearch_create)
+
+    textract = commands.add_parser("textract").add_subparsers(required=True)
+    command = textract.add_parser("tables")
+    command.add_argument("key")
+    command.add_argument("--feature", action="append", help="Default: TABLES")
+    command.add_argument("--html", default="table.html")
+    command.add_argument("--ndjson", default="response.ndjson")
+    command.set_defaults(handler=textract_tables)
+
+    bedrock = commands.add_parser("bedrock").add_subparsers(required=True)
+    command = bedrock.add_parser("invoke")
+    command.add_argument("prompt")
+    command.add_argument("--model")
+    command.set_defaults(handler=bedrock_invoke)
+    command = bedrock.add_parser("embed")
+    command.add_argument("text")
+    command.add_argument("--model")
+    command.set_defaults(handler=bedrock_embed)
+
+    rag = commands.add_parser("rag").add_subparsers(required=True)
+    command = rag.add_parser("ask")
+    command.add_argument("question")
+    command.add_argument("--tag", type=int, action="append")
+    command.add_argument("--model")
+    command.add_argument("--timings", action="store_true")
+    command.set_defaults(handler=rag_ask)
+
+    ingest = commands.add_parser("ingest").add_subparsers(required=True)
+    command = ingest.add_parser("run")
+    command.add_argument("sources", nargs="+", help="Files or s3://bucket/key")
+    command.add_argument("--workers", type=int, default=1)
+    command.add_argument("--checkpoint", default="ingest-checkpoint.sqlite3")
+    command.add_argument("--dedup", default="ingest-dedup.sqlite3")
+    command.add_argument("--no-dedup", action="store_true")
+    command.add_argument("--keep-duplicates", action="store_true")
+    command.set_defaults(handler=ingest_run)
+
+    command = commands.add_parser("startup", help="Measure cold start")
+    command.add_argument("--runs", type=int, default=5)
+    command.add_argument("--target-ms", type=float, default=50.0)
+    command.set_defaults(handler=startup)
+    return parser
+
+
+def run(config: Config, args):
+    result = args.handler(config, args)
+    if hasattr(result, "__await__"):
+        import asyncio
+
+        result = asyncio.run(result)
+    return result
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = Config.load()
+
+    if args.profile is None:
+        return run(config, args)
+
+    _use("instrumentation")
+    from hooks import profile
+
+    with profile(f"{args.group} {args.handler.__name__}", report_path=args.profile):
+        return run(config, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+Resolves AWS credentials once and keeps them fresh for every process.
+
+Base credentials come from AWS_ACCESS_KEY/AWS_SECRET_KEY, or the default
+chain when those aren't set. With a role (AWS_ROLE_ARN), the provider assumes
+it and uses the temporary credentials; without one, sessions use the base
+credentials as before. Either way the identity is checked once with
+get_caller_identity.
+
+Assumed role credentials are cached in a file shared by all processes of the same user.
+The file is replaced atomically, and writers hold an flock, so when many
+ingest workers start at once only one of them calls STS. A background thread
+assumes the role again refresh_margin before expiry. Requests only wait for
+STS if the credentials are within mandatory_margin of expiring, which happens
+when background refreshes keep failing.
+
+Sessions built by boto3_session() and aioboto3_session() use
+RefreshableCredentials backed by this provider. botocore picks up the
+refreshed credentials by itself, so nothing has to freeze them.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import random
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import boto3
+import dotenv
+from botocore.credentials import RefreshableCredentials
+from botocore.session import get_session
+
+try:
+    import fcntl
+except ImportError:  # No cross-process locking on Windows
+    fcntl = None
+
+dotenv.load_dotenv()
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "aws_km"
+METHOD = "aws-km-cache"
+
+
+def _remaining(credentials: dict) -> float:
+    """Seconds until credentials expire; infinite for long-term keys."""
+    expiry = credentials.get("expiry_time")
+    if expiry is None:
+        return float("inf")
+    expiry = datetime.datetime.fromisoformat(expiry)
+    return (expiry - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+
+class CredentialProvider:
+    def __init__(
+        self,
+        role_arn: Optional[str] = None,
+        session_name: str = "aws-km",
+        duration_seconds: int = 3600,
+        refresh_margin: float = 15 * 60,
+        mandatory_margin: float = 2 * 60,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        region_name: Optional[str] = None,
+    ):
+        """
+        :param role_arn: Role to assume; AWS_ROLE_ARN if not given. Without
+            one the base credentials are used as they are
+        :param session_name: RoleSessionName of the assumed role
+        :param duration_seconds: Lifetime of the assumed role credentials
+        :param refresh_margin: Seconds before expiry to refresh in the
+            background
+        :param mandatory_margin: Seconds before expiry below which a caller
+            waits for a refresh
+        :param cache_dir: Directory of the shared credential cache
+        :param region_name: Region of the sessions built by this provider
+        """
+        self.role_arn = role_arn or os.getenv("AWS_ROLE_ARN")
+        self.session_name = session_name
+        self.duration_seconds = duration_seconds
+        # Short-lived credentials would otherwise be refreshed continuously.
+        self.refresh_margin = min(refresh_margin, duration_seconds / 2)
+        self.mandatory_margin = mandatory_margin
+        self.cache_dir = Path(cache_dir)
+        self.region_name = region_name
+        self.access_key = os.getenv("AWS_ACCESS_KEY")
+        self.secret_key = os.getenv("AWS_SECRET_KEY")
+
+        self.identity = None
+        # STS calls made by this process, as opposed to reads of the cache.
+        self.fetches = 0
+        self._credentials = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+
+    @property
+    def cache_path(self) -> Path:
+        # One file per role and base key, so different setups don't collide.
+        owner = f"{self.role_arn}|{self.access_key}|{self.session_name}"
+        digest = hashlib.sha256(owner.encode()).hexdigest()[:16]
+        return self.cache_dir / f"credentials-{digest}.json"
+
+    def _base_session(self) -> boto3.Session:
+        return boto3.Session(
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            region_name=self.region_name,
+        )
+
+    def _fetch(self) -> dict:
+        """Gets credentials from STS and checks whose they are."""
+        base = self._base_session()
+        if self.role_arn:
+            response = base.client("sts").assume_role(
+                RoleArn=self.role_arn,
+                RoleSessionName=self.session_name,
+                DurationSeconds=self.duration_seconds,
+            )
+            role = response["Credentials"]
+            credentials = {
+                "access_key": role["AccessKeyId"],
+                "secret_key": role["SecretAccessKey"],
+                "token": role["SessionToken"],
+                "expiry_time": role["Expiration"].isoformat(),
+            }
+        else:
+            # Only used for the identity check; sessions use the base
+            # credentials directly, see boto3_session.
+            frozen = base.get_credentials().get_frozen_credentials()
+            credentials = {
+                "access_key": frozen.access_key,
+                "secret_key": frozen.secret_key,
+                "token": frozen.token,
+                "expiry_time": None,
+            }
+
+        identity = (
+            boto3.Session(
+                aws_access_key_id=credentials["access_key"],
+                aws_secret_access_key=credentials["secret_key"],
+                aws_session_token=credentials["token"],
+                region_name=self.region_name,
+            )
+            .client("sts")
+            .get_caller_identity()
+        )
+        credentials["identity"] = {
+            key: identity[key] for key in ("UserId", "Account", "Arn")
+        }
+        self.fetches += 1
+        return credentials
+
+    def _read_cache(self) -> Optional[dict]:
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_cache(self, credentials: dict):
+        temporary = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as f:
+            json.dump(credentials, f)
+        os.replace(temporary, self.cache_path)
+
+    @contextmanager
+    def _file_lock(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_path.with_suffix(".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def refresh(self, margin: Optional[float] = None) -> dict:
+        """Replaces credentials that expire within margin seconds.
+
+        Another process may have refreshed the cache already; STS is only
+        called if the cache is stale too.
+        """
+        margin = self.refresh_margin if margin is None else margin
+        with self._lock:
+            if not self.role_arn:
+                # Long-term keys are never written to the cache.
+                credentials = self._credentials or self._fetch()
+            else:
+                credentials = self._read_cache()
+            if credentials is None or _remaining(credentials) <= margin:
+                with self._file_lock():
+                    credentials = self._read_cache()
+                    if credentials is None or _remaining(credentials) <= margin:
+                        credentials = self._fetch()
+                        self._write_cache(credentials)
+            self._credentials = credentials
+            self.identity = credentials["identity"]
+            return credentials
+
+    def get(self) -> dict:
+        """Returns current credentials, waiting only if they are about to expire."""
+        credentials = self._credentials
+        if credentials is not None and _remaining(credentials) > self.mandatory_margin:
+            return credentials
+        return self.refresh(self.mandatory_margin)
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            try:
+                credentials = self.refresh()
+            except Exception as error:
+                print(f"Background credential refresh failed: {error!r}")
+                self._stop.wait(30)
+                continue
+            remaining = _remaining(credentials)
+            if remaining == float("inf"):
+                return
+            # Jitter spreads the refreshes of processes that started together.
+            # It only ever delays the wake-up into the refresh window, where
+            # refresh() acts, and stays clear of the mandatory margin.
+            jitter = min(60.0, (self.refresh_margin - self.mandatory_margin) / 2)
+            delay = (
+                remaining - self.refresh_margin + random.uniform(0, max(0.0, jitter))
+            )
+            self._stop.wait(max(1.0, delay))
+
+    def start(self) -> "CredentialProvider":
+        """Resolves credentials now and keeps them refreshed in the background."""
+        self.get()
+        if self._refresher is None and self.role_arn:
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name="credential-refresh", daemon=True
+            )
+            self._refresher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _metadata(self) -> dict:
+        credentials = self.get()
+        return {
+            key: credentials[key]
+            for key in ("access_key", "secret_key", "token", "expiry_time")
+        }
+
+    def _configure(self, credentials):
+        # botocore would otherwise refresh 15 and 10 minutes before expiry;
+        # line its windows up with ours so it only ever reads refreshed
+        # credentials.
+        credentials._advisory_refresh_timeout = self.refresh_margin
+        credentials._mandatory_refresh_timeout = self.mandatory_margin
+        return credentials
+
+    def botocore_credentials(self):
+        """Credentials for signers that take botocore credentials, e.g. SigV4."""
+        self.get()
+        if not self.role_arn:
+            # botocore already refreshes whatever the default chain found.
+            return self._base_session().get_credentials()
+        return self._configure(
+            RefreshableCredentials.create_from_metadata(
+                self._metadata(), refresh_using=self._metadata, method=METHOD
+            )
+        )
+
+    def boto3_session(self) -> boto3.Session:
+        self.get()
+        if not self.role_arn:
+            return self._base_session()
+        botocore_session = get_session()
+        botocore_session._credentials = self.botocore_credentials()
+        return boto3.Session(
+            botocore_session=botocore_session, region_name=self.region_name
+        )
+
+    def aioboto3_session(self):
+        import aioboto3
+
+        self.get()
+        if not self.role_arn:
+            return aioboto3.Session(
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                region_name=self.region_name,
+            )
+
+        from aiobotocore.credentials import AioRefreshableCredentials
+        from aiobotocore.session import get_session as get_aio_session
+
+        async def refresh():
+            return await asyncio.to_thread(self._metadata)
+
+        aio_session = get_aio_session()
+        aio_session._credentials = self._configure(
+            AioRefreshableCredentials.create_from_metadata(
+                self._metadata(), refresh_using=refresh, method=METHOD
+            )
+        )
+        return aioboto3.Session(
+            botocore_session=aio_session, region_name=self.region_name
+        )
+
+
+_default_provider = None
+_default_lock = threading.Lock()
+
+
+def default_provider() -> CredentialProvider:
+    """The process-wide provider, started on first use."""
+    global _default_provider
+    with _default_lock:
+        if _default_provider is None:
+            _default_provider = CredentialProvider().start()
+        return _default_provider
@@ -1,27 +1,25 @@
 import asyncio
-import os
 
-import aioboto3
 import botocore
 import botocore.exceptions
-import dotenv
-
-dotenv.load_dotenv()
+from credentials import default_provider
 
 
 async def main():
-    boto3_client = aioboto3.Session(
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
-    ).client("sts")
-
     try:
-        async with boto3_client as client:
-            print(await client.get_caller_identity())
+        provider = default_provider()
     except botocore.exceptions.ClientError as exc:
         print("Incorrect credentials!")
         raise exc
 
+    print(provider.identity)
+    if provider.role_arn:
+        print(f"Assumed {provider.role_arn}, cached in {provider.cache_path}")
+
+    # Sessions from the provider reuse the resolved credentials.
+    async with provider.aioboto3_session().client("sts") as client:
+        print(await client.get_caller_identity())
+
 
 if __name__ == "__main__":
     asyncio.run(main())
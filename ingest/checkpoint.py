@@ -0,0 +1,86 @@
+"""
+Per-document ingestion progress, kept in SQLite so a run can be resumed.
+
+A document moves through the stages uploaded -> indexing -> indexed, or to
+failed with the error that stopped it. A resumed run skips indexed
+documents and the upload of uploaded ones; a document left in indexing had
+some chunks written, which the orchestrator removes before indexing it
+again.
+"""
+
+import sqlite3
+import time
+from typing import Optional
+
+UPLOADED = "uploaded"
+INDEXING = "indexing"
+INDEXED = "indexed"
+FAILED = "failed"
+
+
+class CheckpointStore:
+    def __init__(self, path: str = "ingest-checkpoint.sqlite3", timeout: float = 30.0):
+        """
+        :param path: SQLite database file, shared by all worker processes
+        :param timeout: Seconds to wait while another process holds the lock
+        """
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=timeout)
+        self._db.row_factory = sqlite3.Row
+        # Progress is written once per stage per document; WAL keeps that
+        # cheap and lets another process read the table during a run.
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                source TEXT PRIMARY KEY,
+                bucket TEXT,
+                key TEXT,
+                stage TEXT NOT NULL,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+            """)
+        self._db.commit()
+
+    def get(self, source: str) -> Optional[dict]:
+        row = self._db.execute(
+            "SELECT * FROM documents WHERE source = ?", (source,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def mark(
+        self,
+        source: str,
+        stage: str,
+        bucket: str = None,
+        key: str = None,
+        chunks: int = 0,
+        error: str = None,
+    ):
+        self._db.execute(
+            """
+            INSERT INTO documents
+                (source, bucket, key, stage, chunks, error, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (source) DO UPDATE SET
+                bucket = COALESCE(excluded.bucket, bucket),
+                key = COALESCE(excluded.key, key),
+                stage = excluded.stage,
+                chunks = excluded.chunks,
+                error = excluded.error,
+                updated_at = excluded.updated_at
+            """,
+            (source, bucket, key, stage, chunks, error, time.time()),
+        )
+        self._db.commit()
+
+    def summary(self) -> dict:
+        """Document counts by stage."""
+        return dict(
+            self._db.execute("SELECT stage, COUNT(*) FROM documents GROUP BY stage")
+        )
+
+    def close(self):
+        self._db.close()
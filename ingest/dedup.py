@@ -0,0 +1,333 @@
+"""
+Finds near-duplicate passages before they are embedded and indexed.
+
+Revisions and reprints of a document produce chunks that differ by a few
+words. Each chunk's text is cut into overlapping word shingles and reduced to
+a MinHash signature, whose share of matching values estimates the Jaccard
+similarity of two chunks' shingle sets. Locality sensitive hashing splits
+each signature into bands. Only chunks that share a band are compared, so
+the cost of a lookup doesn't grow with the corpus.
+
+Signatures and band hashes are kept in SQLite, so a later ingest run (or
+another worker process) finds duplicates of chunks indexed before. A
+signature is only stored once its chunk is indexed; until then it is held in
+PendingSignatures, in memory. Two near-duplicates checked at the same moment
+by different processes may both get through.
+
+    store = SignatureStore("ingest-dedup.sqlite3", threshold=0.8)
+    fingerprint = store.fingerprint(chunk["content"])
+    duplicate_of = store.find(chunk["id"], fingerprint)
+    ...  # index the chunk if it isn't a duplicate, then
+    store.save([(chunk["id"], source, fingerprint)])
+"""
+
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+import zlib
+from array import array
+from typing import Optional
+
+try:
+    import numpy
+except ImportError:  # numpy is optional; signatures are the same without it
+    numpy = None
+
+# Hashes are reduced modulo a Mersenne prime below 2**31, so a * x + b fits
+# in 64 bits and numpy computes exactly what the plain Python path does.
+_PRIME = (1 << 31) - 1
+_WORD = re.compile(r"\w+")
+
+
+def words(text: str) -> list:
+    """Lowercased words of text, without punctuation."""
+    return _WORD.findall(text.lower())
+
+
+def shingles(tokens: list, size: int = 5) -> set:
+    """Hashes of the runs of `size` consecutive words."""
+    if len(tokens) <= size:
+        return {zlib.crc32(" ".join(tokens).encode()) % _PRIME} if tokens else set()
+    return {
+        zlib.crc32(" ".join(tokens[i : i + size]).encode()) % _PRIME
+        for i in range(len(tokens) - size + 1)
+    }
+
+
+def lsh_params(num_perm: int, threshold: float) -> tuple:
+    """Picks (bands, rows) for a similarity threshold.
+
+    Chunks with similarity s share a band with probability
+    1 - (1 - s**rows)**bands, which rises steeply around (1/bands)**(1/rows).
+    The steepest split with that point at or below the threshold is taken, so
+    few true duplicates are missed. Candidates are then checked against the
+    threshold with their full signatures.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows == 0:
+            bands = num_perm // rows
+            if (1 / bands) ** (1 / rows) <= threshold:
+                best = (bands, rows)
+    return best
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class MinHash:
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        """
+        :param num_perm: Hash functions, i.e. values per signature
+        :param seed: Seed of the hash functions; signatures are only
+            comparable between MinHashes with the same seed and num_perm
+        """
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.a = [rng.randrange(1, _PRIME) for _ in range(num_perm)]
+        self.b = [rng.randrange(0, _PRIME) for _ in range(num_perm)]
+        if numpy is not None:
+            self._a = numpy.array(self.a, dtype=numpy.uint64)[:, None]
+            self._b = numpy.array(self.b, dtype=numpy.uint64)[:, None]
+
+    def signature(self, hashes) -> array:
+        if not hashes:
+            return array("I", [_PRIME] * self.num_perm)
+        if numpy is not None:
+            x = numpy.fromiter(hashes, dtype=numpy.uint64, count=len(hashes))
+            values = ((self._a * x + self._b) % _PRIME).min(axis=1)
+            return array("I", values.astype(numpy.uint32).tobytes())
+        return array(
+            "I",
+            (min((a * x + b) % _PRIME for x in hashes) for a, b in zip(self.a, self.b)),
+        )
+
+
+class SignatureStore:
+    def __init__(
+        self,
+        path: str = "ingest-dedup.sqlite3",
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        min_words: int = 20,
+        timeout: float = 30.0,
+    ):
+        """
+        :param path: SQLite database file, shared by all worker processes
+        :param threshold: Estimated Jaccard similarity above which a chunk is
+            a duplicate
+        :param num_perm: Values per MinHash signature
+        :param shingle_size: Words per shingle
+        :param min_words: Shorter chunks (headings, captions) are never
+            treated as duplicates
+        :param timeout: Seconds to wait while another process holds the lock
+        """
+        self.path = path
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self.minhash = MinHash(num_perm)
+        self.bands, self.rows = lsh_params(num_perm, threshold)
+        self.checked = 0
+        self.duplicates = 0
+        self.short = 0
+
+        # find() and save() may run on worker threads, one at a time.
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS settings (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS signatures (
+                id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                signature BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS signatures_source ON signatures (source);
+            CREATE TABLE IF NOT EXISTS bands (
+                key INTEGER NOT NULL,
+                id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS bands_key ON bands (key);
+            CREATE INDEX IF NOT EXISTS bands_id ON bands (id);
+            """)
+        self._check_settings()
+
+    def _check_settings(self):
+        """Refuses a database written with other signature settings."""
+        settings = {
+            "num_perm": str(self.minhash.num_perm),
+            "bands": str(self.bands),
+            "shingle_size": str(self.shingle_size),
+        }
+        with self._db:
+            for name, value in settings.items():
+                self._db.execute(
+                    "INSERT OR IGNORE INTO settings (name, value) VALUES (?, ?)",
+                    (name, value),
+                )
+        stored = dict(self._db.execute("SELECT name, value FROM settings"))
+        if any(stored[name] != value for name, value in settings.items()):
+            raise ValueError(
+                f"{self.path} holds signatures made with {stored}, not {settings}"
+            )
+
+    def _band_keys(self, signature: array) -> list:
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows : (band + 1) * self.rows]
+            digest = hashlib.blake2b(
+                band.to_bytes(2, "little") + rows.tobytes(), digest_size=8
+            ).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    def fingerprint(self, text: str) -> Optional[tuple]:
+        """Returns (signature, band keys) of text, or None if it is too short.
+
+        Only computes; call find() to look the fingerprint up.
+        """
+        self.checked += 1
+        text_words = words(text)
+        if len(text_words) < self.min_words:
+            self.short += 1
+            return None
+        signature = self.minhash.signature(shingles(text_words, self.shingle_size))
+        return signature, self._band_keys(signature)
+
+    def find(self, chunk_id: str, fingerprint: tuple) -> Optional[str]:
+        """Returns the id of a stored near-duplicate, if any.
+
+        :param chunk_id: Id of the chunk in the index; its own signature, if
+            stored by an earlier run, doesn't count
+        :param fingerprint: As fingerprint() returns it
+        """
+        signature, keys = fingerprint
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            candidates = self._db.execute(
+                f"""
+                SELECT id, signature FROM signatures WHERE id IN (
+                    SELECT DISTINCT id FROM bands WHERE key IN ({placeholders})
+                ) AND id != ?
+                """,
+                (*keys, chunk_id),
+            ).fetchall()
+        best, best_similarity = None, self.threshold
+        for candidate_id, blob in candidates:
+            candidate = array("I")
+            candidate.frombytes(blob)
+            score = similarity(signature, candidate)
+            if score >= best_similarity:
+                best, best_similarity = candidate_id, score
+        if best is not None:
+            self.duplicates += 1
+        return best
+
+    def save(self, signatures, forget=()):
+        """Stores signatures of indexed chunks, then forgets sources.
+
+        Both happen in one transaction. Storing the same chunk id again
+        replaces it.
+
+        :param signatures: (chunk_id, source, fingerprint) tuples
+        :param forget: Sources whose signatures are removed, see forget()
+        """
+        with self._lock, self._db:
+            for chunk_id, source, (signature, keys) in signatures:
+                self._db.execute("DELETE FROM bands WHERE id = ?", (chunk_id,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO signatures (id, source, signature)"
+                    " VALUES (?, ?, ?)",
+                    (chunk_id, source, signature.tobytes()),
+                )
+                self._db.executemany(
+                    "INSERT INTO bands (key, id) VALUES (?, ?)",
+                    ((key, chunk_id) for key in keys),
+                )
+            for source in forget:
+                self._forget(source)
+
+    def forget(self, source: str):
+        """Removes a document's signatures, e.g. before it is indexed again."""
+        with self._lock, self._db:
+            self._forget(source)
+
+    def _forget(self, source: str):
+        self._db.execute(
+            "DELETE FROM bands WHERE id IN"
+            " (SELECT id FROM signatures WHERE source = ?)",
+            (source,),
+        )
+        self._db.execute("DELETE FROM signatures WHERE source = ?", (source,))
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "short": self.short,
+        }
+
+    def close(self):
+        self._db.close()
+
+
+class PendingSignatures:
+    def __init__(self, threshold: float = 0.8):
+        """Signatures of chunks not yet saved to the store, kept in memory.
+
+        Chunks checked later in the same run are matched against them, so a
+        copy can wait for the chunk it repeats to be indexed (or not) rather
+        than being dropped in favour of a chunk that may never arrive.
+
+        :param threshold: As for the SignatureStore
+        """
+        self.threshold = threshold
+        self._signatures = {}
+        self._bands = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def find(self, chunk_id: str, fingerprint: tuple) -> Optional[str]:
+        """Returns the id of a pending near-duplicate, if any."""
+        signature, keys = fingerprint
+        candidates = set()
+        for key in keys:
+            candidates.update(self._bands.get(key, ()))
+        candidates.discard(chunk_id)
+        best, best_similarity = None, self.threshold
+        for candidate_id in candidates:
+            score = similarity(signature, self._signatures[candidate_id][1][0])
+            if score >= best_similarity:
+                best, best_similarity = candidate_id, score
+        return best
+
+    def add(self, chunk_id: str, source: str, fingerprint: tuple):
+        self._signatures[chunk_id] = (source, fingerprint)
+        for key in fingerprint[1]:
+            self._bands.setdefault(key, set()).add(chunk_id)
+
+    def get(self, chunk_id: str) -> Optional[tuple]:
+        """Returns a pending chunk's (source, fingerprint), if any."""
+        return self._signatures.get(chunk_id)
+
+    def pop(self, chunk_id: str) -> Optional[tuple]:
+        """Removes a chunk; returns its (source, fingerprint), if pending."""
+        entry = self._signatures.pop(chunk_id, None)
+        if entry is not None:
+            for key in entry[1][1]:
+                ids = self._bands[key]
+                ids.discard(chunk_id)
+                if not ids:
+                    del self._bands[key]
+        return entry
@@ -0,0 +1,147 @@
+"""
+Turns Textract blocks into OpenSearch documents.
+
+Each document page becomes:
+
+- passage documents: the page's LINE blocks joined in reading order and cut
+  at roughly passage_chars, skipping lines that sit inside a table;
+- table documents: each table serialized row by row as "header: value"
+  pairs, so a retrieved chunk stands on its own. Long tables are split into
+  several documents, each repeating the header row.
+
+Blocks arrive in result pages of up to 1000, which don't line up with
+document pages. split_pages regroups them by their Page number.
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "textract")]
+
+from tables import Table, build_table, index_blocks  # noqa: E402
+
+PASSAGE_CHARS = 1500
+TABLE_CHARS = 3000
+
+
+async def split_pages(block_pages):
+    """Regroups an async iterator of block lists into (page, blocks) pairs.
+
+    Textract returns the blocks of a document page together, so a page is
+    complete once a block of a later page arrives. Only one document page is
+    held at a time.
+    """
+    page, blocks = None, []
+    async for result_blocks in block_pages:
+        for block in result_blocks:
+            block_page = block.get("Page", 1)
+            if block_page != page:
+                if blocks:
+                    yield page, blocks
+                page, blocks = block_page, []
+            blocks.append(block)
+    if blocks:
+        yield page, blocks
+
+
+def _child_ids(block: dict):
+    for relationship in block.get("Relationships", ()):
+        if relationship["Type"] == "CHILD":
+            yield from relationship["Ids"]
+
+
+def _chunks(parts: list, max_chars: int, separator: str = "\n"):
+    """Joins parts into strings of at most about max_chars."""
+    chunk, size = [], 0
+    for part in parts:
+        if chunk and size + len(part) > max_chars:
+            yield separator.join(chunk)
+            chunk, size = [], 0
+        chunk.append(part)
+        size += len(part) + len(separator)
+    if chunk:
+        yield separator.join(chunk)
+
+
+def serialize_rows(table: Table) -> tuple:
+    """Returns a table's header line and one line per body row.
+
+    With a header row, every body cell is prefixed by its column's header.
+    """
+    grid = table.to_rows()
+    header_rows = sum(
+        1 for row in table.rows if row and all(cell.is_header for cell in row)
+    )
+    headers = [
+        " ".join(filter(None, (grid[r][c] for r in range(header_rows))))
+        for c in range(table.column_count)
+    ]
+
+    lines = []
+    for row in grid[header_rows:]:
+        if header_rows:
+            cells = [
+                f"{header}: {text}" if header else text
+                for header, text in zip(headers, row)
+                if text
+            ]
+        else:
+            cells = [text for text in row if text]
+        if cells:
+            lines.append(" | ".join(cells))
+    return " | ".join(filter(None, headers)), lines
+
+
+def table_documents(table: Table, max_chars: int = TABLE_CHARS) -> list:
+    """Splits a table into documents of whole rows, repeating the header."""
+    header, lines = serialize_rows(table)
+    budget = max(1, max_chars - len(header))
+    documents = []
+    chunks = list(_chunks(lines, budget)) or [""]
+    for part, chunk in enumerate(chunks):
+        content = f"{header}\n{chunk}".strip()
+        if content:
+            documents.append({"table_id": table.id, "part": part, "content": content})
+    return documents
+
+
+def page_documents(
+    page: int,
+    blocks: list,
+    passage_chars: int = PASSAGE_CHARS,
+    table_chars: int = TABLE_CHARS,
+) -> list:
+    """Builds the passage and table documents of one document page.
+
+    :return: Dicts with content_type ("passage" or "table"), page and content
+    """
+    blocks_by_id = index_blocks(blocks)
+    table_blocks = [block for block in blocks if block["BlockType"] == "TABLE"]
+
+    table_words = set()
+    for table_block in table_blocks:
+        for cell_id in _child_ids(table_block):
+            cell = blocks_by_id.get(cell_id)
+            if cell is not None:
+                table_words.update(_child_ids(cell))
+
+    def in_table(line: dict) -> bool:
+        word_ids = list(_child_ids(line))
+        return bool(word_ids) and table_words.issuperset(word_ids)
+
+    lines = [
+        block["Text"]
+        for block in blocks
+        if block["BlockType"] == "LINE" and not in_table(block)
+    ]
+
+    documents = [
+        {"content_type": "passage", "page": page, "part": part, "content": content}
+        for part, content in enumerate(_chunks(lines, passage_chars))
+    ]
+    for table_block in table_blocks:
+        table = build_table(table_block, blocks_by_id)
+        for document in table_documents(table, table_chars):
+            documents.append({"content_type": "table", "page": page, **document})
+    return documents
@@ -0,0 +1,153 @@
+"""
+Batches documents into OpenSearch bulk requests.
+
+Documents are serialized as they are added and sent once a batch reaches
+max_docs or max_bytes. Up to max_in_flight bulk requests run in the
+background, so the producer keeps going while earlier batches are indexed;
+add() only waits when that many are already outstanding. Items rejected
+with 429 are retried with backoff, other item failures are counted and kept
+for inspection. An optional on_item callback learns the outcome of every
+document, e.g. to tell when all of a source file's chunks are indexed.
+"""
+
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+
+try:
+    import orjson
+
+    def _encode_line(obj) -> bytes:
+        return orjson.dumps(obj) + b"\n"
+
+except ImportError:  # orjson is optional
+
+    def _encode_line(obj) -> bytes:
+        return (json.dumps(obj, separators=(",", ":")) + "\n").encode()
+
+
+@dataclass
+class BulkStats:
+    documents: int = 0
+    failed: int = 0
+    retried: int = 0
+    requests: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    errors: list = field(default_factory=list, repr=False)
+
+
+class BulkIndexer:
+    def __init__(
+        self,
+        client,
+        index: str,
+        max_docs: int = 500,
+        max_bytes: int = 5 * 1024 * 1024,
+        max_in_flight: int = 2,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_errors: int = 100,
+        on_item=None,
+    ):
+        """
+        :param client: opensearch-py AsyncOpenSearch client
+        :param index: Index to write to
+        :param max_docs: Most documents per bulk request
+        :param max_bytes: Most bytes per bulk request
+        :param max_in_flight: Most bulk requests outstanding at once
+        :param max_retries: Attempts at resending items rejected with 429
+        :param base_delay: First retry delay, in seconds, doubled per retry
+        :param max_errors: Most item errors kept in stats.errors
+        :param on_item: Called as on_item(tag, ok) once a document added with
+            a tag is indexed (ok=True) or has finally failed (ok=False)
+        """
+        self.client = client
+        self.index = index
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_errors = max_errors
+        self.on_item = on_item
+        self.stats = BulkStats()
+
+        # Serverless collections assign their own _id, so none is given.
+        self._action = _encode_line({"index": {"_index": index}})
+        self._batch = []
+        self._batch_bytes = 0
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks = set()
+        self._failure = None
+
+    async def add(self, document: dict, tag=None):
+        if self._failure is not None:
+            raise self._failure
+        line = _encode_line(document)
+        self._batch.append((line, tag))
+        self._batch_bytes += len(self._action) + len(line)
+        if len(self._batch) >= self.max_docs or self._batch_bytes >= self.max_bytes:
+            await self._send()
+
+    async def _send(self):
+        if not self._batch:
+            return
+        batch, self._batch, self._batch_bytes = self._batch, [], 0
+        await self._slots.acquire()
+        task = asyncio.ensure_future(self._index_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._slots.release()
+        if not task.cancelled() and task.exception() is not None:
+            self._failure = self._failure or task.exception()
+
+    async def _index_batch(self, batch: list):
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            body = b"".join(self._action + line for line, _ in batch)
+            response = await self.client.bulk(body=body)
+            self.stats.requests += 1
+            self.stats.bytes += len(body)
+
+            retry = []
+            for entry, item in zip(batch, response["items"]):
+                result = item["index"]
+                status = result.get("status", 200)
+                if status == 429 and attempt < self.max_retries:
+                    retry.append(entry)
+                    continue
+                ok = status < 300
+                if ok:
+                    self.stats.documents += 1
+                else:
+                    self.stats.failed += 1
+                    if len(self.stats.errors) < self.max_errors:
+                        self.stats.errors.append(result.get("error"))
+                if self.on_item is not None and entry[1] is not None:
+                    self.on_item(entry[1], ok)
+            if not retry:
+                break
+            self.stats.retried += len(retry)
+            batch = retry
+            await asyncio.sleep(self.base_delay * 2**attempt * random.uniform(0.5, 1))
+        self.stats.seconds += time.perf_counter() - started
+
+    async def flush(self):
+        """Sends the partial batch and waits for every bulk request."""
+        await self._send()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._failure is not None:
+            raise self._failure
+
+    async def close(self):
+        """Abandons outstanding bulk requests, e.g. after an error upstream."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,648 @@
+"""
+Ingests documents through upload -> extract -> embed -> index as a pipeline.
+
+Every stage is a group of asyncio workers, and stages are joined by bounded
+queues. When a stage falls behind, its input queue fills and the stages
+before it wait on put(), so the slowest stage sets the pace and memory
+stays bounded by the queue sizes. Extraction streams Textract results
+page by page, so a large document's early chunks are embedded and indexed
+while later pages are still being fetched.
+
+Chunks that nearly repeat one indexed before, in this run or an earlier
+one, are dropped before embedding (see dedup.py). A chunk's signature is
+stored once it is indexed, and copies of a chunk still on its way wait for
+it. Progress is checkpointed per document (see checkpoint.py), so an
+interrupted run picks up where it stopped. Every stage's throughput and
+every queue's depth are reported while the run goes.
+
+    python orchestrator.py file.pdf [file.pdf | s3://bucket/key ...]
+"""
+
+import asyncio
+import functools
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import aioboto3
+import boto3
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [
+    str(ROOT / "textract"),
+    str(ROOT / "bedrock"),
+    str(ROOT / "opensearch"),
+]
+
+from checkpoint import (  # noqa: E402
+    FAILED,
+    INDEXED,
+    INDEXING,
+    UPLOADED,
+    CheckpointStore,
+)
+from constants import EMBEDDING_DIMENSIONS, INDEX_NAME  # noqa: E402
+from dedup import PendingSignatures, SignatureStore  # noqa: E402
+from documents import page_documents, split_pages  # noqa: E402
+from indexer import BulkIndexer  # noqa: E402
+from invoke import embed  # noqa: E402
+from router import analyze  # noqa: E402
+from search import get_opensearch_client  # noqa: E402
+from textract_ingest import source_metadata  # noqa: E402
+
+load_dotenv()
+
+BUCKET_NAME = "soham-boto-s3-test"
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+FEATURE_TYPES = ["TABLES"]
+
+# Marks the end of a queue's input; one is sent per consuming worker.
+_DONE = object()
+
+
+@dataclass
+class Document:
+    source: str
+    bucket: str
+    key: str
+    uploaded: bool = False
+    resumed: bool = False
+    chunks: int = 0
+    duplicates: int = 0
+    indexed: int = 0
+    failed: int = 0
+    extracted: bool = False
+    error: str = None
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    processed: int = 0
+    emitted: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float = None
+
+    def to_dict(self) -> dict:
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            "processed": self.processed,
+            "emitted": self.emitted,
+            "errors": self.errors,
+            "per_second": self.processed / elapsed if elapsed else 0.0,
+            # Share of the workers' time spent working rather than waiting.
+            "utilization": (
+                self.busy_seconds / (elapsed * self.workers) if elapsed else 0.0
+            ),
+        }
+
+
+@dataclass
+class QueueStats:
+    size: int
+    samples: int = 0
+    total_depth: int = 0
+    max_depth: int = 0
+
+    def sample(self, depth: int):
+        self.samples += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def to_dict(self, depth: int) -> dict:
+        return {
+            "depth": depth,
+            "max_depth": self.max_depth,
+            "mean_depth": self.total_depth / self.samples if self.samples else 0.0,
+            "size": self.size,
+        }
+
+
+def parse_source(source: str, bucket: str) -> tuple:
+    """Returns (bucket, key) for a local path or an s3://bucket/key URL."""
+    if source.startswith("s3://"):
+        bucket, _, key = source[len("s3://") :].partition("/")
+        return bucket, key
+    return bucket, os.path.basename(source)
+
+
+class IngestOrchestrator:
+    def __init__(
+        self,
+        s3_client,
+        textract_client,
+        opensearch_client,
+        bedrock_client=None,
+        bucket: str = BUCKET_NAME,
+        index: str = INDEX_NAME,
+        checkpoint: CheckpointStore = None,
+        embedding_model_id: str = EMBEDDING_MODEL_ID,
+        embedding_params: dict = None,
+        feature_types=FEATURE_TYPES,
+        upload_workers: int = 4,
+        extract_workers: int = 4,
+        embed_workers: int = 8,
+        queue_size: int = 64,
+        report_interval: float = 10.0,
+        indexer: BulkIndexer = None,
+        on_report=None,
+        dedup: SignatureStore = None,
+        drop_duplicates: bool = True,
+    ):
+        """
+        :param s3_client: aioboto3 S3 client
+        :param textract_client: aioboto3 Textract client
+        :param opensearch_client: opensearch-py AsyncOpenSearch client
+        :param bedrock_client: Boto3 Bedrock runtime client; without one,
+            chunks are indexed without embeddings
+        :param bucket: Bucket local files are uploaded to
+        :param checkpoint: Progress store; a fresh one if not given
+        :param upload_workers: Concurrent uploads
+        :param extract_workers: Documents analyzed by Textract at once
+        :param embed_workers: Concurrent embedding requests
+        :param queue_size: Capacity of each queue between stages
+        :param report_interval: Seconds between progress reports, 0 for none
+        :param indexer: A configured BulkIndexer; one is built if not given
+        :param on_report: Called with stats() every report_interval; prints
+            them by default
+        :param dedup: Signatures of chunks already indexed; without one,
+            near-duplicate chunks are indexed like any other
+        :param drop_duplicates: Skip near-duplicate chunks; if False they are
+            indexed with duplicate_of set to the chunk they repeat
+        """
+        self.s3_client = s3_client
+        self.textract_client = textract_client
+        self.opensearch_client = opensearch_client
+        self.bedrock_client = bedrock_client
+        self.bucket = bucket
+        self.index = index
+        self.checkpoint = checkpoint or CheckpointStore()
+        self.embedding_model_id = embedding_model_id
+        # The index mapping expects vectors of EMBEDDING_DIMENSIONS.
+        self.embedding_params = {
+            "dimensions": EMBEDDING_DIMENSIONS,
+            **(embedding_params or {}),
+        }
+        self.feature_types = list(feature_types)
+        self.report_interval = report_interval
+        self.on_report = on_report or (lambda stats: print(format_stats(stats)))
+        self.dedup = dedup
+        self.drop_duplicates = drop_duplicates
+        self.duplicates = 0
+        self._pending = PendingSignatures(dedup.threshold) if dedup else None
+        # Chunk id -> documents whose copies of it were dropped while it was
+        # on its way to the index; they complete with it. Indexed chunks stay
+        # in _pending, without an entry here, until their signatures are saved.
+        self._waiting = {}
+        # Written to the SignatureStore in batches, off the event loop.
+        self._signatures = []
+        self._forgotten = []
+        self._saving = None
+
+        self.indexer = indexer or BulkIndexer(opensearch_client, index)
+        self.indexer.on_item = self._on_indexed
+
+        self.stages = {
+            "upload": StageStats("upload", upload_workers),
+            "extract": StageStats("extract", extract_workers),
+            "embed": StageStats("embed", embed_workers),
+            "index": StageStats("index", 1),
+        }
+        self.queues = {
+            name: asyncio.Queue(queue_size) for name in ("extract", "embed", "index")
+        }
+        self.queue_stats = {
+            name: QueueStats(queue_size) for name in ("extract", "embed", "index")
+        }
+        self.documents = {"indexed": 0, "failed": 0, "skipped": 0}
+        # (source, error) of every document that failed this run.
+        self.failures = []
+
+    def stats(self) -> dict:
+        return {
+            "documents": dict(self.documents),
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+            "queues": {
+                name: self.queue_stats[name].to_dict(queue.qsize())
+                for name, queue in self.queues.items()
+            },
+            "bulk": {
+                "indexed": self.indexer.stats.documents,
+                "failed": self.indexer.stats.failed,
+                "requests": self.indexer.stats.requests,
+            },
+            "dedup": (
+                {**self.dedup.stats(), "duplicates": self.duplicates}
+                if self.dedup is not None
+                else {}
+            ),
+        }
+
+    def _finish(self, document: Document):
+        if document.error is None and document.failed:
+            document.error = f"{document.failed} chunks failed to index"
+        if document.error is None:
+            self.documents["indexed"] += 1
+            self.checkpoint.mark(document.source, INDEXED, chunks=document.chunks)
+        else:
+            self.documents["failed"] += 1
+            self.failures.append((document.source, document.error))
+            if self.dedup is not None:
+                # Its chunks may not be in the index, so they mustn't stop
+                # copies elsewhere from being indexed.
+                self._forgotten.append(document.source)
+            self.checkpoint.mark(
+                document.source, FAILED, chunks=document.chunks, error=document.error
+            )
+
+    def _fail(self, stage: str, document: Document, error: Exception):
+        self.stages[stage].errors += 1
+        document.error = document.error or f"{stage}: {error!r}"
+        print(f"{document.source}: {stage} failed: {error!r}")
+
+    def _on_indexed(self, tag: tuple, ok: bool):
+        document, chunk_id = tag
+        if self.dedup is not None:
+            if not ok:
+                self._pending.pop(chunk_id)
+            elif chunk_id in self._waiting:
+                # Still matched from memory until _saved() takes it out.
+                self._signatures.append(chunk_id)
+            for waiting in self._waiting.pop(chunk_id, ()):
+                if ok:
+                    # The dropped copy is covered by this chunk.
+                    waiting.chunks -= 1
+                else:
+                    # Its copy is not in the index either; a rerun of the
+                    # document indexes it.
+                    waiting.failed += 1
+                self._settled(waiting)
+        if ok:
+            document.indexed += 1
+        else:
+            document.failed += 1
+        self._settled(document)
+
+    def _settled(self, document: Document):
+        """Finishes a document once the indexer has reported on its chunks."""
+        if document.extracted and document.indexed + document.failed == document.chunks:
+            self._finish(document)
+
+    async def _save_signatures(self):
+        """Writes the batched signature changes on a thread, in order.
+
+        A batch keeps going if the caller is cancelled; the next one waits
+        for it.
+        """
+        if self._saving is not None:
+            await asyncio.wait([self._saving])
+        signatures, self._signatures = self._signatures, []
+        forgotten, self._forgotten = self._forgotten, []
+        if not signatures and not forgotten:
+            return
+        entries = [(chunk_id, *self._pending.get(chunk_id)) for chunk_id in signatures]
+        self._saving = asyncio.ensure_future(
+            asyncio.to_thread(self.dedup.save, entries, forgotten)
+        )
+        self._saving.add_done_callback(
+            functools.partial(self._saved, signatures, forgotten)
+        )
+        await asyncio.wait([self._saving])
+
+    def _saved(self, signatures: list, forgotten: list, saving: asyncio.Future):
+        if saving.cancelled() or saving.exception() is not None:
+            # The signatures stay pending, so copies are still caught, and
+            # the batch is tried again with the next one.
+            error = "cancelled" if saving.cancelled() else repr(saving.exception())
+            print(f"dedup: saving {len(signatures)} signatures failed: {error}")
+            self._signatures[:0] = signatures
+            self._forgotten[:0] = forgotten
+            return
+        for chunk_id in signatures:
+            self._pending.pop(chunk_id)
+
+    async def _upload(self, document: Document):
+        if document.uploaded or not os.path.exists(document.source):
+            return document  # Uploaded by an earlier run, or already in S3.
+        try:
+            # Public, like s3/upload_file.py: chunks cite the object by its
+            # https URL (sourcefilepath).
+            await self.s3_client.upload_file(
+                document.source,
+                document.bucket,
+                document.key,
+                ExtraArgs={"ACL": "public-read"},
+            )
+        except Exception as error:
+            self._fail("upload", document, error)
+            self._finish(document)
+            return None
+        self.checkpoint.mark(
+            document.source, UPLOADED, bucket=document.bucket, key=document.key
+        )
+        return document
+
+    async def _purge(self, document: Document):
+        """Removes chunks indexed by an interrupted run of this document."""
+        url = source_metadata(document.bucket, document.key)["sourcefilepath"]
+        await self.opensearch_client.delete_by_query(
+            index=self.index,
+            body={"query": {"match_phrase": {"sourcefilepath": url}}},
+        )
+
+    async def _duplicate(self, document: Document, chunk: dict) -> bool:
+        """Checks a chunk against the signatures; True if it is to be dropped.
+
+        A chunk that is kept stays pending, matched from memory, until the
+        indexer reports on it and, if it was indexed, until its signature is
+        saved. Signatures of chunks that failed are never stored.
+        """
+        if self.dedup is None:
+            return False
+        fingerprint = await asyncio.to_thread(self.dedup.fingerprint, chunk["content"])
+        if fingerprint is None:
+            return False
+        duplicate_of = await asyncio.to_thread(
+            self.dedup.find, chunk["id"], fingerprint
+        )
+        pending = False
+        if duplicate_of is None:
+            # No await from here to add(), so two copies can't both be kept.
+            duplicate_of = self._pending.find(chunk["id"], fingerprint)
+            pending = duplicate_of is not None
+        if duplicate_of is None:
+            self._pending.add(chunk["id"], document.source, fingerprint)
+            self._waiting[chunk["id"]] = []
+            return False
+        self.duplicates += 1
+        document.duplicates += 1
+        if not self.drop_duplicates:
+            chunk["duplicate_of"] = duplicate_of
+            return False
+        if pending and duplicate_of in self._waiting:
+            # Counted until the chunk it repeats is indexed or fails.
+            document.chunks += 1
+            self._waiting[duplicate_of].append(document)
+        # Otherwise it repeats an indexed chunk, saved or about to be.
+        return True
+
+    async def _extract(self, document: Document):
+        if document.resumed:
+            try:
+                await self._purge(document)
+            except Exception as error:
+                # Chunks have no stable _id, so indexing again on top of the
+                # earlier ones would duplicate them. Leave it for a rerun.
+                self._fail("extract", document, error)
+                document.extracted = True
+                self._finish(document)
+                return
+            if self.dedup is not None:
+                await asyncio.to_thread(self.dedup.forget, document.source)
+        self.checkpoint.mark(
+            document.source, INDEXING, bucket=document.bucket, key=document.key
+        )
+        source = source_metadata(document.bucket, document.key)
+        outbox = self.queues["embed"]
+        pages = split_pages(
+            analyze(
+                self.textract_client,
+                self.s3_client,
+                document.bucket,
+                document.key,
+                self.feature_types,
+            )
+        )
+        try:
+            async for page, blocks in pages:
+                for chunk in page_documents(page, blocks):
+                    part = chunk.get("table_id", "p")
+                    chunk.update(
+                        source,
+                        id=f"{source['sourcefilepath']}#{page}-{part}-{chunk['part']}",
+                        sourcepage=f"{source['filename']}#page={page}",
+                    )
+                    # Before embedding, so dropped chunks cost nothing more.
+                    if await self._duplicate(document, chunk):
+                        continue
+                    document.chunks += 1
+                    self.stages["extract"].emitted += 1
+                    await outbox.put((document, chunk))
+        except Exception as error:
+            self._fail("extract", document, error)
+        finally:
+            await pages.aclose()
+            # Every chunk is queued; the document completes once the indexer
+            # has reported on all of them.
+            document.extracted = True
+            self._settled(document)
+
+    async def _embed(self, item):
+        document, chunk = item
+        if self.bedrock_client is None:
+            return item
+        try:
+            chunk["embedding"] = await asyncio.to_thread(
+                embed,
+                self.bedrock_client,
+                self.embedding_model_id,
+                chunk["content"],
+                **self.embedding_params,
+            )
+        except Exception as error:
+            self._fail("embed", document, error)
+            self._on_indexed((document, chunk["id"]), False)
+            return None
+        return item
+
+    async def _index(self, item):
+        document, chunk = item
+        await self.indexer.add(chunk, tag=(document, chunk["id"]))
+
+    async def _worker(self, name: str, inbox: asyncio.Queue, handle, outbox):
+        stats = self.stages[name]
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            started = time.perf_counter()
+            result = await handle(item)
+            stats.processed += 1
+            stats.busy_seconds += time.perf_counter() - started
+            if result is not None and outbox is not None:
+                stats.emitted += 1
+                await outbox.put(result)
+
+    async def _stage(self, name: str, inbox, handle, outbox=None, consumers=0):
+        """Runs a stage's workers, then tells each consumer the input ended."""
+        stats = self.stages[name]
+        await asyncio.gather(
+            *(self._worker(name, inbox, handle, outbox) for _ in range(stats.workers))
+        )
+        stats.finished_at = time.monotonic()
+        for _ in range(consumers):
+            await outbox.put(_DONE)
+
+    async def _report(self):
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(min(1.0, self.report_interval or 1.0))
+            for name, queue in self.queues.items():
+                self.queue_stats[name].sample(queue.qsize())
+            if self.dedup is not None:
+                await self._save_signatures()
+            if self.report_interval and (
+                time.monotonic() - last_report >= self.report_interval
+            ):
+                last_report = time.monotonic()
+                self.on_report(self.stats())
+
+    async def _feed(self, sources, uploads: asyncio.Queue):
+        for source in sources:
+            previous = self.checkpoint.get(source)
+            if previous and previous["stage"] == INDEXED:
+                self.documents["skipped"] += 1
+                continue
+            bucket, key = parse_source(source, self.bucket)
+            document = Document(source, bucket, key)
+            if previous:
+                # A key is recorded once the object is in S3.
+                document.uploaded = previous["key"] is not None
+                # Anything past upload may have left chunks in the index.
+                document.resumed = previous["stage"] in (INDEXING, FAILED)
+            await uploads.put(document)
+        for _ in range(self.stages["upload"].workers):
+            await uploads.put(_DONE)
+
+    async def run(self, sources) -> dict:
+        """Ingests local files or s3://bucket/key URLs and returns stats().
+
+        Documents indexed by an earlier run with the same checkpoint are
+        skipped.
+        """
+        uploads = asyncio.Queue(self.queues["extract"].maxsize)
+        extract, embed_, index = (
+            self.queues["extract"],
+            self.queues["embed"],
+            self.queues["index"],
+        )
+        for stage in self.stages.values():
+            stage.started_at = time.monotonic()
+        reporter = asyncio.ensure_future(self._report())
+        try:
+            await _gather_or_cancel(
+                self._feed(sources, uploads),
+                self._stage(
+                    "upload",
+                    uploads,
+                    self._upload,
+                    extract,
+                    self.stages["extract"].workers,
+                ),
+                self._stage(
+                    "extract",
+                    extract,
+                    self._extract,
+                    embed_,
+                    self.stages["embed"].workers,
+                ),
+                self._stage("embed", embed_, self._embed, index, 1),
+                self._stage("index", index, self._index),
+            )
+            await self.indexer.flush()
+            if self.dedup is not None:
+                reporter.cancel()
+                await self._save_signatures()
+        except BaseException:
+            await self.indexer.close()
+            raise
+        finally:
+            reporter.cancel()
+        return self.stats()
+
+
+async def _gather_or_cancel(*coroutines):
+    """Runs coroutines together; if one raises, cancels the rest and re-raises.
+
+    A failed stage would otherwise leave the others blocked on its queues.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def format_stats(stats: dict) -> str:
+    lines = [
+        "documents: "
+        + ", ".join(f"{name} {count}" for name, count in stats["documents"].items())
+    ]
+    for name, stage in stats["stages"].items():
+        lines.append(
+            f"  {name:<8} {stage['processed']:>7} done {stage['per_second']:8.1f}/s  "
+            f"{stage['utilization']:6.1%} busy  {stage['errors']} errors"
+        )
+    for name, queue in stats["queues"].items():
+        lines.append(
+            f"  -> {name:<6} depth {queue['depth']:>3}/{queue['size']}  "
+            f"max {queue['max_depth']}  mean {queue['mean_depth']:.1f}"
+        )
+    if stats.get("dedup"):
+        lines.append(
+            "  dedup: "
+            + ", ".join(f"{name} {count}" for name, count in stats["dedup"].items())
+        )
+    return "\n".join(lines)
+
+
+async def main():
+    sources = sys.argv[1:]
+    if not sources:
+        print(__doc__.strip().splitlines()[-1].strip())
+        return
+
+    session = aioboto3.Session(
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
+    )
+    bedrock_client = boto3.client(service_name="bedrock-runtime")
+    opensearch_client = await get_opensearch_client(session)
+    checkpoint = CheckpointStore()
+    dedup = SignatureStore()
+
+    try:
+        async with session.client("s3") as s3_client, session.client(
+            "textract"
+        ) as textract_client:
+            orchestrator = IngestOrchestrator(
+                s3_client,
+                textract_client,
+                opensearch_client,
+                bedrock_client,
+                checkpoint=checkpoint,
+                dedup=dedup,
+            )
+            stats = await orchestrator.run(sources)
+    finally:
+        await opensearch_client.close()
+        checkpoint.close()
+        dedup.close()
+
+    print(format_stats(stats))
+    print(f"Checkpoint: {checkpoint.path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""
+Indexes a document's Textract analysis into OpenSearch as it streams in.
+
+Result pages are regrouped by document page, each page is turned into
+passage and table documents, and the documents are bulk indexed in the
+background. Early pages are searchable while Textract results for later
+pages are still being fetched, and at most one document page of blocks is
+held in memory.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import aioboto3
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "textract"), str(ROOT / "opensearch")]
+
+from constants import INDEX_NAME  # noqa: E402
+from documents import (  # noqa: E402
+    PASSAGE_CHARS,
+    TABLE_CHARS,
+    page_documents,
+    split_pages,
+)
+from indexer import BulkIndexer  # noqa: E402
+from router import analyze  # noqa: E402
+from search import get_opensearch_client  # noqa: E402
+
+load_dotenv()
+
+BUCKET_NAME = "soham-boto-s3-test"
+DOCUMENT_NAME = "table.pdf"
+FEATURE_TYPES = ["TABLES"]
+
+
+@dataclass
+class IngestResult:
+    pages: int = 0
+    passages: int = 0
+    tables: int = 0
+    seconds: float = 0.0
+
+
+def source_metadata(bucket: str, key: str, tags=None, language="english") -> dict:
+    """Fields shared by every document of an S3 object"""
+    return {
+        "filename": os.path.basename(key),
+        "sourcefilepath": f"https://{bucket}.s3.amazonaws.com/{key}",
+        "language": language,
+        "tags": list(tags or []),
+    }
+
+
+async def ingest_pages(
+    pages,
+    indexer: BulkIndexer,
+    source: dict,
+    passage_chars: int = PASSAGE_CHARS,
+    table_chars: int = TABLE_CHARS,
+) -> IngestResult:
+    """Converts and indexes (page, blocks) pairs as they arrive.
+
+    :param pages: Async iterator of (page, blocks), e.g. documents.split_pages
+    :param indexer: Where documents go; flushed before returning
+    :param source: Fields added to every document, see source_metadata
+    """
+    started = time.perf_counter()
+    result = IngestResult()
+    try:
+        async for page, blocks in pages:
+            result.pages += 1
+            for document in page_documents(page, blocks, passage_chars, table_chars):
+                if document["content_type"] == "table":
+                    result.tables += 1
+                    part_id = f"t{document['table_id']}-{document['part']}"
+                else:
+                    result.passages += 1
+                    part_id = f"p{document['part']}"
+                await indexer.add(
+                    {
+                        **source,
+                        **document,
+                        "id": f"{source['sourcefilepath']}#{page}-{part_id}",
+                        "sourcepage": f"{source['filename']}#page={page}",
+                    }
+                )
+        await indexer.flush()
+    except BaseException:
+        await indexer.close()
+        raise
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+async def main():
+    session = aioboto3.Session(
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
+    )
+    opensearch_client = await get_opensearch_client(session)
+    indexer = BulkIndexer(opensearch_client, INDEX_NAME)
+
+    try:
+        async with session.client("s3") as s3_client, session.client(
+            "textract"
+        ) as textract_client:
+            result = await ingest_pages(
+                split_pages(
+                    analyze(
+                        textract_client,
+                        s3_client,
+                        BUCKET_NAME,
+                        DOCUMENT_NAME,
+                        FEATURE_TYPES,
+                    )
+                ),
+                indexer,
+                source_metadata(BUCKET_NAME, DOCUMENT_NAME),
+            )
+    finally:
+        await opensearch_client.close()
+
+    print(
+        f"Indexed {result.pages} pages of {DOCUMENT_NAME} as {result.passages} "
+        f"passages and {result.tables} table chunks in {result.seconds:.1f}s"
+    )
+    print(indexer.stats)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,272 @@
+"""
+Runs the ingestion pipeline in several processes to use every core.
+
+Async I/O keeps one process busy, but PDF parsing, block processing and
+encoding bulk bodies all hold the GIL, so one process tops out at one core.
+The coordinator shards the sources (a manifest file or an S3 prefix) across
+N worker processes. Each worker runs its own event loop, AWS clients with
+connection pools sized for its concurrency, and an IngestOrchestrator. Sources
+are sharded by a hash of their name, so a rerun hands every document to
+the same shard. The shared SQLite checkpoint skips finished documents.
+
+Workers send progress and failures back over a queue, and the coordinator
+prints combined stats. It exits non-zero if any document or worker failed.
+
+    python workers.py --manifest files.txt [--workers N]
+    python workers.py --prefix s3://bucket/prefix/ [--workers N]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import zlib
+from pathlib import Path
+
+from botocore.config import Config
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "opensearch"), str(ROOT / "identity")]
+
+from checkpoint import CheckpointStore  # noqa: E402
+from constants import COLLECTION_NAME, INDEX_NAME  # noqa: E402
+from credentials import default_provider  # noqa: E402
+from dedup import SignatureStore  # noqa: E402
+from orchestrator import (  # noqa: E402
+    BUCKET_NAME,
+    EMBEDDING_MODEL_ID,
+    IngestOrchestrator,
+    format_stats,
+)
+from search import get_opensearch_client  # noqa: E402
+
+load_dotenv()
+
+
+def read_manifest(path: str) -> list:
+    """One local path or s3://bucket/key per line; blank and # lines ignored."""
+    with open(path) as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+async def list_prefix(session, url: str) -> list:
+    """Lists every object under s3://bucket/prefix as s3:// URLs."""
+    bucket, _, prefix = url[len("s3://") :].partition("/")
+    sources = []
+    async with session.client("s3") as s3_client:
+        paginator = s3_client.get_paginator("list_objects_v2")
+        async for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                if not obj["Key"].endswith("/"):
+                    sources.append(f"s3://{bucket}/{obj['Key']}")
+    return sources
+
+
+def shard(sources, workers: int) -> list:
+    """Splits sources into `workers` lists by a stable hash."""
+    shards = [[] for _ in range(workers)]
+    for source in sources:
+        shards[zlib.crc32(source.encode()) % workers].append(source)
+    return shards
+
+
+def merge_stats(stats_list) -> dict:
+    """Combines the stats() of several orchestrators."""
+    merged = {"documents": {}, "stages": {}, "queues": {}, "bulk": {}, "dedup": {}}
+    for stats in stats_list:
+        for name, count in stats.get("dedup", {}).items():
+            merged["dedup"][name] = merged["dedup"].get(name, 0) + count
+        for name, count in stats["documents"].items():
+            merged["documents"][name] = merged["documents"].get(name, 0) + count
+        for name, count in stats["bulk"].items():
+            merged["bulk"][name] = merged["bulk"].get(name, 0) + count
+        for name, stage in stats["stages"].items():
+            total = merged["stages"].setdefault(
+                name, {"processed": 0, "errors": 0, "per_second": 0.0, "busy": []}
+            )
+            total["processed"] += stage["processed"]
+            total["errors"] += stage["errors"]
+            total["per_second"] += stage["per_second"]
+            total["busy"].append(stage["utilization"])
+        for name, depth in stats["queues"].items():
+            total = merged["queues"].setdefault(
+                name, {"depth": 0, "size": 0, "max_depth": 0, "mean_depth": 0.0}
+            )
+            total["depth"] += depth["depth"]
+            total["size"] += depth["size"]
+            total["max_depth"] = max(total["max_depth"], depth["max_depth"])
+            total["mean_depth"] += depth["mean_depth"]
+    for stage in merged["stages"].values():
+        busy = stage.pop("busy")
+        stage["utilization"] = sum(busy) / len(busy)
+    return merged
+
+
+async def _run_worker(worker_id: int, sources: list, options: dict, messages):
+    # Workers share the coordinator's cached credentials instead of each
+    # assuming the role, and refresh them in the background.
+    provider = default_provider()
+    session = provider.aioboto3_session()
+    # One pool per client, large enough for the stage that uses it most.
+    config = Config(max_pool_connections=options["pool_size"])
+    bedrock_client = provider.boto3_session().client(
+        service_name="bedrock-runtime", config=config
+    )
+    opensearch_client = await get_opensearch_client(
+        session, provider.botocore_credentials(), collection=options["collection"]
+    )
+    checkpoint = CheckpointStore(options["checkpoint"])
+    # One signature database for all workers, so duplicates are found
+    # across shards.
+    dedup = SignatureStore(options["dedup"]) if options.get("dedup") else None
+
+    def report(stats):
+        messages.put(("progress", worker_id, stats))
+
+    try:
+        async with session.client("s3", config=config) as s3_client, session.client(
+            "textract", config=config
+        ) as textract_client:
+            orchestrator = IngestOrchestrator(
+                s3_client,
+                textract_client,
+                opensearch_client,
+                bedrock_client,
+                bucket=options["bucket"],
+                index=options["index"],
+                checkpoint=checkpoint,
+                embedding_model_id=options["embedding_model_id"],
+                embed_workers=options["embed_workers"],
+                report_interval=options["report_interval"],
+                on_report=report,
+                dedup=dedup,
+                drop_duplicates=not options.get("keep_duplicates", False),
+            )
+            stats = await orchestrator.run(sources)
+    finally:
+        await opensearch_client.close()
+        checkpoint.close()
+        if dedup is not None:
+            dedup.close()
+    messages.put(("done", worker_id, stats, orchestrator.failures))
+
+
+def worker_main(worker_id: int, sources: list, options: dict, messages):
+    try:
+        asyncio.run(_run_worker(worker_id, sources, options, messages))
+    except BaseException as error:
+        messages.put(("error", worker_id, repr(error)))
+        raise
+
+
+def coordinate(sources, workers: int, options: dict) -> int:
+    """Runs the shards in worker processes until all finish.
+
+    :return: 0 if every document was indexed, else 1
+    """
+    # spawn, not fork: forked children would inherit the parent's clients
+    # and any threads it has started.
+    context = multiprocessing.get_context("spawn")
+    messages = context.Queue()
+    processes = {}
+    for worker_id, sources_shard in enumerate(shard(sources, workers)):
+        if sources_shard:
+            processes[worker_id] = context.Process(
+                target=worker_main,
+                args=(worker_id, sources_shard, options, messages),
+                name=f"ingest-worker-{worker_id}",
+            )
+    print(f"{len(sources)} documents across {len(processes)} worker processes")
+    for process in processes.values():
+        process.start()
+
+    latest, failures, errors = {}, [], {}
+    finished = set()
+    last_report = time.monotonic()
+    while len(finished) + len(errors) < len(processes):
+        try:
+            message = messages.get(timeout=1.0)
+        except queue.Empty:
+            for worker_id, process in processes.items():
+                if worker_id not in finished | errors.keys() and not process.is_alive():
+                    errors[worker_id] = f"exited with code {process.exitcode}"
+            continue
+
+        kind, worker_id = message[:2]
+        if kind == "progress":
+            latest[worker_id] = message[2]
+        elif kind == "done":
+            latest[worker_id] = message[2]
+            failures.extend(message[3])
+            finished.add(worker_id)
+        elif kind == "error":
+            errors[worker_id] = message[2]
+
+        if time.monotonic() - last_report >= options["report_interval"] and latest:
+            last_report = time.monotonic()
+            print(format_stats(merge_stats(latest.values())))
+
+    for process in processes.values():
+        process.join()
+
+    if latest:
+        print(format_stats(merge_stats(latest.values())))
+    for source, error in failures:
+        print(f"FAILED {source}: {error}")
+    for worker_id, error in sorted(errors.items()):
+        print(f"Worker {worker_id} failed: {error}")
+    return 1 if failures or errors else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest documents in parallel")
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument("--manifest", help="File listing one source per line")
+    inputs.add_argument("--prefix", help="s3://bucket/prefix to ingest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--bucket", default=BUCKET_NAME, help="Upload bucket")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--index", default=INDEX_NAME)
+    parser.add_argument("--embedding-model-id", default=EMBEDDING_MODEL_ID)
+    parser.add_argument("--checkpoint", default="ingest-checkpoint.sqlite3")
+    parser.add_argument("--dedup", default="ingest-dedup.sqlite3", help="Signatures")
+    parser.add_argument("--no-dedup", action="store_true", help="Index duplicates")
+    parser.add_argument(
+        "--keep-duplicates",
+        action="store_true",
+        help="Index near-duplicate chunks with duplicate_of instead of dropping them",
+    )
+    parser.add_argument("--embed-workers", type=int, default=8)
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    args = parser.parse_args()
+
+    # Resolve credentials before spawning, so the workers find them cached.
+    provider = default_provider()
+    if args.manifest:
+        sources = read_manifest(args.manifest)
+    else:
+        session = provider.aioboto3_session()
+        sources = asyncio.run(list_prefix(session, args.prefix))
+
+    options = {
+        "bucket": args.bucket,
+        "collection": args.collection,
+        "index": args.index,
+        "embedding_model_id": args.embedding_model_id,
+        "checkpoint": args.checkpoint,
+        "dedup": None if args.no_dedup else args.dedup,
+        "keep_duplicates": args.keep_duplicates,
+        "embed_workers": args.embed_workers,
+        "report_interval": args.report_interval,
+        "pool_size": max(10, args.embed_workers * 2),
+    }
+    sys.exit(coordinate(sources, max(1, args.workers), options))
+
+
+if __name__ == "__main__":
+    main()
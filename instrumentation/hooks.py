@@ -0,0 +1,352 @@
+"""
+Times every AWS call through botocore's event hooks.
+
+Handlers on before-call, request-created, needs-retry, after-call and
+after-call-error follow each operation through its attempts. They record
+its latency, retries, throttled attempts and bytes sent and received into a
+CallRecorder. The same handlers work for boto3 and aioboto3 clients, since
+aiobotocore emits the same events. OpenSearch clients are wrapped at the
+transport and connection level instead, because opensearch-py doesn't use
+botocore for requests.
+
+Connection reuse comes from the urllib3 pools of sync clients: connections
+opened against requests made. aiohttp pools don't keep those counters.
+
+    with profile("ingest", report_path="aws-calls.json"):
+        ...  # every AWS and OpenSearch client created in here is instrumented
+"""
+
+import contextvars
+import json
+import time
+import weakref
+from contextlib import contextmanager
+
+import botocore.session
+from recorder import THROTTLING_ERROR_CODES, CallRecorder
+
+try:
+    from aiobotocore.session import AioSession
+except ImportError:  # aiobotocore is optional
+    AioSession = None
+
+try:
+    from opensearchpy import AsyncOpenSearch
+except ImportError:  # opensearch-py is optional
+    AsyncOpenSearch = None
+
+_STATE = "instrumentation"
+_EVENTS = (
+    "before-call",
+    "request-created",
+    "needs-retry",
+    "after-call",
+    "after-call-error",
+)
+
+_opensearch_call = contextvars.ContextVar("opensearch_call", default=None)
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode())
+    if isinstance(body, dict):
+        return len(json.dumps(body))
+    if hasattr(body, "__len__"):
+        return len(body)
+    # A file-like body, e.g. an upload part: measure it without reading.
+    try:
+        position = body.tell()
+        size = body.seek(0, 2) - position
+        body.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+def _opensearch_operation(method: str, url: str) -> str:
+    """Names an OpenSearch request by its API, e.g. "POST _bulk"."""
+    parts = [part for part in url.split("?")[0].split("/") if part]
+    api = next((part for part in reversed(parts) if part.startswith("_")), None)
+    if api is None:
+        api = "{index}" if parts else "/"
+    return f"{method} {api}"
+
+
+class Instrumentation:
+    def __init__(self, recorder: CallRecorder = None):
+        self.recorder = recorder or CallRecorder()
+        self._clients = weakref.WeakValueDictionary()
+        self._patches = []
+
+    # botocore events ---------------------------------------------------
+
+    def _before_call(self, model, context, **kwargs):
+        if self.recorder.sampled():
+            context[_STATE] = {
+                "service": model.service_model.service_name,
+                "operation": model.name,
+                "started": time.perf_counter(),
+                "throttles": 0,
+                "request_bytes": 0,
+            }
+
+    def _request_created(self, request, **kwargs):
+        # Emitted once per attempt, so retried bodies are counted again.
+        state = (getattr(request, "context", None) or {}).get(_STATE)
+        if state is not None:
+            state["request_bytes"] += _body_size(request.body)
+
+    def _needs_retry(self, request_dict, response=None, **kwargs):
+        state = request_dict.get("context", {}).get(_STATE)
+        if state is not None and response is not None:
+            http_response, parsed = response
+            code = parsed.get("Error", {}).get("Code")
+            if code in THROTTLING_ERROR_CODES or http_response.status_code == 429:
+                state["throttles"] += 1
+        # Returning None leaves the retry decision to botocore.
+
+    def _after_call(self, http_response, parsed, context, **kwargs):
+        state = context.pop(_STATE, None)
+        if state is None:
+            return
+        metadata = parsed.get("ResponseMetadata", {})
+        headers = metadata.get("HTTPHeaders", {})
+        error_code = None
+        if http_response.status_code >= 300:
+            error_code = parsed.get("Error", {}).get("Code") or str(
+                http_response.status_code
+            )
+        self.recorder.record(
+            state["service"],
+            state["operation"],
+            time.perf_counter() - state["started"],
+            retries=metadata.get("RetryAttempts", 0),
+            throttles=state["throttles"],
+            request_bytes=state["request_bytes"],
+            response_bytes=int(headers.get("content-length", 0)),
+            error_code=error_code,
+        )
+
+    def _after_call_error(self, exception, context, **kwargs):
+        # Connection errors and timeouts, which have no response.
+        state = context.pop(_STATE, None)
+        if state is not None:
+            self.recorder.record(
+                state["service"],
+                state["operation"],
+                time.perf_counter() - state["started"],
+                throttles=state["throttles"],
+                request_bytes=state["request_bytes"],
+                error_code=type(exception).__name__,
+            )
+
+    def _handlers(self):
+        return (
+            self._before_call,
+            self._request_created,
+            self._needs_retry,
+            self._after_call,
+            self._after_call_error,
+        )
+
+    def register(self, events):
+        """Registers the handlers on an event emitter."""
+        for event, handler in zip(_EVENTS, self._handlers()):
+            events.register(event, handler, unique_id=f"{_STATE}-{event}-{id(self)}")
+
+    def unregister(self, events):
+        for event, handler in zip(_EVENTS, self._handlers()):
+            events.unregister(event, handler, unique_id=f"{_STATE}-{event}-{id(self)}")
+
+    # Clients and sessions ----------------------------------------------
+
+    def instrument_client(self, client, name: str = None):
+        """Instruments a boto3 or aioboto3 client."""
+        self.register(client.meta.events)
+        name = name or f"{client.meta.service_model.service_name}-{id(client):x}"
+        self._clients[name] = client
+        return client
+
+    def instrument_session(self, session):
+        """Instruments every client created from a boto3 or aioboto3 session."""
+        self.register(session.events)
+        return session
+
+    def instrument_opensearch(self, client):
+        """Instruments an opensearch-py AsyncOpenSearch client."""
+        recorder = self.recorder
+        transport = client.transport
+        perform_request = transport.perform_request
+
+        async def transport_perform_request(method, url, *args, **kwargs):
+            if not recorder.sampled():
+                return await perform_request(method, url, *args, **kwargs)
+            state = {
+                "attempts": 0,
+                "throttles": 0,
+                "request_bytes": 0,
+                "response_bytes": 0,
+            }
+            token = _opensearch_call.set(state)
+            started = time.perf_counter()
+            error_code = None
+            try:
+                return await perform_request(method, url, *args, **kwargs)
+            except Exception as error:
+                status = getattr(error, "status_code", None)
+                error_code = str(status) if status else type(error).__name__
+                raise
+            finally:
+                _opensearch_call.reset(token)
+                recorder.record(
+                    "opensearch",
+                    _opensearch_operation(method, url),
+                    time.perf_counter() - started,
+                    retries=max(0, state["attempts"] - 1),
+                    throttles=state["throttles"],
+                    request_bytes=state["request_bytes"],
+                    response_bytes=state["response_bytes"],
+                    error_code=error_code,
+                )
+
+        transport.perform_request = transport_perform_request
+
+        # AsyncTransport creates its connections on the first request (and
+        # again after sniffing), so wrap them whenever they are set.
+        set_connections = transport.set_connections
+
+        def instrumented_set_connections(hosts):
+            set_connections(hosts)
+            self._wrap_connections(transport)
+
+        transport.set_connections = instrumented_set_connections
+        self._wrap_connections(transport)
+        return client
+
+    def _wrap_connections(self, transport):
+        pool = getattr(transport, "connection_pool", None)
+        for connection in pool.connections if pool is not None else ():
+            if not getattr(connection, "_instrumented", False):
+                connection.perform_request = self._wrap_connection(
+                    connection.perform_request
+                )
+                connection._instrumented = True
+
+    @staticmethod
+    def _wrap_connection(perform_request):
+        async def connection_perform_request(
+            method, url, params=None, body=None, *args, **kwargs
+        ):
+            state = _opensearch_call.get()
+            if state is None:
+                return await perform_request(method, url, params, body, *args, **kwargs)
+            state["attempts"] += 1
+            state["request_bytes"] += _body_size(body)
+            try:
+                status, headers, data = await perform_request(
+                    method, url, params, body, *args, **kwargs
+                )
+            except Exception as error:
+                if getattr(error, "status_code", None) == 429:
+                    state["throttles"] += 1
+                raise
+            state["response_bytes"] += _body_size(data)
+            return status, headers, data
+
+        return connection_perform_request
+
+    # Process-wide ------------------------------------------------------
+
+    def install(self):
+        """Instruments every boto3, aioboto3 and AsyncOpenSearch client created
+        from now on."""
+        instrumentation = self
+        original = botocore.session.Session.create_client
+
+        def create_client(session, *args, **kwargs):
+            return instrumentation.instrument_client(original(session, *args, **kwargs))
+
+        botocore.session.Session.create_client = create_client
+        self._patches.append((botocore.session.Session, "create_client", original))
+
+        if AioSession is not None:
+            # AioSession.create_client returns an async context manager
+            # around _create_client.
+            original_aio = AioSession._create_client
+
+            async def _create_client(session, *args, **kwargs):
+                return instrumentation.instrument_client(
+                    await original_aio(session, *args, **kwargs)
+                )
+
+            AioSession._create_client = _create_client
+            self._patches.append((AioSession, "_create_client", original_aio))
+
+        if AsyncOpenSearch is not None:
+            original_init = AsyncOpenSearch.__init__
+
+            def __init__(client, *args, **kwargs):
+                original_init(client, *args, **kwargs)
+                instrumentation.instrument_opensearch(client)
+
+            AsyncOpenSearch.__init__ = __init__
+            self._patches.append((AsyncOpenSearch, "__init__", original_init))
+
+    def uninstall(self):
+        while self._patches:
+            owner, name, original = self._patches.pop()
+            setattr(owner, name, original)
+
+    def collect_connections(self):
+        """Copies the connection counters of instrumented sync clients."""
+        for name, client in list(self._clients.items()):
+            http_session = getattr(client._endpoint, "http_session", None)
+            managers = [getattr(http_session, "_manager", None)]
+            managers += list(getattr(http_session, "_proxy_managers", {}).values())
+            opened = requests = 0
+            for manager in filter(None, managers):
+                for key in manager.pools.keys():
+                    pool = manager.pools[key]
+                    opened += pool.num_connections
+                    requests += pool.num_requests
+            if requests:
+                self.recorder.set_connections(name, opened, requests)
+
+
+@contextmanager
+def profile(
+    name: str = "run",
+    sample_rate: float = 1.0,
+    report_path: str = None,
+    print_report: bool = True,
+):
+    """Instruments every AWS and OpenSearch client created in the block and
+    reports on exit.
+
+    :param name: Run name in the report
+    :param sample_rate: Share of calls to record
+    :param report_path: Where to write the JSON report, if anywhere
+    :param print_report: Print the table of operations on exit
+    """
+    instrumentation = Instrumentation(CallRecorder(sample_rate))
+    instrumentation.install()
+    started = time.perf_counter()
+    try:
+        yield instrumentation
+    finally:
+        instrumentation.uninstall()
+        instrumentation.collect_connections()
+        seconds = time.perf_counter() - started
+        if report_path is not None:
+            report = {"name": name, "seconds": seconds}
+            report.update(instrumentation.recorder.snapshot())
+            with open(report_path, "w") as f:
+                json.dump(report, f, indent=2)
+        if print_report:
+            print(f"AWS calls during {name} ({seconds:.1f}s):")
+            print(instrumentation.recorder.report())
@@ -0,0 +1,179 @@
+"""
+In-memory aggregates of AWS calls, keyed by service and operation.
+
+Recording a call is a few additions under a lock: counts, retries,
+throttles, bytes each way and a fixed-bucket latency histogram (the one
+bedrock/metrics.py uses). With sample_rate below 1 only that share of calls
+is recorded, and the report scales counts back up.
+"""
+
+import json
+import random
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "bedrock")]
+
+from metrics import Histogram  # noqa: E402
+
+# Error codes AWS services use for throttling.
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "LimitExceededException",
+    "SlowDown",
+    "ServiceUnavailableException",
+    "429",
+}
+
+
+class _OperationStats:
+    __slots__ = (
+        "calls",
+        "errors",
+        "retries",
+        "throttles",
+        "request_bytes",
+        "response_bytes",
+        "error_codes",
+        "latency",
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.error_codes = Counter()
+        self.latency = Histogram()
+
+
+class CallRecorder:
+    def __init__(self, sample_rate: float = 1.0, seed: int = None):
+        """
+        :param sample_rate: Share of calls to record, between 0 and 1
+        :param seed: Optional seed for reproducible sampling
+        """
+        self.sample_rate = sample_rate
+        self._random = random.Random(seed)
+        self._stats = {}
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def sampled(self) -> bool:
+        """Decides whether to record the call that is starting."""
+        return self.sample_rate >= 1.0 or self._random.random() < self.sample_rate
+
+    def record(
+        self,
+        service: str,
+        operation: str,
+        latency: float,
+        retries: int = 0,
+        throttles: int = 0,
+        request_bytes: int = 0,
+        response_bytes: int = 0,
+        error_code: str = None,
+    ):
+        with self._lock:
+            stats = self._stats.get((service, operation))
+            if stats is None:
+                stats = self._stats[(service, operation)] = _OperationStats()
+            stats.calls += 1
+            stats.retries += retries
+            stats.throttles += throttles
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            stats.latency.observe(latency)
+            if error_code is not None:
+                stats.errors += 1
+                stats.error_codes[error_code] += 1
+
+    def set_connections(self, name: str, opened: int, requests: int):
+        """Records how many connections a client's pools opened for its requests."""
+        with self._lock:
+            self._connections[name] = (opened, requests)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._connections.clear()
+
+    def snapshot(self) -> dict:
+        scale = 1.0 / self.sample_rate if 0 < self.sample_rate < 1 else 1.0
+        with self._lock:
+            operations = {}
+            for (service, operation), stats in sorted(self._stats.items()):
+                operations[f"{service}.{operation}"] = {
+                    "calls": round(stats.calls * scale),
+                    "errors": round(stats.errors * scale),
+                    "retries": round(stats.retries * scale),
+                    "throttles": round(stats.throttles * scale),
+                    "request_bytes": round(stats.request_bytes * scale),
+                    "response_bytes": round(stats.response_bytes * scale),
+                    "error_codes": dict(stats.error_codes),
+                    "total_seconds": stats.latency.total * scale,
+                    "mean_seconds": (
+                        stats.latency.total / stats.calls if stats.calls else 0.0
+                    ),
+                    "latency": stats.latency.to_dict(),
+                }
+            connections = {
+                name: {
+                    "opened": opened,
+                    "requests": requests,
+                    # Share of requests that went over an existing connection.
+                    "reuse": 1 - opened / requests if requests else None,
+                }
+                for name, (opened, requests) in self._connections.items()
+            }
+        return {
+            "sample_rate": self.sample_rate,
+            "operations": operations,
+            "connections": connections,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def report(self, top: int = 20) -> str:
+        """A table of operations, by total time spent in them."""
+        snapshot = self.snapshot()
+        operations = sorted(
+            snapshot["operations"].items(),
+            key=lambda item: item[1]["total_seconds"],
+            reverse=True,
+        )
+        lines = [
+            f"{'operation':<44}{'calls':>7}{'total s':>9}{'mean ms':>9}"
+            f"{'p99 ms':>9}{'retry':>7}{'thrtl':>7}{'err':>5}{'KiB out':>9}"
+            f"{'KiB in':>9}"
+        ]
+        for name, stats in operations[:top]:
+            p99 = stats["latency"]["p99"]
+            lines.append(
+                f"{name[:43]:<44}{stats['calls']:>7}{stats['total_seconds']:>9.2f}"
+                f"{stats['mean_seconds'] * 1000:>9.1f}"
+                f"{(p99 or 0) * 1000:>9.0f}{stats['retries']:>7}"
+                f"{stats['throttles']:>7}{stats['errors']:>5}"
+                f"{stats['request_bytes'] / 1024:>9.1f}"
+                f"{stats['response_bytes'] / 1024:>9.1f}"
+            )
+        for name, pool in snapshot["connections"].items():
+            reuse = "n/a" if pool["reuse"] is None else f"{pool['reuse']:.0%}"
+            lines.append(
+                f"connections {name}: {pool['opened']} opened for "
+                f"{pool['requests']} requests ({reuse} reused)"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,75 @@
+"""
+Checks that OpenSearch calls are recorded through a real AsyncOpenSearch.
+
+The client's connection class answers locally, so nothing leaves the
+process, but the transport creates its connections on the first request as
+it does against a cluster.
+
+    cd instrumentation && python -m pytest test_hooks.py
+"""
+
+import asyncio
+
+import pytest
+
+opensearchpy = pytest.importorskip("opensearchpy")
+
+from hooks import Instrumentation, profile  # noqa: E402
+from recorder import CallRecorder  # noqa: E402
+
+RESPONSE = '{"hits": {"hits": []}}'
+
+
+class LocalConnection(opensearchpy.AsyncHttpConnection):
+    """Throttles the first request it gets, then answers every request."""
+
+    requests = 0
+
+    async def perform_request(self, method, url, params=None, body=None, **kwargs):
+        LocalConnection.requests += 1
+        if LocalConnection.requests == 1:
+            raise opensearchpy.TransportError(429, "Too Many Requests", {})
+        return 200, {}, RESPONSE
+
+
+def client():
+    LocalConnection.requests = 0
+    return opensearchpy.AsyncOpenSearch(
+        hosts=[{"host": "localhost", "port": 9200}],
+        connection_class=LocalConnection,
+        retry_on_status=(429,),
+    )
+
+
+async def search(opensearch_client):
+    try:
+        await opensearch_client.search(
+            index="documents", body={"query": {"match_all": {}}}
+        )
+    finally:
+        await opensearch_client.close()
+
+
+def check(snapshot):
+    stats = snapshot["operations"]["opensearch.POST _search"]
+    assert stats["calls"] == 1
+    assert stats["retries"] == 1
+    assert stats["throttles"] == 1
+    assert stats["request_bytes"] > 0
+    assert stats["response_bytes"] == len(RESPONSE)
+
+
+def test_instrument_opensearch_before_first_request():
+    instrumentation = Instrumentation(CallRecorder())
+    opensearch_client = instrumentation.instrument_opensearch(client())
+    asyncio.run(search(opensearch_client))
+    check(instrumentation.recorder.snapshot())
+
+
+def test_profile_instruments_new_clients():
+    with profile(print_report=False) as instrumentation:
+        opensearch_client = client()
+        asyncio.run(search(opensearch_client))
+    check(instrumentation.recorder.snapshot())
+    # Clients created after the block are left alone.
+    assert "set_connections" not in vars(client().transport)
@@ -7,9 +7,11 @@ dotenv.load_dotenv()
 
 COLLECTION_NAME = "documents"
 INDEX_NAME = "documents"
-ENCRYPTION_POLICY_NAME = "documents-policy"
-NETWORK_POLICY_NAME = "documents-policy"
-ACCESS_POLICY_NAME = "documents-policy"
+
+# Size of the embedding knn_vector. Titan v2 embeddings are requested with
+# this many dimensions (1024, 512 or 256), so the two always agree.
+EMBEDDING_DIMENSIONS = 1024
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
 
 AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
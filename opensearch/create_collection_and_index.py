@@ -4,13 +4,11 @@ import json
 import aioboto3
 import botocore
 from constants import (
-    ACCESS_POLICY_NAME,
     AWS_ACCESS_KEY,
     AWS_SECRET_KEY,
     COLLECTION_NAME,
-    ENCRYPTION_POLICY_NAME,
+    EMBEDDING_DIMENSIONS,
     INDEX_NAME,
-    NETWORK_POLICY_NAME,
 )
 from opensearchpy import AsyncHttpConnection, AsyncOpenSearch, AWSV4SignerAsyncAuth
 
@@ -19,19 +17,29 @@ from opensearchpy import AsyncHttpConnection, AsyncOpenSearch, AWSV4SignerAsyncA
 # key, and default region.
 
 
-async def create_encryption_policy(session):
-    """Creates an encryption policy that matches all collections beginning with tv-"""
+def policy_name(collection):
+    """Name of a collection's encryption, network and data access policies
+
+    Each collection gets its own, so creating a second collection doesn't
+    collide with the first one's policies. Policies of different types may
+    share a name; names are at most 32 characters.
+    """
+    return f"{collection[:25]}-policy"
+
+
+async def create_encryption_policy(session, collection=COLLECTION_NAME):
+    """Creates an encryption policy for the collection"""
     try:
         async with session.client("opensearchserverless") as client:
             response = await client.create_security_policy(
-                description="Encryption policy for TV collections",
-                name=ENCRYPTION_POLICY_NAME,
+                description=f"Encryption policy for the {collection} collection",
+                name=policy_name(collection),
                 policy=json.dumps(
                     {
                         "Rules": [
                             {
                                 "ResourceType": "collection",
-                                "Resource": [f"collection/{COLLECTION_NAME}*"],
+                                "Resource": [f"collection/{collection}"],
                             }
                         ],
                         "AWSOwnedKey": True,
@@ -50,25 +58,25 @@ async def create_encryption_policy(session):
             raise error
 
 
-async def create_network_policy(session):
-    """Creates a network policy that matches all collections beginning with tv-"""
+async def create_network_policy(session, collection=COLLECTION_NAME):
+    """Creates a network policy that allows public access to the collection"""
     try:
         async with session.client("opensearchserverless") as client:
             response = await client.create_security_policy(
-                description="Network policy for TV collections",
-                name=NETWORK_POLICY_NAME,
+                description=f"Network policy for the {collection} collection",
+                name=policy_name(collection),
                 policy=json.dumps(
                     [
                         {
-                            "Description": "Public access for TV collection",
+                            "Description": f"Public access to {collection}",
                             "Rules": [
                                 {
                                     "ResourceType": "dashboard",
-                                    "Resource": [f"collection/{COLLECTION_NAME}*"],
+                                    "Resource": [f"collection/{collection}"],
                                 },
                                 {
                                     "ResourceType": "collection",
-                                    "Resource": [f"collection/{COLLECTION_NAME}*"],
+                                    "Resource": [f"collection/{collection}"],
                                 },
                             ],
                             "AllowFromPublic": True,
@@ -86,20 +94,20 @@ async def create_network_policy(session):
             raise error
 
 
-async def create_access_policy(session):
-    """Creates a data access policy that matches all collections beginning with tv-"""
+async def create_access_policy(session, collection=COLLECTION_NAME, index=INDEX_NAME):
+    """Creates a data access policy for the collection and its index"""
     try:
         async with session.client("opensearchserverless") as client:
             response = await client.create_access_policy(
-                description="Data access policy for TV collections",
-                name=ACCESS_POLICY_NAME,
+                description=f"Data access policy for the {collection} collection",
+                name=policy_name(collection),
                 # TODO: principal name is hardcoded
                 policy=json.dumps(
                     [
                         {
                             "Rules": [
                                 {
-                                    "Resource": [f"index/{INDEX_NAME}*/*"],
+                                    "Resource": [f"index/{index}*/*"],
                                     "Permission": [
                                         "aoss:CreateIndex",
                                         "aoss:DeleteIndex",
@@ -111,7 +119,7 @@ async def create_access_policy(session):
                                     "ResourceType": "index",
                                 },
                                 {
-                                    "Resource": [f"collection/{COLLECTION_NAME}*"],
+                                    "Resource": [f"collection/{collection}"],
                                     "Permission": ["aoss:CreateCollectionItems"],
                                     "ResourceType": "collection",
                                 },
@@ -131,12 +139,12 @@ async def create_access_policy(session):
             raise error
 
 
-async def create_collection(session):
+async def create_collection(session, collection=COLLECTION_NAME):
     """Creates a collection"""
     try:
         async with session.client("opensearchserverless") as client:
             response = await client.create_collection(
-                name=COLLECTION_NAME, type="VECTORSEARCH"
+                name=collection, type="VECTORSEARCH"
             )
             return response
     except botocore.exceptions.ClientError as error:
@@ -148,24 +156,26 @@ async def create_collection(session):
             raise error
 
 
-async def wait_for_collection_creation(session, awsauth):
+async def wait_for_collection_creation(
+    session, awsauth, collection=COLLECTION_NAME, index=INDEX_NAME
+):
     """Waits for the collection to become active"""
     async with session.client("opensearchserverless") as client:
-        response = await client.batch_get_collection(names=[COLLECTION_NAME])
+        response = await client.batch_get_collection(names=[collection])
         # Periodically check collection status
         while (response["collectionDetails"][0]["status"]) == "CREATING":
             print("Creating collection...")
             await asyncio.sleep(30)
-            response = await client.batch_get_collection(names=[COLLECTION_NAME])
+            response = await client.batch_get_collection(names=[collection])
         print("\nCollection successfully created:")
         print(response["collectionDetails"])
         # Extract the collection endpoint from the response
         host = response["collectionDetails"][0]["collectionEndpoint"]
         final_host = host.replace("https://", "")
-        await index_data(final_host, awsauth)
+        await index_data(final_host, awsauth, index)
 
 
-async def index_data(host, awsauth):
+async def index_data(host, awsauth, index=INDEX_NAME):
     """Create an index and add some sample data"""
     # Build the OpenSearch client
     client = AsyncOpenSearch(
@@ -180,18 +190,18 @@ async def index_data(host, awsauth):
     await asyncio.sleep(45)
 
     # Create index
-    if await client.indices.exists(index=INDEX_NAME):
-        print(f"Index {INDEX_NAME} already exists!")
+    if await client.indices.exists(index=index):
+        print(f"Index {index} already exists!")
     else:
         response = await client.indices.create(
-            index=INDEX_NAME,
+            index=index,
             body={
                 "settings": {"index.knn": True},
                 "mappings": {
                     "properties": {
                         "embedding": {
                             "type": "knn_vector",
-                            "dimension": 3,
+                            "dimension": EMBEDDING_DIMENSIONS,
                             "method": {
                                 "engine": "nmslib",
                                 "name": "hnsw",
@@ -205,6 +215,9 @@ async def index_data(host, awsauth):
                         "filename": {"type": "text"},
                         "content": {"type": "text"},
                         "sourcepage": {"type": "text"},
+                        "page": {"type": "integer"},
+                        "content_type": {"type": "keyword"},
+                        "duplicate_of": {"type": "keyword"},
                         "sourcefilepath": {"type": "text"},
                         "language": {"type": "text"},
                         "tags": {"type": "long"},
@@ -218,11 +231,19 @@ async def index_data(host, awsauth):
     await client.close()
 
 
-async def main():
-    session = aioboto3.Session(
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-    )
+async def main(collection=COLLECTION_NAME, index=INDEX_NAME, session=None):
+    """Creates the policies, the collection and its index
+
+    :param collection: Name of the OpenSearch Serverless collection
+    :param index: Name of the index to create in it
+    :param session: aioboto3 session; by default one is built from the
+        AWS_ACCESS_KEY and AWS_SECRET_KEY settings
+    """
+    if session is None:
+        session = aioboto3.Session(
+            aws_access_key_id=AWS_ACCESS_KEY,
+            aws_secret_access_key=AWS_SECRET_KEY,
+        )
     service = "aoss"
     region = "us-east-1"
     credentials = await session.get_credentials()
@@ -233,11 +254,11 @@ async def main():
         service=service,
     )
 
-    await create_encryption_policy(session)
-    await create_network_policy(session)
-    await create_access_policy(session)
-    await create_collection(session)
-    await wait_for_collection_creation(session, awsauth)
+    await create_encryption_policy(session, collection)
+    await create_network_policy(session, collection)
+    await create_access_policy(session, collection, index)
+    await create_collection(session, collection)
+    await wait_for_collection_creation(session, awsauth, collection, index)
 
 
 if __name__ == "__main__":
@@ -1,23 +1,32 @@
 import asyncio
 import os
+import sys
+from pathlib import Path
 
 import aioboto3
-from constants import COLLECTION_NAME, INDEX_NAME
+from constants import (
+    COLLECTION_NAME,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL_ID,
+    INDEX_NAME,
+)
 from dotenv import load_dotenv
 from opensearchpy import AsyncHttpConnection, AsyncOpenSearch, AWSV4SignerAsyncAuth
 
 load_dotenv()
 
 
-async def main():
-
-    session = aioboto3.Session(
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
-    )
+async def get_opensearch_client(session, credentials=None, collection=COLLECTION_NAME):
+    """Builds an OpenSearch client for the collection's endpoint
 
+    :param session: aioboto3 session
+    :param credentials: botocore credentials to sign requests with, e.g.
+        CredentialProvider.botocore_credentials(), which stay fresh. By
+        default the session's credentials are frozen once.
+    :param collection: Name of the OpenSearch Serverless collection
+    """
     async with session.client("opensearchserverless") as aoss_client:
-        response = await aoss_client.batch_get_collection(names=[COLLECTION_NAME])
+        response = await aoss_client.batch_get_collection(names=[collection])
 
     host = response["collectionDetails"][0]["collectionEndpoint"].replace(
         "https://", ""
@@ -25,15 +34,16 @@ async def main():
 
     service = "aoss"
     region = "us-east-1"
-    credentials = await session.get_credentials()
-    credentials = await credentials.get_frozen_credentials()
+    if credentials is None:
+        credentials = await session.get_credentials()
+        credentials = await credentials.get_frozen_credentials()
     awsauth = AWSV4SignerAsyncAuth(
         credentials,
         region,
         service,
     )
 
-    opensearch_client = AsyncOpenSearch(
+    return AsyncOpenSearch(
         hosts=[{"host": host, "port": 443}],
         http_auth=awsauth,
         use_ssl=True,
@@ -42,19 +52,52 @@ async def main():
         timeout=300,
     )
 
-    # Search for the document.
-    q = "dhoni"
+
+def hybrid_query(q, vector, tags=None, k=50, size=10, source=None):
+    """Builds a query matching both the embedding (kNN) and the text of a document"""
     query = {
+        "size": size,
         "query": {
             "bool": {
                 "must": [
-                    {"knn": {"embedding": {"vector": [1, 2, 3], "k": 50}}},
+                    {"knn": {"embedding": {"vector": vector, "k": k}}},
                     {"multi_match": {"query": q, "fields": ["content"]}},
                 ],
-                "filter": [{"terms": {"tags": [1, 2]}}],
             }
         },
     }
+    if tags:
+        query["query"]["bool"]["filter"] = [{"terms": {"tags": tags}}]
+    if source is not None:
+        query["_source"] = source
+    return query
+
+
+async def main():
+
+    session = aioboto3.Session(
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
+    )
+
+    # Imported here, so modules importing search.py don't get bedrock/ on
+    # their path.
+    sys.path[:0] = [str(Path(__file__).resolve().parent.parent / "bedrock")]
+    import boto3
+    from invoke import embed
+
+    opensearch_client = await get_opensearch_client(session)
+
+    # Search for the document, with a vector of the knn_vector's size.
+    text = "dhoni"
+    vector = await asyncio.to_thread(
+        embed,
+        boto3.client(service_name="bedrock-runtime"),
+        EMBEDDING_MODEL_ID,
+        text,
+        dimensions=EMBEDDING_DIMENSIONS,
+    )
+    query = hybrid_query(text, vector, tags=[1, 2])
 
     response = await opensearch_client.search(body=query, index=INDEX_NAME)
     print("\nSearch results:")
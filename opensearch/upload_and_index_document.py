@@ -1,17 +1,32 @@
 import asyncio
 import os
+import sys
+from pathlib import Path
 from uuid import uuid4
 
 import aioboto3
-from constants import COLLECTION_NAME, INDEX_NAME
+import boto3
+from constants import (
+    COLLECTION_NAME,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL_ID,
+    INDEX_NAME,
+)
 from dotenv import load_dotenv
 from opensearchpy import AsyncHttpConnection, AsyncOpenSearch, AWSV4SignerAsyncAuth
 from pypdf import PdfReader
 from upload import BUCKET_NAME, upload_file
 
+sys.path[:0] = [str(Path(__file__).resolve().parent.parent / "bedrock")]
+
+from invoke import embed  # noqa: E402
+
 load_dotenv()
 
 FILE_NAME = "msdhoni.pdf"
+# Titan v2 takes up to 8,192 tokens; longer documents are embedded by their
+# beginning.
+MAX_EMBEDDING_CHARS = 20_000
 
 
 async def main():
@@ -59,6 +74,15 @@ async def main():
         with open(FILE_NAME) as f:
             content = f.read()
 
+    # The vector must have the knn_vector's size, or the index rejects it.
+    embedding = await asyncio.to_thread(
+        embed,
+        boto3.client(service_name="bedrock-runtime"),
+        EMBEDDING_MODEL_ID,
+        content[:MAX_EMBEDDING_CHARS],
+        dimensions=EMBEDDING_DIMENSIONS,
+    )
+
     response = await opensearch_client.index(
         index=INDEX_NAME,
         body={
@@ -70,7 +94,7 @@ async def main():
             "sourcefilepath": s3_url,
             "language": "english",
             "tags": [1, 2, 3],
-            "embedding": [1, 2, 3],
+            "embedding": embedding,
         },
     )
     print("\nDocument added:")
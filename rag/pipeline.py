@@ -0,0 +1,256 @@
+"""
+Answers a question from the indexed documents and streams the answer.
+
+The question is embedded while the OpenSearch client connects, the hybrid
+search returns only the fields the prompt needs, the context is cut to a token
+budget as hits are taken in score order, and the Bedrock answer is streamed
+token by token. Every stage is timed so slow time-to-first-token can be traced
+to the stage responsible.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import aioboto3
+import boto3
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "bedrock"), str(ROOT / "opensearch")]
+
+from constants import (  # noqa: E402
+    COLLECTION_NAME,
+    EMBEDDING_DIMENSIONS,
+    INDEX_NAME,
+)
+from converse_stream import Metrics, TextDelta, astream_conversation  # noqa: E402
+from history import DEFAULT_CHARS_PER_TOKEN  # noqa: E402
+from invoke import embed  # noqa: E402
+from search import get_opensearch_client, hybrid_query  # noqa: E402
+
+load_dotenv()
+
+MODEL_ID = "meta.llama3-8b-instruct-v1:0"
+# Questions are embedded with EMBEDDING_DIMENSIONS, the size of the index's
+# knn_vector.
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+SYSTEM_PROMPT = (
+    "Answer the question using only the numbered sources provided. "
+    "Cite sources as [n]. If the sources don't contain the answer, say so."
+)
+
+
+@dataclass
+class StageTimings:
+    """
+    Milliseconds spent in each stage. Time to first token and the total are
+    measured from the start of ask().
+    """
+
+    embed_ms: float = 0.0
+    connect_ms: float = 0.0
+    search_ms: float = 0.0
+    assemble_ms: float = 0.0
+    time_to_first_token_ms: Optional[float] = None
+    generate_ms: float = 0.0
+    total_ms: float = 0.0
+    passages: int = 0
+    context_tokens: int = 0
+    generation: Optional[Metrics] = field(default=None, repr=False)
+
+
+def assemble_context(hits, max_tokens, chars_per_token=DEFAULT_CHARS_PER_TOKEN):
+    """
+    Takes passages in score order until the token budget is spent.
+
+    :param hits: OpenSearch hits, best first
+    :param max_tokens: Token budget for the whole context
+    :return: The numbered context text and the number of passages used
+    """
+    budget = int(max_tokens * chars_per_token)
+    parts = []
+    seen = set()
+    for hit in hits:
+        if budget <= 0:
+            break
+        source = hit["_source"]
+        content = source.get("content", "").strip()
+        if not content or content in seen:
+            continue
+        seen.add(content)
+
+        header = f"[{len(parts) + 1}] {source.get('filename', '')}"
+        if source.get("sourcepage"):
+            header += f" ({source['sourcepage']})"
+        passage = f"{header}\n{content[: max(0, budget - len(header) - 1)]}"
+        budget -= len(passage)
+        parts.append(passage)
+
+    return "\n\n".join(parts), len(parts)
+
+
+class RagPipeline:
+    """Retrieval augmented generation over the documents index."""
+
+    def __init__(
+        self,
+        session,
+        bedrock_client,
+        model_id=MODEL_ID,
+        embedding_model_id=EMBEDDING_MODEL_ID,
+        embedding_params=None,
+        max_context_tokens=2000,
+        top_k=10,
+        inference_config=None,
+        collection=COLLECTION_NAME,
+        index=INDEX_NAME,
+    ):
+        """
+        :param session: aioboto3 session used for OpenSearch
+        :param bedrock_client: Boto3 Bedrock runtime client
+        :param model_id: Model that writes the answer
+        :param embedding_model_id: Model that embeds the question
+        :param embedding_params: Extra embedding fields; dimensions defaults
+            to EMBEDDING_DIMENSIONS
+        :param max_context_tokens: Token budget for retrieved passages
+        :param top_k: Number of hits to retrieve
+        :param inference_config: Converse inferenceConfig for the answer
+        :param collection: OpenSearch Serverless collection to search
+        :param index: Index of the collection to search
+        """
+        self.session = session
+        self.bedrock_client = bedrock_client
+        self.model_id = model_id
+        self.embedding_model_id = embedding_model_id
+        self.embedding_params = {
+            "dimensions": EMBEDDING_DIMENSIONS,
+            **(embedding_params or {}),
+        }
+        self.max_context_tokens = max_context_tokens
+        self.top_k = top_k
+        self.inference_config = inference_config or {"temperature": 0.2}
+        self.collection = collection
+        self.index = index
+        self._opensearch_client = None
+
+    async def _connect(self):
+        # The client (and its warm connections) is reused across questions.
+        if self._opensearch_client is None:
+            self._opensearch_client = await get_opensearch_client(
+                self.session, collection=self.collection
+            )
+        return self._opensearch_client
+
+    async def ask(self, question, tags=None):
+        """
+        Answers a question, yielding TextDelta and other stream events and
+        finally a StageTimings.
+
+        :param question: The user's question
+        :param tags: Optional tags to filter documents by
+        """
+        timings = StageTimings()
+        started = time.perf_counter()
+
+        def since(mark):
+            return (time.perf_counter() - mark) * 1000
+
+        async def timed(coro, attribute):
+            mark = time.perf_counter()
+            result = await coro
+            setattr(timings, attribute, since(mark))
+            return result
+
+        # Embedding (Bedrock) and connecting (OpenSearch) don't depend on each
+        # other, so run them at the same time.
+        vector, opensearch_client = await asyncio.gather(
+            timed(
+                asyncio.to_thread(
+                    embed,
+                    self.bedrock_client,
+                    self.embedding_model_id,
+                    question,
+                    **self.embedding_params,
+                ),
+                "embed_ms",
+            ),
+            timed(self._connect(), "connect_ms"),
+        )
+
+        mark = time.perf_counter()
+        response = await opensearch_client.search(
+            body=hybrid_query(
+                question,
+                vector,
+                tags=tags,
+                k=self.top_k,
+                size=self.top_k,
+                # Skip the stored embeddings; only the text reaches the prompt.
+                source=["content", "filename", "sourcepage"],
+            ),
+            index=self.index,
+        )
+        timings.search_ms = since(mark)
+
+        mark = time.perf_counter()
+        context, timings.passages = assemble_context(
+            response["hits"]["hits"], self.max_context_tokens
+        )
+        timings.context_tokens = int(len(context) / DEFAULT_CHARS_PER_TOKEN)
+        messages = [
+            {
+                "role": "user",
+                "content": [{"text": f"Sources:\n{context}\n\nQuestion: {question}"}],
+            }
+        ]
+        timings.assemble_ms = since(mark)
+
+        mark = time.perf_counter()
+        async for event in astream_conversation(
+            self.bedrock_client,
+            self.model_id,
+            messages,
+            [{"text": SYSTEM_PROMPT}],
+            self.inference_config,
+        ):
+            if isinstance(event, TextDelta) and timings.time_to_first_token_ms is None:
+                timings.time_to_first_token_ms = since(started)
+            if isinstance(event, Metrics):
+                timings.generation = event
+            yield event
+        timings.generate_ms = since(mark)
+
+        timings.total_ms = since(started)
+        yield timings
+
+    async def close(self):
+        if self._opensearch_client is not None:
+            await self._opensearch_client.close()
+            self._opensearch_client = None
+
+
+async def main():
+    session = aioboto3.Session(
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
+    )
+    bedrock_client = boto3.client(service_name="bedrock-runtime")
+    pipeline = RagPipeline(session, bedrock_client)
+
+    try:
+        async for event in pipeline.ask("Where was MS Dhoni born?"):
+            if isinstance(event, TextDelta):
+                print(event.text, end="", flush=True)
+            elif isinstance(event, StageTimings):
+                print(f"\n\n{event}")
+    finally:
+        await pipeline.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
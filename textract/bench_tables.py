@@ -0,0 +1,99 @@
+"""Benchmarks table reconstruction on synthetic Textract responses.
+
+Compares tables.extract_tables with the previous approach, which rescanned
+every cell for every row and built HTML by string concatenation.
+
+    python bench_tables.py [pages] [tables_per_page] [rows] [columns]
+"""
+
+import html
+import sys
+import time
+
+from stub_client import synthetic_blocks
+from tables import extract_tables
+
+
+def legacy_table_to_html(table_blocks: list, id_to_word_mapping: dict) -> str:
+    # The original analyze._textract_table_to_html, kept for comparison.
+    cells = [block for block in table_blocks if block["BlockType"] == "CELL"]
+    row_count = max(cell["RowIndex"] for cell in cells)
+
+    table_html = "<table>"
+    for row_index in range(1, row_count + 1):
+        table_html += "<tr>"
+        row_cells = sorted(
+            [cell for cell in cells if cell["RowIndex"] == row_index],
+            key=lambda cell: cell["ColumnIndex"],
+        )
+        for cell in row_cells:
+            tag = (
+                "th"
+                if cell.get("EntityTypes") and "COLUMN_HEADER" in cell["EntityTypes"]
+                else "td"
+            )
+            cell_spans = ""
+            if cell.get("ColumnSpan", 1) > 1:
+                cell_spans += f" colSpan={cell['ColumnSpan']}"
+            if cell.get("RowSpan", 1) > 1:
+                cell_spans += f" rowSpan={cell['RowSpan']}"
+
+            cell_content = ""
+            for rel in cell.get("Relationships", []):
+                ids = rel["Ids"]
+                words = [id_to_word_mapping[id_] for id_ in ids]
+                cell_content = " ".join(words)
+
+            table_html += f"<{tag}{cell_spans}>{html.escape(cell_content)}</{tag}>"
+        table_html += "</tr>"
+    table_html += "</table>"
+    return table_html
+
+
+def legacy(blocks: list) -> list:
+    id_to_word_mapping = {
+        block["Id"]: block["Text"] for block in blocks if block["BlockType"] == "WORD"
+    }
+    table_blocks = [
+        block for block in blocks if block["BlockType"] in ["TABLE", "CELL"]
+    ]
+    return [legacy_table_to_html(table_blocks, id_to_word_mapping)]
+
+
+def current(blocks: list) -> list:
+    return [table.to_html() for table in extract_tables(blocks)]
+
+
+def timed(fn, blocks: list, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(blocks)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    args = [int(arg) for arg in sys.argv[1:5]]
+    pages, tables_per_page, rows, columns = args + [50, 4, 300, 4][len(args) :]
+    blocks = synthetic_blocks(
+        pages=pages,
+        lines_per_page=10,
+        tables_per_page=tables_per_page,
+        rows=rows,
+        columns=columns,
+    )
+    print(
+        f"{pages * tables_per_page} tables of {rows}x{columns} cells, "
+        f"{len(blocks)} blocks"
+    )
+
+    current_seconds = timed(current, blocks)
+    print(f"extract_tables: {current_seconds * 1000:.1f} ms")
+    legacy_seconds = timed(legacy, blocks, repeat=1)
+    print(f"legacy:         {legacy_seconds * 1000:.1f} ms (all tables merged)")
+    print(f"speedup:        {legacy_seconds / current_seconds:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""A compact, column-oriented store for large Textract responses.
+
+A Textract block as a dict costs around a kilobyte; a 500-page document has
+hundreds of thousands of them. The store keeps only what text and table
+reconstruction need, in typed arrays indexed by a dense integer id:
+
+- block type, page, row/column indices and spans, flags: `array` columns
+- text: one list of interned strings (words repeat a lot)
+- CHILD relationships: one flat array of child ids plus per-block offsets
+- UUIDs: two 64-bit halves, so the string form can be rebuilt on demand
+
+Blocks can be added page by page as results stream in. A relationship may
+point at a block that hasn't arrived yet; it gets its integer id at first
+sight and its columns are filled in when it arrives.
+"""
+
+import sys
+import uuid
+from array import array
+
+from tables import Cell, Table, table_from_cells
+
+BLOCK_TYPES = [
+    "PAGE",
+    "LINE",
+    "WORD",
+    "TABLE",
+    "CELL",
+    "MERGED_CELL",
+    "SELECTION_ELEMENT",
+    "KEY_VALUE_SET",
+    "TABLE_TITLE",
+    "TABLE_FOOTER",
+]
+_CELL_TYPES = (BLOCK_TYPES.index("CELL"), BLOCK_TYPES.index("MERGED_CELL"))
+# Placeholder type of a block that has been referenced but not yet added.
+_MISSING = 255
+
+_COLUMN_HEADER = 1
+_SELECTED = 2
+
+_MASK_64 = (1 << 64) - 1
+
+
+class BlockStore:
+    def __init__(self):
+        self._index = {}
+        self._uuid_hi = array("Q")
+        self._uuid_lo = array("Q")
+        self._type = array("B")
+        self._page = array("H")
+        self._row = array("H")
+        self._column = array("H")
+        self._row_span = array("H")
+        self._column_span = array("H")
+        self._flags = array("B")
+        self._text = []
+        self._child_start = array("I")
+        self._child_count = array("I")
+        self._children = array("I")
+        self._by_type = {}
+        self._type_codes = {name: code for code, name in enumerate(BLOCK_TYPES)}
+        self._type_names = list(BLOCK_TYPES)
+
+    def __len__(self) -> int:
+        return len(self._type)
+
+    def _id(self, block_id: str) -> int:
+        key = int(block_id.replace("-", ""), 16)
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = len(self._type)
+            self._uuid_hi.append(key >> 64)
+            self._uuid_lo.append(key & _MASK_64)
+            self._type.append(_MISSING)
+            self._page.append(0)
+            self._row.append(0)
+            self._column.append(0)
+            self._row_span.append(0)
+            self._column_span.append(0)
+            self._flags.append(0)
+            self._text.append(None)
+            self._child_start.append(0)
+            self._child_count.append(0)
+        return index
+
+    def _type_code(self, name: str) -> int:
+        code = self._type_codes.get(name)
+        if code is None:
+            code = self._type_codes[name] = len(self._type_names)
+            self._type_names.append(name)
+        return code
+
+    def add_blocks(self, blocks):
+        """Adds blocks, e.g. the Blocks of one get_document_analysis page."""
+        intern = sys.intern
+        for block in blocks:
+            index = self._id(block["Id"])
+            code = self._type_code(block["BlockType"])
+            self._type[index] = code
+            self._by_type.setdefault(code, array("I")).append(index)
+            self._page[index] = block.get("Page", 1)
+
+            text = block.get("Text")
+            if text is not None:
+                self._text[index] = intern(text)
+
+            if code in _CELL_TYPES:
+                self._row[index] = block["RowIndex"]
+                self._column[index] = block["ColumnIndex"]
+                self._row_span[index] = block.get("RowSpan", 1)
+                self._column_span[index] = block.get("ColumnSpan", 1)
+                if "COLUMN_HEADER" in block.get("EntityTypes", ()):
+                    self._flags[index] |= _COLUMN_HEADER
+            elif block.get("SelectionStatus") == "SELECTED":
+                self._flags[index] |= _SELECTED
+
+            child_ids = [
+                self._id(child_id)
+                for relationship in block.get("Relationships", ())
+                if relationship["Type"] == "CHILD"
+                for child_id in relationship["Ids"]
+            ]
+            if child_ids:
+                self._child_start[index] = len(self._children)
+                self._child_count[index] = len(child_ids)
+                self._children.extend(child_ids)
+
+    async def add_pages(self, pages):
+        """Adds every page from an async iterator of result pages."""
+        async for page in pages:
+            self.add_blocks(page["Blocks"])
+
+    def seal(self):
+        """Drops the UUID lookup table once no more blocks will be added."""
+        self._index = None
+
+    def index_of(self, block_id: str) -> int:
+        return self._index[int(block_id.replace("-", ""), 16)]
+
+    def block_id(self, index: int) -> str:
+        key = (self._uuid_hi[index] << 64) | self._uuid_lo[index]
+        return str(uuid.UUID(int=key))
+
+    def block_type(self, index: int) -> str:
+        code = self._type[index]
+        return None if code == _MISSING else self._type_names[code]
+
+    def page(self, index: int) -> int:
+        return self._page[index]
+
+    def text(self, index: int) -> str:
+        return self._text[index]
+
+    def children(self, index: int) -> array:
+        start = self._child_start[index]
+        return self._children[start : start + self._child_count[index]]
+
+    def of_type(self, block_type: str) -> array:
+        """Indices of all blocks of a type, in the order they were added."""
+        return self._by_type.get(self._type_codes.get(block_type), array("I"))
+
+    def child_text(self, index: int) -> str:
+        """The text of a block's WORD and SELECTION_ELEMENT children."""
+        word = self._type_codes["WORD"]
+        selection = self._type_codes["SELECTION_ELEMENT"]
+        words = []
+        for child in self.children(index):
+            code = self._type[child]
+            if code == word:
+                words.append(self._text[child])
+            elif code == selection:
+                words.append("[X]" if self._flags[child] & _SELECTED else "[ ]")
+        return " ".join(words)
+
+    def cell(self, index: int) -> Cell:
+        return Cell(
+            row=self._row[index],
+            column=self._column[index],
+            text=self.child_text(index),
+            row_span=self._row_span[index],
+            column_span=self._column_span[index],
+            is_header=bool(self._flags[index] & _COLUMN_HEADER),
+        )
+
+    def table(self, index: int) -> Table:
+        """Builds the table of a TABLE block, like tables.build_table."""
+        cell_code = self._type_codes["CELL"]
+        cells = [
+            self.cell(child)
+            for child in self.children(index)
+            if self._type[child] == cell_code
+        ]
+        return table_from_cells(self.block_id(index), self._page[index], cells)
+
+    def tables(self) -> list:
+        return [self.table(index) for index in self.of_type("TABLE")]
+
+    def lines(self):
+        """Yields (page, text) of every LINE block."""
+        for index in self.of_type("LINE"):
+            yield self._page[index], self._text[index]
+
+
+def main():
+    """Compares the memory of raw blocks with a BlockStore of the same blocks."""
+    import json
+    import tracemalloc
+
+    from stub_client import synthetic_blocks
+    from tables import extract_tables
+
+    pages = 100
+    blocks = synthetic_blocks(pages=pages, lines_per_page=40, tables_per_page=2)
+    # Serialised result pages, so both sides decode their own strings.
+    result_pages = [
+        json.dumps(blocks[start : start + 1000])
+        for start in range(0, len(blocks), 1000)
+    ]
+    expected = [table.to_html() for table in extract_tables(blocks)]
+    del blocks
+
+    tracemalloc.start()
+    raw_blocks = []
+    for page in result_pages:
+        raw_blocks.extend(json.loads(page))
+    raw = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del raw_blocks
+
+    tracemalloc.start()
+    store = BlockStore()
+    for page in result_pages:
+        store.add_blocks(json.loads(page))
+    store.seal()
+    compact = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert [table.to_html() for table in store.tables()] == expected
+    print(f"{len(store)} blocks over {pages} pages")
+    print(f"dicts:      {raw / 2**20:.1f} MiB")
+    print(f"BlockStore: {compact / 2**20:.1f} MiB ({raw / compact:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Caches Textract analysis results by the S3 object they came from.
+
+A cache entry is keyed by bucket, key, the object's ETag and the requested
+feature types, so it is reused only while the document is unchanged. An
+entry holds the blocks (gzip-compressed NDJSON, compressed page by page as
+results stream in) and the derived tables. The tables object is written
+last and marks the entry complete. Entries live in a local directory or
+back in S3.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from typing import Optional
+
+from botocore.exceptions import ClientError
+
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+
+except ImportError:  # orjson is optional
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    _loads = json.loads
+
+
+CACHE_VERSION = 1
+BLOCKS_OBJECT = "blocks.ndjson.gz"
+TABLES_OBJECT = "tables.json"
+
+
+class LocalCacheBackend:
+    def __init__(self, directory: str = ".textract-cache"):
+        self.directory = directory
+
+    def _path(self, entry: str, name: str) -> str:
+        return os.path.join(self.directory, entry, name)
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial object. Each
+        # writer has its own temporary file; the last rename wins.
+        f = tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path), prefix=".tmp-", delete=False
+        )
+        try:
+            with f:
+                f.write(data)
+            os.replace(f.name, path)
+        except BaseException:
+            os.remove(f.name)
+            raise
+
+    async def read(self, entry: str, name: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, self._path(entry, name))
+
+    async def write(self, entry: str, name: str, data: bytes):
+        await asyncio.to_thread(self._write, self._path(entry, name), data)
+
+
+class S3CacheBackend:
+    def __init__(self, s3_client, bucket: str, prefix: str = "textract-cache/"):
+        """
+        :param s3_client: An open aioboto3 S3 client
+        :param bucket: Bucket to keep cache entries in
+        :param prefix: Key prefix of cache entries
+        """
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    async def read(self, entry: str, name: str) -> Optional[bytes]:
+        try:
+            response = await self.s3_client.get_object(
+                Bucket=self.bucket, Key=f"{self.prefix}{entry}/{name}"
+            )
+        except ClientError as error:
+            if error.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        async with response["Body"] as body:
+            return await body.read()
+
+    async def write(self, entry: str, name: str, data: bytes):
+        await self.s3_client.put_object(
+            Bucket=self.bucket, Key=f"{self.prefix}{entry}/{name}", Body=data
+        )
+
+
+class CachedAnalysis:
+    def __init__(self, backend, entry: str, tables: list):
+        self._backend = backend
+        self._entry = entry
+        # Each table: {"id", "page", "rows": [[cell text, ...], ...], "html"}.
+        self.tables = tables
+
+    async def pages(self, page_size: int = 1000):
+        """Yields the cached blocks in lists of up to page_size.
+
+        Blocks are only fetched when asked for; the tables alone are often
+        all a re-run needs.
+        """
+        data = await self._backend.read(self._entry, BLOCKS_OBJECT)
+        if data is None:
+            raise FileNotFoundError(f"Cache entry {self._entry} has no blocks")
+        page = []
+        for line in zlib.decompress(data, wbits=31).splitlines():
+            page.append(_loads(line))
+            if len(page) == page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+
+class CacheWriter:
+    """Compresses blocks as they arrive and stores the entry on commit."""
+
+    def __init__(self, backend, entry: str):
+        self._backend = backend
+        self._entry = entry
+        # wbits=31 writes a gzip container.
+        self._compressor = zlib.compressobj(wbits=31)
+        self._chunks = []
+
+    def add_blocks(self, blocks):
+        self._chunks.append(
+            self._compressor.compress(b"".join(_dumps(b) + b"\n" for b in blocks))
+        )
+
+    async def commit(self, tables: list):
+        """
+        :param tables: tables.Table objects derived from the blocks
+        """
+        self._chunks.append(self._compressor.flush())
+        await self._backend.write(self._entry, BLOCKS_OBJECT, b"".join(self._chunks))
+        self._chunks = []
+        await self._backend.write(
+            self._entry,
+            TABLES_OBJECT,
+            _dumps(
+                [
+                    {
+                        "id": table.id,
+                        "page": table.page,
+                        "rows": table.to_rows(),
+                        "html": table.to_html(),
+                    }
+                    for table in tables
+                ]
+            ),
+        )
+
+
+class AnalysisCache:
+    def __init__(self, backend):
+        """
+        :param backend: LocalCacheBackend or S3CacheBackend
+        """
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def entry_name(bucket: str, key: str, etag: str, feature_types) -> str:
+        identity = json.dumps(
+            [CACHE_VERSION, bucket, key, etag.strip('"'), sorted(feature_types)]
+        )
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    async def get(
+        self, bucket: str, key: str, etag: str, feature_types
+    ) -> Optional[CachedAnalysis]:
+        entry = self.entry_name(bucket, key, etag, feature_types)
+        # The tables object is written last, so its presence means the
+        # blocks object is complete too.
+        tables = await self.backend.read(entry, TABLES_OBJECT)
+        if tables is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CachedAnalysis(self.backend, entry, _loads(tables))
+
+    def writer(self, bucket: str, key: str, etag: str, feature_types) -> CacheWriter:
+        return CacheWriter(
+            self.backend, self.entry_name(bucket, key, etag, feature_types)
+        )
+
+
+async def object_etag(s3_client, bucket: str, key: str) -> str:
+    response = await s3_client.head_object(Bucket=bucket, Key=key)
+    return response["ETag"]
@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+try:
+    import orjson
+
+    def _encode_line(block) -> bytes:
+        return orjson.dumps(block) + b"\n"
+
+except ImportError:  # orjson is optional
+
+    def _encode_line(block) -> bytes:
+        return (json.dumps(block, separators=(",", ":")) + "\n").encode()
+
+
+# The largest page get_document_analysis returns.
+MAX_RESULTS = 1000
+
+
+async def wait_for_job(client, job_id: str, poll_interval: float = 5) -> dict:
+    """Polls a document analysis job until it leaves IN_PROGRESS.
+
+    :param client: aioboto3 Textract client
+    :param job_id: Job to wait for
+    :param poll_interval: Seconds between polls
+    :return: The first page of results
+    """
+    response = await client.get_document_analysis(JobId=job_id, MaxResults=MAX_RESULTS)
+    while response["JobStatus"] == "IN_PROGRESS":
+        await asyncio.sleep(poll_interval)
+        print(f"Polling job id: {job_id}")
+        response = await client.get_document_analysis(
+            JobId=job_id, MaxResults=MAX_RESULTS
+        )
+
+    if response["JobStatus"] == "FAILED":
+        raise RuntimeError(
+            f"Textract job {job_id} failed: {response.get('StatusMessage')}"
+        )
+    return response
+
+
+async def iter_analysis_pages(client, job_id: str, first_page: dict = None):
+    """Yields every page of a finished job's results, following NextToken.
+
+    The next page is requested while the consumer handles the current one, so
+    fetching overlaps with processing.
+
+    :param client: aioboto3 Textract client
+    :param job_id: A job that has finished
+    :param first_page: The first page, if already fetched by wait_for_job
+    """
+    if first_page is None:
+        first_page = await client.get_document_analysis(
+            JobId=job_id, MaxResults=MAX_RESULTS
+        )
+
+    page = first_page
+    while True:
+        next_token = page.get("NextToken")
+        prefetch = None
+        if next_token:
+            prefetch = asyncio.ensure_future(
+                client.get_document_analysis(
+                    JobId=job_id, MaxResults=MAX_RESULTS, NextToken=next_token
+                )
+            )
+        try:
+            yield page
+        except BaseException:
+            if prefetch is not None:
+                prefetch.cancel()
+            raise
+        if prefetch is None:
+            return
+        page = await prefetch
+
+
+async def iter_blocks(pages):
+    """Flattens result pages into a stream of blocks."""
+    async for page in pages:
+        for block in page["Blocks"]:
+            yield block
+
+
+async def write_ndjson(pages, path: str) -> int:
+    """Writes the blocks of each page to a file as they arrive, one per line.
+
+    :param pages: Async iterator of result pages
+    :param path: File to write
+    :return: The number of blocks written
+    """
+    count = 0
+    with open(path, "wb") as f:
+        async for page in pages:
+            f.write(b"".join(_encode_line(block) for block in page["Blocks"]))
+            count += len(page["Blocks"])
+    return count
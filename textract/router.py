@@ -0,0 +1,183 @@
+"""Routes small documents to the synchronous Textract API.
+
+start_document_analysis plus polling costs seconds even for a one-page
+document. Small inputs are analyzed with analyze_document instead:
+
+- single images are analyzed straight from S3;
+- small PDFs are downloaded, split into single-page PDFs locally (the
+  synchronous API only accepts one page) and the pages analyzed concurrently.
+
+Everything else, anything the synchronous API rejects and PDFs pypdf can't
+read, goes through the asynchronous job. Either way the caller gets pages of
+blocks with the same shape as get_document_analysis results.
+"""
+
+import asyncio
+import io
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from botocore.exceptions import ClientError
+from pypdf import PdfReader, PdfWriter
+from pypdf.errors import PyPdfError
+from results import iter_analysis_pages, wait_for_job
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff"}
+# analyze_document accepts documents of up to 10 MB.
+MAX_SYNC_BYTES = 10 * 1024 * 1024
+SYNC_FALLBACK_ERRORS = {
+    "UnsupportedDocumentException",
+    "DocumentTooLargeException",
+    "BadDocumentException",
+}
+# What pypdf raises on malformed or encrypted PDFs. Textract may still read
+# them, so they are routed to the asynchronous API rather than failed.
+PDF_ERRORS = (PyPdfError, ValueError, KeyError)
+
+
+@dataclass
+class Route:
+    mode: str  # "sync-image", "sync-pdf" or "async"
+    pages: Optional[int] = None
+    data: Optional[bytes] = None
+
+
+def split_pdf(data: bytes) -> list:
+    """Splits a PDF into one single-page PDF per page."""
+    reader = PdfReader(io.BytesIO(data))
+    pages = []
+    for page in reader.pages:
+        writer = PdfWriter()
+        writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        pages.append(buffer.getvalue())
+    return pages
+
+
+async def choose_route(
+    s3_client,
+    bucket: str,
+    key: str,
+    max_sync_pages: int = 2,
+    max_pdf_bytes: int = 5 * 1024 * 1024,
+) -> Route:
+    """Picks the cheapest way to analyze an S3 object.
+
+    :param s3_client: aioboto3 S3 client
+    :param max_sync_pages: Largest PDF, in pages, to analyze synchronously
+    :param max_pdf_bytes: Largest PDF to download and inspect
+    """
+    extension = os.path.splitext(key)[1].lower()
+    head = await s3_client.head_object(Bucket=bucket, Key=key)
+    size = head["ContentLength"]
+
+    if extension in IMAGE_EXTENSIONS and extension not in (".tif", ".tiff"):
+        if size <= MAX_SYNC_BYTES:
+            return Route("sync-image", pages=1)
+        return Route("async")
+
+    if extension != ".pdf" or size > max_pdf_bytes:
+        return Route("async")
+
+    response = await s3_client.get_object(Bucket=bucket, Key=key)
+    async with response["Body"] as body:
+        data = await body.read()
+    try:
+        pages = await asyncio.to_thread(lambda: len(PdfReader(io.BytesIO(data)).pages))
+    except PDF_ERRORS as error:
+        print(f"Can't count the pages of {key}, starting a job: {error!r}")
+        return Route("async")
+    if pages > max_sync_pages:
+        return Route("async", pages=pages)
+    return Route("sync-pdf", pages=pages, data=data)
+
+
+async def _analyze_sync(
+    textract_client, route: Route, bucket, key, feature_types, max_concurrency
+):
+    if route.mode == "sync-image":
+        documents = [{"S3Object": {"Bucket": bucket, "Name": key}}]
+    else:
+        page_pdfs = await asyncio.to_thread(split_pdf, route.data)
+        documents = [{"Bytes": page_pdf} for page_pdf in page_pdfs]
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def analyze_page(document):
+        async with semaphore:
+            return await textract_client.analyze_document(
+                Document=document, FeatureTypes=feature_types
+            )
+
+    tasks = [asyncio.ensure_future(analyze_page(document)) for document in documents]
+    try:
+        # Pages finish in any order but are handed on in document order.
+        for page_number, task in enumerate(tasks, start=1):
+            response = await task
+            blocks = response["Blocks"]
+            for block in blocks:
+                # Each single-page request reports itself as page 1.
+                block["Page"] = page_number
+            yield blocks
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _analyze_async(textract_client, bucket, key, feature_types):
+    response = await textract_client.start_document_analysis(
+        DocumentLocation={"S3Object": {"Bucket": bucket, "Name": key}},
+        FeatureTypes=feature_types,
+    )
+    job_id = response["JobId"]
+    first_page = await wait_for_job(textract_client, job_id)
+    async for page in iter_analysis_pages(textract_client, job_id, first_page):
+        yield page["Blocks"]
+
+
+async def analyze(
+    textract_client,
+    s3_client,
+    bucket: str,
+    key: str,
+    feature_types=("TABLES",),
+    max_sync_pages: int = 2,
+    max_concurrency: int = 4,
+    route: Route = None,
+):
+    """Analyzes an S3 document, yielding lists of blocks.
+
+    :param textract_client: aioboto3 Textract client
+    :param s3_client: aioboto3 S3 client
+    :param max_sync_pages: Largest PDF, in pages, to analyze synchronously
+    :param max_concurrency: Most analyze_document calls at once
+    :param route: A route from choose_route, if already chosen
+    """
+    feature_types = list(feature_types)
+    if route is None:
+        route = await choose_route(s3_client, bucket, key, max_sync_pages)
+
+    if route.mode != "async":
+        yielded = False
+        try:
+            async for blocks in _analyze_sync(
+                textract_client, route, bucket, key, feature_types, max_concurrency
+            ):
+                yielded = True
+                yield blocks
+            return
+        except ClientError as error:
+            # Falling back after handing out some pages would repeat them.
+            if yielded or error.response["Error"]["Code"] not in SYNC_FALLBACK_ERRORS:
+                raise
+            print(f"Synchronous analysis of {key} failed, starting a job: {error}")
+        except PDF_ERRORS as error:
+            # split_pdf failed before any page was analyzed.
+            if yielded:
+                raise
+            print(f"Can't split {key} into pages, starting a job: {error!r}")
+
+    async for blocks in _analyze_async(textract_client, bucket, key, feature_types):
+        yield blocks
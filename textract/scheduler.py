@@ -0,0 +1,366 @@
+"""Runs Textract document analysis over many documents at once.
+
+Jobs are started while fewer than `max_concurrent_jobs` are in progress.
+Instead of polling every job every few seconds, each job is polled when it is
+likely to be done: the first poll waits for the expected duration (learned
+from the seconds per page of finished jobs) and later polls back off with the
+time already spent. Due jobs are polled in bounded batches. With an SQS queue
+subscribed to the jobs' SNS topic, completion messages wake the scheduler
+immediately and polling only serves as a slow fallback.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+RETRYABLE_ERROR_CODES = {
+    "LimitExceededException",
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+}
+
+
+@dataclass
+class Job:
+    bucket: str
+    key: str
+    pages: Optional[int] = None
+    job_id: Optional[str] = None
+    status: str = "PENDING"
+    error: Optional[str] = None
+    submitted_at: float = 0.0
+    finished_at: float = 0.0
+    next_poll_at: float = 0.0
+    polls: int = 0
+    first_page: Optional[dict] = field(default=None, repr=False)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.submitted_at
+
+
+class TextractJobScheduler:
+    def __init__(
+        self,
+        client,
+        feature_types=("TABLES",),
+        max_concurrent_jobs: int = 100,
+        poll_batch_size: int = 10,
+        min_poll_interval: float = 1.0,
+        max_poll_interval: float = 60.0,
+        seconds_per_page: float = 2.0,
+        default_pages: int = 1,
+        backoff_ratio: float = 0.25,
+        notification_channel: dict = None,
+        sqs_client=None,
+        queue_url: str = None,
+        on_complete=None,
+        keep_first_page: bool = False,
+    ):
+        """
+        :param client: aioboto3 Textract client
+        :param feature_types: FeatureTypes for start_document_analysis
+        :param max_concurrent_jobs: Most jobs in progress at once (the account's
+            asynchronous job quota)
+        :param poll_batch_size: Most get_document_analysis calls at once
+        :param min_poll_interval: Shortest wait between polls of a job
+        :param max_poll_interval: Longest wait between polls of a job
+        :param seconds_per_page: Initial guess of job seconds per page, refined
+            as jobs finish
+        :param default_pages: Page count assumed for documents without one
+        :param backoff_ratio: Fraction of a job's elapsed time to wait before
+            polling it again
+        :param notification_channel: {"SNSTopicArn": ..., "RoleArn": ...} to
+            have Textract publish completions
+        :param sqs_client: aioboto3 SQS client for the subscribed queue
+        :param queue_url: Queue subscribed to the SNS topic
+        :param on_complete: Optional coroutine function called with each
+            finished Job
+        :param keep_first_page: Keep the first page of results on the Job
+        """
+        self.client = client
+        self.feature_types = list(feature_types)
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.poll_batch_size = poll_batch_size
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.seconds_per_page = seconds_per_page
+        self.default_pages = default_pages
+        self.backoff_ratio = backoff_ratio
+        self.notification_channel = notification_channel
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.on_complete = on_complete
+        self.keep_first_page = keep_first_page
+
+        self._active = {}
+        self._wakeup = asyncio.Event()
+        self._started_at = None
+        self._listener_failed = False
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.polls = 0
+        self.notifications = 0
+        self.start_retries = 0
+
+    @property
+    def _notifications_enabled(self) -> bool:
+        return (
+            self.sqs_client is not None
+            and self.queue_url is not None
+            and not self._listener_failed
+        )
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        finished = self.succeeded + self.failed
+        return {
+            "submitted": self.submitted,
+            "in_progress": len(self._active),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "polls": self.polls,
+            "polls_per_job": self.polls / finished if finished else 0.0,
+            "notifications": self.notifications,
+            "start_retries": self.start_retries,
+            "seconds_per_page": self.seconds_per_page,
+            "jobs_per_minute": finished / elapsed * 60 if elapsed else 0.0,
+        }
+
+    async def run(self, documents) -> list:
+        """Analyzes documents and returns their finished Jobs.
+
+        :param documents: Iterable of (bucket, key) or (bucket, key, pages)
+        """
+        self._started_at = time.monotonic()
+        pending = deque(Job(*document) for document in documents)
+        finished = []
+
+        listener = None
+        if self._notifications_enabled:
+            listener = asyncio.create_task(self._listen())
+
+        try:
+            while pending or self._active:
+                finished.extend(await self._submit(pending))
+
+                now = time.monotonic()
+                due = sorted(
+                    (job for job in self._active.values() if job.next_poll_at <= now),
+                    key=lambda job: job.next_poll_at,
+                )[: self.poll_batch_size]
+                results = await asyncio.gather(*(self._poll(job) for job in due))
+                for job in (job for job in results if job is not None):
+                    finished.append(job)
+                    if self.on_complete is not None:
+                        await self.on_complete(job)
+
+                if due and len(due) == self.poll_batch_size:
+                    continue
+                await self._sleep(pending)
+        finally:
+            if listener is not None:
+                listener.cancel()
+
+        return finished
+
+    async def _submit(self, pending: deque) -> list:
+        batch = []
+        while pending and len(self._active) + len(batch) < self.max_concurrent_jobs:
+            batch.append(pending.popleft())
+        if not batch:
+            return []
+
+        results = await asyncio.gather(
+            *(self._start(job) for job in batch), return_exceptions=True
+        )
+        failed = []
+        for job, result in zip(batch, results):
+            if isinstance(result, ClientError) and (
+                result.response["Error"]["Code"] in RETRYABLE_ERROR_CODES
+            ):
+                # Over the job quota (possibly from other clients); try later.
+                self.start_retries += 1
+                pending.appendleft(job)
+            elif isinstance(result, Exception):
+                job.status = "FAILED"
+                job.error = str(result)
+                self.failed += 1
+                failed.append(job)
+        return failed
+
+    async def _start(self, job: Job):
+        kwargs = {
+            "DocumentLocation": {"S3Object": {"Bucket": job.bucket, "Name": job.key}},
+            "FeatureTypes": self.feature_types,
+        }
+        if self.notification_channel:
+            kwargs["NotificationChannel"] = self.notification_channel
+        response = await self.client.start_document_analysis(**kwargs)
+
+        job.job_id = response["JobId"]
+        job.status = "IN_PROGRESS"
+        job.submitted_at = time.monotonic()
+        job.next_poll_at = job.submitted_at + self._first_poll_delay(job)
+        self._active[job.job_id] = job
+        self.submitted += 1
+
+    def _first_poll_delay(self, job: Job) -> float:
+        if self._notifications_enabled:
+            # Polling is only a fallback for lost notifications.
+            return self.max_poll_interval
+        expected = (job.pages or self.default_pages) * self.seconds_per_page
+        return min(self.max_poll_interval, max(self.min_poll_interval, expected))
+
+    def _next_poll_delay(self, job: Job) -> float:
+        if self._notifications_enabled:
+            return self.max_poll_interval
+        delay = job.elapsed * self.backoff_ratio
+        return min(self.max_poll_interval, max(self.min_poll_interval, delay))
+
+    async def _poll(self, job: Job) -> Optional[Job]:
+        self.polls += 1
+        job.polls += 1
+        try:
+            response = await self.client.get_document_analysis(
+                JobId=job.job_id, MaxResults=1000
+            )
+        except ClientError as error:
+            if error.response["Error"]["Code"] in RETRYABLE_ERROR_CODES:
+                job.next_poll_at = time.monotonic() + self._next_poll_delay(job)
+                return None
+            # E.g. an expired or unknown job: only this job is lost.
+            job.finished_at = time.monotonic()
+            del self._active[job.job_id]
+            job.status = "FAILED"
+            job.error = str(error)
+            self.failed += 1
+            return job
+        except BotoCoreError:
+            # A timeout or dropped connection says nothing about the job itself:
+            # back off and poll it again instead of abandoning every active job.
+            job.next_poll_at = time.monotonic() + self._next_poll_delay(job)
+            return None
+
+        if response["JobStatus"] == "IN_PROGRESS":
+            job.next_poll_at = time.monotonic() + self._next_poll_delay(job)
+            return None
+
+        job.finished_at = time.monotonic()
+        del self._active[job.job_id]
+        if response["JobStatus"] in ("SUCCEEDED", "PARTIAL_SUCCESS"):
+            job.status = response["JobStatus"]
+            self.succeeded += 1
+            pages = response.get("DocumentMetadata", {}).get("Pages")
+            if pages:
+                job.pages = pages
+                # Smooth the learned duration so one slow job doesn't skew it.
+                observed = job.elapsed / pages
+                self.seconds_per_page = 0.8 * self.seconds_per_page + 0.2 * observed
+        else:
+            job.status = "FAILED"
+            job.error = response.get("StatusMessage")
+            self.failed += 1
+        if self.keep_first_page:
+            job.first_page = response
+        return job
+
+    async def _sleep(self, pending: deque):
+        if not self._active:
+            if pending:
+                # Everything is queued behind the job quota; retry shortly.
+                await asyncio.sleep(self.min_poll_interval)
+            return
+        next_poll_at = min(job.next_poll_at for job in self._active.values())
+        timeout = max(0.0, next_poll_at - time.monotonic())
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _listen(self):
+        try:
+            await self._receive_notifications()
+        except Exception as error:
+            # Without notifications, go back to polling every job on its own
+            # schedule rather than the slow fallback interval.
+            print(f"Textract notification listener failed, polling instead: {error!r}")
+            self._listener_failed = True
+            now = time.monotonic()
+            for job in self._active.values():
+                job.next_poll_at = min(
+                    job.next_poll_at, now + self._next_poll_delay(job)
+                )
+            self._wakeup.set()
+
+    async def _receive_notifications(self):
+        while True:
+            response = await self.sqs_client.receive_message(
+                QueueUrl=self.queue_url, MaxNumberOfMessages=10, WaitTimeSeconds=20
+            )
+            messages = response.get("Messages", [])
+            for message in messages:
+                body = json.loads(message["Body"])
+                notification = json.loads(body.get("Message", message["Body"]))
+                job = self._active.get(notification.get("JobId"))
+                if job is not None:
+                    self.notifications += 1
+                    job.next_poll_at = 0.0
+            if messages:
+                await self.sqs_client.delete_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {"Id": str(i), "ReceiptHandle": message["ReceiptHandle"]}
+                        for i, message in enumerate(messages)
+                    ],
+                )
+                self._wakeup.set()
+
+
+async def main():
+    """Runs the scheduler over 300 documents against the local stub."""
+    from stub_client import StubSQSClient, StubTextractClient
+
+    sqs_client = StubSQSClient()
+    client = StubTextractClient(
+        max_concurrent_jobs=50, seconds_per_page=0.02, sqs_client=sqs_client, seed=1
+    )
+    pages = {f"doc-{i}.pdf": 1 + i % 5 for i in range(300)}
+    client.pages = pages
+    documents = [("soham-boto-s3-test", key, count) for key, count in pages.items()]
+
+    for label, kwargs in (
+        ("polling", {}),
+        (
+            "notifications",
+            {
+                "notification_channel": {
+                    "SNSTopicArn": os.getenv("TEXTRACT_SNS_TOPIC_ARN", "stub"),
+                    "RoleArn": os.getenv("TEXTRACT_SNS_ROLE_ARN", "stub"),
+                },
+                "sqs_client": sqs_client,
+                "queue_url": "stub",
+            },
+        ),
+    ):
+        scheduler = TextractJobScheduler(
+            client,
+            max_concurrent_jobs=50,
+            min_poll_interval=0.05,
+            seconds_per_page=0.05,
+            **kwargs,
+        )
+        jobs = await scheduler.run(documents)
+        print(f"{label}: {len(jobs)} jobs, {scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
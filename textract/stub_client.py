@@ -0,0 +1,254 @@
+"""A local stand-in for the aioboto3 Textract (and SQS) clients.
+
+Jobs take `base_seconds + seconds_per_page * pages` to finish, results are
+synthetic PAGE/LINE/WORD/TABLE/CELL blocks served in pages with NextToken,
+and starting more than `max_concurrent_jobs` jobs raises
+LimitExceededException, so schedulers and result consumers can be exercised
+without calling AWS.
+"""
+
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import deque
+
+from botocore.exceptions import ClientError
+
+
+def _error(code: str, operation_name: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation_name)
+
+
+def _new_id() -> str:
+    return str(uuid.uuid4())
+
+
+def synthetic_blocks(
+    pages: int = 1,
+    lines_per_page: int = 20,
+    words_per_line: int = 8,
+    tables_per_page: int = 1,
+    rows: int = 10,
+    columns: int = 5,
+) -> list:
+    """Builds Textract-shaped blocks for a document of the given size."""
+    blocks = []
+
+    def words(count: int, page: int, prefix: str) -> list:
+        new = [
+            {
+                "BlockType": "WORD",
+                "Id": _new_id(),
+                "Page": page,
+                "Text": f"{prefix}{i}",
+                "Confidence": 99.0,
+            }
+            for i in range(count)
+        ]
+        blocks.extend(new)
+        return [word["Id"] for word in new]
+
+    for page in range(1, pages + 1):
+        page_block = {
+            "BlockType": "PAGE",
+            "Id": _new_id(),
+            "Page": page,
+            "Relationships": [{"Type": "CHILD", "Ids": []}],
+        }
+        blocks.append(page_block)
+        children = page_block["Relationships"][0]["Ids"]
+
+        for line in range(lines_per_page):
+            word_ids = words(words_per_line, page, f"p{page}l{line}w")
+            line_block = {
+                "BlockType": "LINE",
+                "Id": _new_id(),
+                "Page": page,
+                "Text": " ".join(f"p{page}l{line}w{i}" for i in range(words_per_line)),
+                "Relationships": [{"Type": "CHILD", "Ids": word_ids}],
+            }
+            blocks.append(line_block)
+            children.append(line_block["Id"])
+
+        for table in range(tables_per_page):
+            cell_ids = []
+            for row in range(1, rows + 1):
+                for column in range(1, columns + 1):
+                    cell = {
+                        "BlockType": "CELL",
+                        "Id": _new_id(),
+                        "Page": page,
+                        "RowIndex": row,
+                        "ColumnIndex": column,
+                        "RowSpan": 1,
+                        "ColumnSpan": 1,
+                        "Relationships": [
+                            {
+                                "Type": "CHILD",
+                                "Ids": words(2, page, f"t{table}r{row}c{column}w"),
+                            }
+                        ],
+                    }
+                    if row == 1:
+                        cell["EntityTypes"] = ["COLUMN_HEADER"]
+                    blocks.append(cell)
+                    cell_ids.append(cell["Id"])
+            table_block = {
+                "BlockType": "TABLE",
+                "Id": _new_id(),
+                "Page": page,
+                "Relationships": [{"Type": "CHILD", "Ids": cell_ids}],
+            }
+            blocks.append(table_block)
+            children.append(table_block["Id"])
+
+    return blocks
+
+
+class StubSQSClient:
+    """Holds Textract completion notifications like an SQS queue fed by SNS."""
+
+    def __init__(self):
+        self._messages = deque()
+        self._available = asyncio.Event()
+
+    def publish(self, job_id: str, status: str, tag: str = None):
+        message = {"JobId": job_id, "Status": status, "JobTag": tag}
+        # SNS wraps the Textract message in an envelope.
+        self._messages.append({"Message": json.dumps(message)})
+        self._available.set()
+
+    async def receive_message(
+        self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, **kwargs
+    ):
+        if not self._messages:
+            self._available.clear()
+            try:
+                await asyncio.wait_for(self._available.wait(), WaitTimeSeconds)
+            except asyncio.TimeoutError:
+                return {}
+        batch = []
+        while self._messages and len(batch) < MaxNumberOfMessages:
+            body = self._messages.popleft()
+            batch.append({"ReceiptHandle": _new_id(), "Body": json.dumps(body)})
+        return {"Messages": batch}
+
+    async def delete_message_batch(self, QueueUrl, Entries):
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+class StubTextractClient:
+    """Implements the document analysis operations."""
+
+    def __init__(
+        self,
+        max_concurrent_jobs: int = 100,
+        base_seconds: float = 0.2,
+        seconds_per_page: float = 0.05,
+        pages: dict = None,
+        default_pages: int = 2,
+        failure_rate: float = 0.0,
+        latency: float = 0.005,
+        sqs_client: StubSQSClient = None,
+        seed: int = None,
+    ):
+        """
+        :param max_concurrent_jobs: Jobs allowed in progress at once
+        :param base_seconds: Fixed job duration
+        :param seconds_per_page: Additional job duration per page
+        :param pages: Page count by object key; others get default_pages
+        :param default_pages: Page count of documents not in `pages`
+        :param failure_rate: Probability that a job fails
+        :param latency: Seconds added to every API call
+        :param sqs_client: Receives completion notifications for jobs started
+            with a NotificationChannel
+        :param seed: Optional seed for reproducible runs
+        """
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.base_seconds = base_seconds
+        self.seconds_per_page = seconds_per_page
+        self.pages = pages or {}
+        self.default_pages = default_pages
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.sqs_client = sqs_client
+        self._random = random.Random(seed)
+        self._jobs = {}
+
+        self.start_calls = 0
+        self.get_calls = 0
+        self.analyze_calls = 0
+        self.limit_errors = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def _in_progress(self) -> int:
+        now = time.monotonic()
+        return sum(job["done_at"] > now for job in self._jobs.values())
+
+    async def start_document_analysis(
+        self, DocumentLocation, FeatureTypes, NotificationChannel=None, **kwargs
+    ):
+        await asyncio.sleep(self.latency)
+        self.start_calls += 1
+        if self._in_progress() >= self.max_concurrent_jobs:
+            self.limit_errors += 1
+            raise _error("LimitExceededException", "StartDocumentAnalysis")
+
+        key = DocumentLocation["S3Object"]["Name"]
+        pages = self.pages.get(key, self.default_pages)
+        job_id = _new_id()
+        duration = self.base_seconds + self.seconds_per_page * pages
+        self._jobs[job_id] = {
+            "pages": pages,
+            "done_at": time.monotonic() + duration,
+            "failed": self._random.random() < self.failure_rate,
+            "blocks": None,
+        }
+        if NotificationChannel and self.sqs_client is not None:
+            asyncio.get_running_loop().call_later(
+                duration, self._notify, job_id, kwargs.get("JobTag")
+            )
+        return {"JobId": job_id}
+
+    def _notify(self, job_id: str, tag: str):
+        status = "FAILED" if self._jobs[job_id]["failed"] else "SUCCEEDED"
+        self.sqs_client.publish(job_id, status, tag)
+
+    async def get_document_analysis(
+        self, JobId, MaxResults=1000, NextToken=None, **kwargs
+    ):
+        await asyncio.sleep(self.latency)
+        self.get_calls += 1
+        job = self._jobs.get(JobId)
+        if job is None:
+            raise _error("InvalidJobIdException", "GetDocumentAnalysis")
+        if job["done_at"] > time.monotonic():
+            return {"JobStatus": "IN_PROGRESS"}
+        if job["failed"]:
+            return {"JobStatus": "FAILED", "StatusMessage": "Stubbed failure"}
+
+        if job["blocks"] is None:
+            job["blocks"] = synthetic_blocks(job["pages"])
+        start = int(NextToken or 0)
+        end = start + MaxResults
+        response = {
+            "JobStatus": "SUCCEEDED",
+            "DocumentMetadata": {"Pages": job["pages"]},
+            "Blocks": job["blocks"][start:end],
+        }
+        if end < len(job["blocks"]):
+            response["NextToken"] = str(end)
+        return response
+
+    async def analyze_document(self, Document, FeatureTypes, **kwargs):
+        """Analyzes one page synchronously, without the job overhead."""
+        self.analyze_calls += 1
+        await asyncio.sleep(self.latency + self.seconds_per_page)
+        return {"DocumentMetadata": {"Pages": 1}, "Blocks": synthetic_blocks(1)}
@@ -0,0 +1,157 @@
+"""Rebuilds tables from Textract blocks in linear time.
+
+Blocks are indexed by id once; each TABLE block's CHILD relationships give
+its cells directly, and cells are bucketed by row instead of rescanning the
+cell list per row. Every table is built separately and can be rendered as
+HTML, CSV or a list of rows.
+"""
+
+import csv
+import html
+import io
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass(slots=True)
+class Cell:
+    row: int
+    column: int
+    text: str
+    row_span: int = 1
+    column_span: int = 1
+    is_header: bool = False
+
+
+@dataclass
+class Table:
+    id: str
+    page: Optional[int]
+    row_count: int
+    column_count: int
+    # Cells bucketed by row (index 0 is RowIndex 1), each row sorted by column.
+    rows: list = field(default_factory=list, repr=False)
+
+    def to_html(self) -> str:
+        parts = ["<table>"]
+        for row in self.rows:
+            parts.append("<tr>")
+            for cell in row:
+                tag = "th" if cell.is_header else "td"
+                spans = ""
+                if cell.column_span > 1:
+                    spans += f" colSpan={cell.column_span}"
+                if cell.row_span > 1:
+                    spans += f" rowSpan={cell.row_span}"
+                parts.append(f"<{tag}{spans}>{html.escape(cell.text)}</{tag}>")
+            parts.append("</tr>")
+        parts.append("</table>")
+        return "".join(parts)
+
+    def to_rows(self) -> list:
+        """Returns a row_count x column_count grid of cell text.
+
+        A spanning cell's text is placed at its top-left position; the other
+        positions it covers are empty strings.
+        """
+        grid = [[""] * self.column_count for _ in range(self.row_count)]
+        for row in self.rows:
+            for cell in row:
+                grid[cell.row - 1][cell.column - 1] = cell.text
+        return grid
+
+    def to_csv(self) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self.to_rows())
+        return buffer.getvalue()
+
+
+def index_blocks(blocks) -> dict:
+    """Maps block ids to blocks."""
+    return {block["Id"]: block for block in blocks}
+
+
+def _child_ids(block: dict) -> list:
+    relationships = block.get("Relationships")
+    if not relationships:
+        return []
+    if len(relationships) == 1:
+        relationship = relationships[0]
+        return relationship["Ids"] if relationship["Type"] == "CHILD" else []
+    return [
+        child_id
+        for relationship in relationships
+        if relationship["Type"] == "CHILD"
+        for child_id in relationship["Ids"]
+    ]
+
+
+def _cell_text(cell: dict, blocks_by_id: dict) -> str:
+    words = []
+    for child_id in _child_ids(cell):
+        child = blocks_by_id.get(child_id)
+        if child is None:
+            continue
+        block_type = child["BlockType"]
+        if block_type == "WORD":
+            words.append(child["Text"])
+        elif block_type == "SELECTION_ELEMENT":
+            words.append("[X]" if child["SelectionStatus"] == "SELECTED" else "[ ]")
+    return " ".join(words)
+
+
+def table_from_cells(table_id: str, page: Optional[int], cells: list) -> Table:
+    """Buckets a table's cells by row in a single pass."""
+    row_count = max((cell.row + cell.row_span - 1 for cell in cells), default=0)
+    column_count = max(
+        (cell.column + cell.column_span - 1 for cell in cells), default=0
+    )
+
+    rows = [[] for _ in range(row_count)]
+    for cell in cells:
+        rows[cell.row - 1].append(cell)
+    for row in rows:
+        row.sort(key=lambda cell: cell.column)
+
+    return Table(
+        id=table_id,
+        page=page,
+        row_count=row_count,
+        column_count=column_count,
+        rows=rows,
+    )
+
+
+def build_table(table_block: dict, blocks_by_id: dict) -> Table:
+    """Builds one table from its TABLE block."""
+    cells = []
+    for child_id in _child_ids(table_block):
+        block = blocks_by_id.get(child_id)
+        if block is None or block["BlockType"] != "CELL":
+            continue
+        cells.append(
+            Cell(
+                row=block["RowIndex"],
+                column=block["ColumnIndex"],
+                text=_cell_text(block, blocks_by_id),
+                row_span=block.get("RowSpan", 1),
+                column_span=block.get("ColumnSpan", 1),
+                is_header="COLUMN_HEADER" in block.get("EntityTypes", ()),
+            )
+        )
+    return table_from_cells(table_block["Id"], table_block.get("Page"), cells)
+
+
+def extract_tables(blocks, blocks_by_id: dict = None) -> list:
+    """Builds every table in a Textract response, in document order.
+
+    :param blocks: The response's Blocks
+    :param blocks_by_id: An existing index of the blocks, if there is one
+    """
+    if blocks_by_id is None:
+        blocks_by_id = index_blocks(blocks)
+    return [
+        build_table(block, blocks_by_id)
+        for block in blocks
+        if block["BlockType"] == "TABLE"
+    ]